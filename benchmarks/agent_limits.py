@@ -0,0 +1,91 @@
+"""
+How MCP agent runs end under the run limits (AGENT_RUN_DEADLINE, AGENT_TOOL_TIMEOUT, AGENT_MAX_STEPS,
+AGENT_STALL_STEPS), against fake upstream and MCP servers set up to misbehave: a tool that hangs,
+a tool slower than the run deadline, and an agent that keeps calling a tool whose result never
+changes. Reports per scenario the wall-clock time of the run, how its `final` event ended it, and
+the `agent_limits` counters of /admin/stats.
+
+    python -m benchmarks.agent_limits --hang 60
+"""
+import argparse
+import json
+import time
+
+import httpx
+
+from benchmarks.common import free_port, spawn, wait_for_port
+
+
+def run(port: int, question: str) -> tuple[float, int, int, dict]:
+    """(seconds to the end of the stream, steps, timed-out steps, data of the final event)"""
+    t0 = time.perf_counter()
+    steps = timed_out = 0
+    final = {}
+    event = None
+    with httpx.stream("GET", f"http://127.0.0.1:{port}/root-stream", params={"question": question},
+                      timeout=600) as resp:
+        for line in resp.iter_lines():
+            if not line:
+                event = None  # end of a frame; `[DONE]` comes without an event name
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:") and event == "step":
+                steps += 1
+                timed_out += bool(json.loads(line[5:]).get("timed_out"))
+            elif line.startswith("data:") and event == "final":
+                final = json.loads(line[5:])
+            elif line.startswith("data:") and event == "error":
+                final = {"error": json.loads(line[5:])["message"]}
+    return time.perf_counter() - t0, steps, timed_out, final
+
+
+def scenario(name: str, tool_steps: int, tool_latency: float, env: dict):
+    openai_port, mcp_port, port = free_port(), free_port(), free_port()
+    fake = spawn(["-m", "benchmarks.fake_openai", "--port", str(openai_port), "--ttft", "0.05", "--tokens", "5",
+                  "--rate", "0", "--tool-steps", str(tool_steps)])
+    fake_mcp = spawn(["-m", "benchmarks.fake_mcp", "--port", str(mcp_port), "--latency", str(tool_latency)])
+    api = spawn(["-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], env={
+        "BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "API_KEY": "bench",
+        "ADMIN_API_KEY": "bench",
+        "MODEL_NAME": "fake",
+        "MCP_SERVER_URL": f"http://127.0.0.1:{mcp_port}/mcp",
+        "ANSWER_CACHE_TTL": "0",
+        "TOOL_CACHE_TTL": "0",
+        **env,
+    })
+    try:
+        wait_for_port(openai_port)
+        wait_for_port(mcp_port)
+        wait_for_port(port)
+        seconds, steps, timed_out, final = run(port, name)
+        limits = httpx.get(f"http://127.0.0.1:{port}/admin/stats", headers={"X-Api-Key": "bench"}).json()["agent_limits"]
+        how = final.get("error") or final.get("stopped") or "answered"
+        print(f"{name:34s} {seconds:6.1f} s  {steps:2d} steps ({timed_out} timed out)  ended: {how:9s}  "
+              f"endings {[k for k, v in limits['endings'].items() if v]} tool timeouts {limits['tool_timeouts']}")
+    finally:
+        for process in (api, fake, fake_mcp):
+            process.terminate()
+        api.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hang", type=float, default=60, help="seconds a hanging tool call takes")
+    args = parser.parse_args()
+
+    no_limits = {"AGENT_RUN_DEADLINE": "0", "AGENT_TOOL_TIMEOUT": "0", "AGENT_STALL_STEPS": "0"}
+    scenario("hanging tool, no limits", 1, args.hang, no_limits)
+    scenario("hanging tool, tool timeout 2 s", 1, args.hang,
+             {**no_limits, "AGENT_TOOL_TIMEOUT": "2"})
+    scenario("hanging tool, run deadline 5 s", 1, args.hang,
+             {**no_limits, "AGENT_RUN_DEADLINE": "5"})
+    scenario("same result 20 times, no limits", 20, 0.1, no_limits)
+    scenario("same result 20 times, stall after 3", 20, 0.1,
+             {**no_limits, "AGENT_STALL_STEPS": "3"})
+    scenario("same result 20 times, max 6 steps", 20, 0.1,
+             {**no_limits, "AGENT_MAX_STEPS": "6"})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Concurrent-stream capacity of /stream/ask-question.
+
+Starts the fake upstream and the API, opens `--streams` simultaneous SSE requests and reports
+time-to-first-delta and total latency. A threadpool-backed (sync) stream blocks one worker thread
+per pending upstream read, so beyond the threadpool size (40 by default) streams queue behind each
+other and latency grows with concurrency; the AsyncOpenAI path should stay close to a single stream.
+
+    python -m benchmarks.concurrent_streams --streams 200
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import free_port, percentile, spawn, wait_for_port
+
+THREADPOOL_LIMIT = 40  # anyio's default thread limiter used by Starlette
+
+
+async def one_stream(client: httpx.AsyncClient, state: dict, question: str):
+    t0 = time.perf_counter()
+    started = False
+    async with client.stream("POST", "/stream/ask-question", json={"user_question": question}) as resp:
+        async for line in resp.aiter_lines():
+            if line == "event: delta" and not started:
+                started = True
+                state["ttft"].append(time.perf_counter() - t0)
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            elif line == "event: end":
+                break
+    if started:
+        state["active"] -= 1
+        state["total"].append(time.perf_counter() - t0)
+
+
+async def run(port: int, streams: int):
+    state = {"active": 0, "peak": 0, "ttft": [], "total": []}
+    limits = httpx.Limits(max_connections=streams, max_keepalive_connections=streams)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one_stream(client, state, f"q{i}") for i in range(streams)))
+        elapsed = time.perf_counter() - t0
+    return state, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--ttft", type=float, default=0.5)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=50)
+    args = parser.parse_args()
+
+    upstream_port, api_port = free_port(), free_port()
+    upstream = spawn(["-m", "benchmarks.fake_openai", "--port", str(upstream_port), "--ttft", str(args.ttft),
+                      "--tokens", str(args.tokens), "--rate", str(args.rate)])
+    api = spawn(["-m", "uvicorn", "main:app", "--port", str(api_port), "--log-level", "warning"],
+                env={"BASE_URL": f"http://127.0.0.1:{upstream_port}/v1", "API_KEY": "bench", "MODEL_NAME": "fake",
+                     "MCP_POOL_SIZE": "1"})
+    try:
+        wait_for_port(upstream_port)
+        wait_for_port(api_port)
+        state, elapsed = asyncio.run(run(api_port, args.streams))
+    finally:
+        api.terminate()
+        upstream.terminate()
+
+    single = args.ttft + args.tokens / args.rate
+    print(f"streams completed : {len(state['total'])}/{args.streams} (threadpool limit {THREADPOOL_LIMIT})")
+    print(f"peak in flight    : {state['peak']}")
+    for name in ("ttft", "total"):
+        values = state[name]
+        print(f"{name:<18}: p50 {percentile(values, 50):.2f}s  p95 {percentile(values, 95):.2f}s  "
+              f"max {max(values, default=float('nan')):.2f}s")
+    print(f"wall time         : {elapsed:.2f}s (single stream ~{single:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Local stand-in for the Superset MCP server (streamable HTTP at /mcp).
+
+    python -m benchmarks.fake_mcp --port 9200 --latency 0.2 --payload-bytes 20000
+
+Point the API at it with MCP_SERVER_URL=http://127.0.0.1:9200/mcp. Every tool sleeps `--latency`
+seconds (plus up to `--jitter` more, drawn per call) and returns roughly `--payload-bytes` of JSON
+rows, so both tool time and observation size can be varied independently. `--extra-tools` adds that
+many more tools (other Superset objects and verbs) to make the catalog as large as the real one.
+GET /stats counts tool calls.
+"""
+import argparse
+import asyncio
+import random
+
+from fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+_ROW_BYTES = 100  # approximate JSON size of one generated row
+
+_OBJECTS = [
+    ("database", "database connection"), ("snippet", "saved SQL Lab snippet"), ("report", "scheduled report"),
+    ("alert", "alert on a metric"), ("annotation_layer", "annotation layer"), ("tag", "tag"),
+    ("user", "user account"), ("role", "role with permission"), ("css_template", "dashboard CSS template"),
+    ("execution", "SQL Lab query execution"), ("audit_record", "audit log record"), ("theme", "theme"),
+]
+_VERBS = [
+    ("list", "List all Superset {}s."), ("get", "Get one Superset {} by id."),
+    ("create", "Create a Superset {}."), ("update", "Update a Superset {}."), ("delete", "Delete a Superset {}."),
+]
+
+
+def _rows(count: int, kind: str) -> list[dict]:
+    return [
+        {"id": i, "name": f"{kind} {i}", "owner": f"user{i % 7}", "description": "x" * 40}
+        for i in range(count)
+    ]
+
+
+def create_server(latency: float, payload_bytes: int, jitter: float = 0.0, extra_tools: int = 0) -> FastMCP:
+    mcp = FastMCP("fake-superset")
+    rows = max(1, payload_bytes // _ROW_BYTES)
+    counts = {"tool_calls": 0}
+
+    async def work():
+        counts["tool_calls"] += 1
+        await asyncio.sleep(latency + random.uniform(0, jitter))
+
+    @mcp.custom_route("/stats", methods=["GET"])
+    async def stats(_: Request):
+        return JSONResponse(counts)
+
+    @mcp.tool()
+    async def list_dashboards() -> list:
+        """List all Superset dashboards."""
+        await work()
+        return _rows(rows, "dashboard")
+
+    @mcp.tool()
+    async def get_dashboard(dashboard_id: int) -> dict:
+        """Get one dashboard with its charts."""
+        await work()
+        return {"id": dashboard_id, "title": f"dashboard {dashboard_id}", "charts": _rows(rows, "chart")}
+
+    @mcp.tool()
+    async def list_charts() -> list:
+        """List all Superset charts."""
+        await work()
+        return _rows(rows, "chart")
+
+    @mcp.tool()
+    async def list_datasets() -> list:
+        """List all Superset datasets."""
+        await work()
+        return _rows(rows, "dataset")
+
+    @mcp.tool()
+    async def execute_sql(sql: str, database_id: int = 1) -> dict:
+        """Run a SQL query through SQL Lab and return the result rows."""
+        await work()
+        return {"query": sql, "database_id": database_id, "data": _rows(rows, "row")}
+
+    for verb, obj, description in _extra_tools(extra_tools):
+        if verb == "list":
+            async def tool() -> list:
+                await work()
+                return _rows(rows, "item")
+        else:
+            async def tool(id: int) -> dict:
+                await work()
+                return {"id": id, "rows": _rows(rows, "item")}
+        mcp.tool(tool, name=f"{verb}_{obj}{'s' if verb == 'list' else ''}", description=description)
+
+    return mcp
+
+
+def _extra_tools(count: int) -> list[tuple[str, str, str]]:
+    """(verb, object, description) of `count` more tools, object by object."""
+    tools = [(verb, obj, template.format(label)) for obj, label in _OBJECTS for verb, template in _VERBS]
+    return tools[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per tool call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds per tool call, at most")
+    parser.add_argument("--extra-tools", type=int, default=0,
+                        help=f"more tools in the catalog (at most {len(_OBJECTS) * len(_VERBS)})")
+    parser.add_argument("--payload-bytes", type=int, default=2000, help="approximate size of each tool result")
+    args = parser.parse_args()
+    create_server(args.latency, args.payload_bytes, args.jitter, args.extra_tools).run(
+        transport="http", host=args.host, port=args.port, log_level="warning", show_banner=False
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Local stand-in for an OpenAI-compatible `/v1/chat/completions` streaming endpoint.
+
+    python -m benchmarks.fake_openai --port 9100 --ttft 0.5 --tokens 50 --rate 100
+
+Point the API at it with BASE_URL=http://127.0.0.1:9100/v1.
+
+When the request offers `tools` (the MCP agent), the first `--tool-steps` turns answer with
+`--parallel-tools` calls to a tool that needs no arguments, then the final text is streamed.
+Non-streamed completions wait `--ttft`; with a `json_schema` response format they answer the
+smallest instance of the schema (the classification server's structured output). GET /stats counts
+completions, prompt bytes, the prompt bytes in a message prefix already sent before (what an
+upstream prompt cache could reuse), and the tools offered with their bytes (the JSON of their
+definitions).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+def _pick_tool(tools: list[dict]) -> str | None:
+    """Name of the first offered tool without required parameters."""
+    for tool in tools:
+        function = tool.get("function") or {}
+        if not (function.get("parameters") or {}).get("required"):
+            return function.get("name")
+    return None
+
+
+def _instance(schema: dict):
+    """Smallest value valid against a (strict, structured-output) JSON schema."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _instance(schema["properties"][name])
+                for name in schema.get("required", schema.get("properties", {}))}
+    if kind == "array":
+        return [_instance(schema.get("items", {})) for _ in range(max(1, schema.get("minItems", 0)))]
+    if kind in ("number", "integer"):
+        return schema.get("minimum", 1)
+    if kind == "boolean":
+        return False
+    return "x"
+
+
+def _prefixes(messages: list[dict]):
+    """(digest, bytes so far) after each message: the prompt prefixes an upstream cache would key on."""
+    digest = hashlib.sha256()
+    size = 0
+    for message in messages:
+        part = json.dumps(message, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        digest.update(part)
+        size += len(part)
+        yield digest.digest(), size
+
+
+def create_app(ttft: float, tokens: int, rate: float, tool_steps: int = 1, tail_prob: float = 0.0,
+               tail_ttft: float = 0.0, parallel_tools: int = 1) -> Starlette:
+    counts = {"completions": 0, "prompt_bytes": 0, "cached_prompt_bytes": 0, "tools_offered": 0, "tools_bytes": 0}
+    seen: set[bytes] = set()
+
+    async def stats(_: Request):
+        return JSONResponse(counts)
+
+    async def chat_completions(request: Request):
+        counts["completions"] += 1
+        body = await request.json()
+        cached = size = 0
+        for digest, size in _prefixes(body.get("messages", [])):
+            if digest in seen:
+                cached = size
+            seen.add(digest)
+        counts["prompt_bytes"] += size
+        counts["cached_prompt_bytes"] += cached
+        if body.get("tools"):
+            counts["tools_offered"] += len(body["tools"])
+            counts["tools_bytes"] += len(json.dumps(body["tools"], ensure_ascii=False).encode("utf-8"))
+        model = body.get("model") or "fake"
+        created = int(time.time())
+
+        def chunk(delta: dict, finish_reason: str | None = None) -> str:
+            payload = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft)
+            response_format = body.get("response_format") or {}
+            if response_format.get("type") == "json_schema":
+                text = json.dumps(_instance(response_format["json_schema"]["schema"]), ensure_ascii=False)
+            else:
+                text = " ".join(f"tok{i}" for i in range(tokens))
+            return JSONResponse({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+            })
+
+        tool = _pick_tool(body.get("tools") or [])
+        tool_turns = sum(1 for m in body.get("messages", []) if m.get("role") == "assistant" and m.get("tool_calls"))
+        if tool is not None and tool_turns < tool_steps:
+            async def call_tool():
+                await asyncio.sleep(ttft)
+                yield chunk({"role": "assistant", "content": None})
+                for i in range(parallel_tools):
+                    yield chunk({"tool_calls": [{
+                        "index": i, "id": f"call_{tool_turns}_{i}", "type": "function",
+                        "function": {"name": tool, "arguments": ""},
+                    }]})
+                    yield chunk({"tool_calls": [{"index": i, "function": {"arguments": "{}"}}]})
+                yield chunk({}, "tool_calls")
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(call_tool(), media_type="text/event-stream")
+
+        async def stream():
+            await asyncio.sleep(tail_ttft if random.random() < tail_prob else ttft)
+            yield chunk({"role": "assistant", "content": ""})
+            for i in range(tokens):
+                yield chunk({"content": f"tok{i} "})
+                if rate > 0:
+                    await asyncio.sleep(1 / rate)
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/stats", stats),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft", type=float, default=0.5, help="seconds before the first chunk")
+    parser.add_argument("--tokens", type=int, default=50, help="content chunks per completion")
+    parser.add_argument("--rate", type=float, default=100, help="chunks per second (0 = unthrottled)")
+    parser.add_argument("--tool-steps", type=int, default=1, help="tool calls before answering when tools are offered")
+    parser.add_argument("--parallel-tools", type=int, default=1, help="tool calls per tool turn")
+    parser.add_argument("--tail-prob", type=float, default=0.0, help="share of completions with a slow first chunk")
+    parser.add_argument("--tail-ttft", type=float, default=2.0, help="first-chunk delay of those slow completions")
+    args = parser.parse_args()
+    app = create_app(args.ttft, args.tokens, args.rate, args.tool_steps, args.tail_prob, args.tail_ttft,
+                     args.parallel_tools)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Import-time profile of the API module: runs `python -X importtime -c "import main"` in a fresh
+interpreter and reports the total, the slowest top-level packages (cumulative) and whether any of
+the libraries that are meant to load lazily got imported anyway.
+
+    python -m benchmarks.import_profile --top 15
+"""
+import argparse
+import subprocess
+import sys
+
+from benchmarks.common import ROOT
+
+LAZY = ("openai", "langchain_openai", "langchain_core", "mcp_use", "mcp")
+
+
+def profile(module: str) -> list[tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) for every import, in completion order."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = profile(args.module)
+    total = next(cumulative for name, _, cumulative in reversed(rows) if name.strip() == args.module)
+    # the outermost import of each package carries the cost of everything it pulled in
+    packages: dict[str, int] = {}
+    for name, _, cumulative in rows:
+        package = name.strip().split(".")[0]
+        if package != args.module:
+            packages[package] = max(packages.get(package, 0), cumulative)
+    print(f"import {args.module}: {total / 1000:.0f} ms over {len(rows)} modules")
+    for package, cumulative in sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {package}")
+    loaded = sorted({name.strip().split(".")[0] for name, _, _ in rows} & set(LAZY))
+    print(f"lazy libraries imported at startup: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
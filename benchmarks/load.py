@@ -0,0 +1,180 @@
+"""
+Load/latency benchmark for the streaming endpoints, fully offline.
+
+Starts the fake OpenAI upstream, the fake Superset MCP server and the API, then replays a question
+set against `/stream/ask-question` and/or `/root-stream` at a fixed concurrency. Reports per
+endpoint p50/p95/p99 time to first content frame (first `delta` / first `step` or `final`), total
+latency, frames/s, and the API process' peak RSS and CPU usage over the run.
+
+The answer cache and single-flight are disabled by default so every request reaches the
+upstreams; pass --cache to measure with them on.
+
+    python -m benchmarks.load --endpoint both --concurrency 32 --requests 400
+    python -m benchmarks.load --endpoint mcp --tool-steps 3 --tool-latency 0.1 --payload-bytes 50000
+    python -m benchmarks.load --url http://127.0.0.1:8000 --pid 12345   # an already running API
+    python -m benchmarks.load --endpoint mcp --payload-bytes 5000000 --env SSE_OBSERVATION_BUDGET=0
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from benchmarks.common import (
+    ROOT,
+    free_port,
+    percentile,
+    process_cpu_seconds,
+    process_rss_bytes,
+    spawn,
+    wait_for_port,
+)
+
+_CONTENT_EVENTS = {
+    "ask": {"delta"},
+    "mcp": {"step", "final"},
+}
+
+
+def load_questions(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["question"] for line in f if line.strip()]
+
+
+async def one_request(client: httpx.AsyncClient, endpoint: str, question: str, result: dict):
+    t0 = time.perf_counter()
+    first = None
+    frames = 0
+    failed = False
+    if endpoint == "ask":
+        stream = client.stream("POST", "/stream/ask-question", json={"user_question": question})
+    else:
+        stream = client.stream("GET", "/root-stream", params={"question": question})
+    try:
+        async with stream as resp:
+            async for line in resp.aiter_lines():
+                if line.startswith("data:"):
+                    frames += 1
+                elif line.startswith("event:"):
+                    event = line[6:].strip()
+                    if first is None and event in _CONTENT_EVENTS[endpoint]:
+                        first = time.perf_counter() - t0
+                    failed = failed or event == "error"
+    except httpx.HTTPError:
+        failed = True
+    if failed or first is None:
+        result["errors"] += 1
+        return
+    result["ttft"].append(first)
+    result["total"].append(time.perf_counter() - t0)
+    result["frames"] += frames
+
+
+async def run_endpoint(base_url: str, endpoint: str, questions: list[str], requests: int,
+                       concurrency: int, pid: int | None) -> dict:
+    result = {"ttft": [], "total": [], "frames": 0, "errors": 0, "peak_rss": 0}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(questions[i % len(questions)])
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        async def worker():
+            while not queue.empty():
+                await one_request(client, endpoint, queue.get_nowait(), result)
+
+        async def sample_rss():
+            while True:
+                result["peak_rss"] = max(result["peak_rss"], process_rss_bytes(pid))
+                await asyncio.sleep(0.2)
+
+        sampler = asyncio.create_task(sample_rss()) if pid else None
+        cpu0 = process_cpu_seconds(pid) if pid else 0.0
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result["elapsed"] = time.perf_counter() - t0
+        result["cpu"] = process_cpu_seconds(pid) - cpu0 if pid else float("nan")
+        if sampler is not None:
+            sampler.cancel()
+    return result
+
+
+def report(endpoint: str, result: dict, requests: int):
+    elapsed = result["elapsed"]
+    print(f"[{endpoint}] {requests - result['errors']}/{requests} ok, {result['errors']} errors, "
+          f"wall {elapsed:.2f}s")
+    for name in ("ttft", "total"):
+        values = result[name]
+        print(f"  {name:<7}: p50 {percentile(values, 50) * 1000:8.1f} ms  p95 {percentile(values, 95) * 1000:8.1f} ms  "
+              f"p99 {percentile(values, 99) * 1000:8.1f} ms")
+    print(f"  frames : {result['frames']} ({result['frames'] / elapsed:.0f}/s)")
+    if result["peak_rss"]:
+        print(f"  api    : peak RSS {result['peak_rss'] / 2**20:.1f} MiB, "
+              f"CPU {result['cpu']:.2f}s ({100 * result['cpu'] / elapsed:.0f}% of one core)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=["ask", "mcp", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--questions", default=os.path.join(ROOT, "benchmarks", "questions.jsonl"))
+    parser.add_argument("--url", help="benchmark an already running API instead of spawning one")
+    parser.add_argument("--pid", type=int, help="API process to sample RSS/CPU from (with --url)")
+    parser.add_argument("--cache", action="store_true", help="keep the answer cache and single-flight on")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the spawned API (repeatable)")
+    parser.add_argument("--pool-size", type=int, default=0,
+                        help="MCP_POOL_SIZE for the spawned API (0 = one session per admitted run)")
+    parser.add_argument("--ttft", type=float, default=0.2, help="fake OpenAI: seconds before the first chunk")
+    parser.add_argument("--tokens", type=int, default=50, help="fake OpenAI: chunks per completion")
+    parser.add_argument("--rate", type=float, default=200, help="fake OpenAI: chunks per second")
+    parser.add_argument("--tool-steps", type=int, default=1, help="fake OpenAI: tool calls per agent run")
+    parser.add_argument("--tool-latency", type=float, default=0.05, help="fake MCP: seconds per tool call")
+    parser.add_argument("--payload-bytes", type=int, default=2000, help="fake MCP: size of each tool result")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    endpoints = ["ask", "mcp"] if args.endpoint == "both" else [args.endpoint]
+    processes = []
+    try:
+        if args.url:
+            base_url, pid = args.url.rstrip("/"), args.pid
+        else:
+            openai_port, mcp_port, api_port = free_port(), free_port(), free_port()
+            processes.append(spawn(["-m", "benchmarks.fake_openai", "--port", str(openai_port),
+                                    "--ttft", str(args.ttft), "--tokens", str(args.tokens),
+                                    "--rate", str(args.rate), "--tool-steps", str(args.tool_steps)]))
+            processes.append(spawn(["-m", "benchmarks.fake_mcp", "--port", str(mcp_port),
+                                    "--latency", str(args.tool_latency),
+                                    "--payload-bytes", str(args.payload_bytes)]))
+            wait_for_port(openai_port)
+            wait_for_port(mcp_port)
+            env = {
+                "BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+                "API_KEY": "bench",
+                "MODEL_NAME": "fake",
+                "MCP_SERVER_URL": f"http://127.0.0.1:{mcp_port}/mcp",
+                "MCP_POOL_SIZE": str(args.pool_size),
+            }
+            if not args.cache:
+                env.update({"ANSWER_CACHE_TTL": "0", "SINGLE_FLIGHT_ENABLED": "false"})
+            env.update(item.split("=", 1) for item in args.env)
+            api = spawn(["-m", "uvicorn", "main:app", "--port", str(api_port), "--log-level", "warning"], env=env)
+            processes.append(api)
+            wait_for_port(api_port)
+            base_url, pid = f"http://127.0.0.1:{api_port}", api.pid
+
+        print(f"{len(questions)} questions, {args.requests} requests/endpoint, concurrency {args.concurrency}")
+        for endpoint in endpoints:
+            result = asyncio.run(run_endpoint(base_url, endpoint, questions, args.requests, args.concurrency, pid))
+            report(endpoint, result, args.requests)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
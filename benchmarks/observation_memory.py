@@ -0,0 +1,84 @@
+"""
+Memory one MCP stream spends on a large tool observation once the agent has it: the `step` frame,
+the `final` frame and, with --chunks, the `observation` chunk frames, built and encoded as the API
+sends them. Reports per SSE_OBSERVATION_BUDGET the peak of traced allocations (tracemalloc) on top
+of the observation itself, what the observation store keeps after the stream, and the bytes sent.
+
+The agent's own copies of the observation (MCP response, message history, the request to the LLM)
+are outside this path and the same for every budget, which is why they dominate the API's peak RSS
+in `benchmarks.load --payload-bytes 5000000`.
+
+    python -m benchmarks.observation_memory --payload-bytes 5000000 --budget 0,16384 --kind str,json
+"""
+import argparse
+import asyncio
+import gc
+import tracemalloc
+
+from services import mcp_use
+from services.observations import observation_store
+from utils.common import sse
+
+
+def _observation(kind: str, payload_bytes: int):
+    """A Superset-like listing of about `payload_bytes` bytes, as MCP text or as a JSON value."""
+    rows = [{"id": i, "name": f"dashboard {i}", "owner": f"user{i % 7}", "description": "x" * 200}
+            for i in range(max(1, payload_bytes // 260))]
+    if kind == "json":
+        return {"result": rows}
+    from utils.sse import dumps
+
+    return dumps({"result": rows}).decode("utf-8")
+
+
+async def _stream(observation, chunks: bool) -> int:
+    async def events():
+        output, ref, size = await mcp_use._bounded_observation(observation)
+        step = {"tool": "list_dashboards", "input": {}, "call_id": "call_0", "output": output, "cached": False}
+        if ref is not None:
+            step.update(truncated=True, ref=ref, output_chars=size)
+        yield "1", "step", step
+        yield "2", "final", {"observation_ref": ref} if ref is not None else {"observation": observation}
+
+    items = events()
+    if chunks:
+        items = mcp_use._expand_observations(items)
+    sent = 0
+    async for event_id, event, data in items:
+        sent += len(sse(event, data, id=event_id))
+    return sent
+
+
+def measure(observation, budget: int, chunks: bool) -> tuple[int, int, int]:
+    """(peak bytes allocated while streaming, bytes still held after it, bytes sent)"""
+    mcp_use.SSE_OBSERVATION_BUDGET = budget
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    sent = asyncio.run(_stream(observation, chunks))
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - before, after - before, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payload-bytes", type=int, default=5_000_000)
+    parser.add_argument("--budget", default="0,16384", help="comma-separated SSE_OBSERVATION_BUDGET values")
+    parser.add_argument("--kind", default="str,json", help="observation as MCP text (str) and/or a JSON value")
+    parser.add_argument("--chunks", action="store_true", help="also stream the full text as `observation` frames")
+    args = parser.parse_args()
+
+    for kind in args.kind.split(","):
+        observation = _observation(kind, args.payload_bytes)
+        for budget in (int(b) for b in args.budget.split(",")):
+            measure(observation, budget, args.chunks)  # warm up imports and caches
+            peak, held, sent = measure(observation, budget, args.chunks)
+            print(f"{kind:4s} budget {budget:6d}: peak {peak / 2**20:7.2f} MiB while streaming, "
+                  f"{held / 2**20:6.2f} MiB held after, {sent / 2**20:6.2f} MiB sent  "
+                  f"(store: {observation_store.stats()['entries']} entries)")
+
+
+if __name__ == "__main__":
+    main()
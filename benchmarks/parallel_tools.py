@@ -0,0 +1,90 @@
+"""
+MCP agent runs whose steps each ask for several independent tool calls, at several values of
+AGENT_TOOL_CONCURRENCY (1 = one call after the other). The fake upstream answers every tool turn
+with `--calls` calls and the fake MCP server takes `--latency` (+ up to `--jitter`) seconds per
+call. Reports the wall-clock time of a run, the time to its first `step` event, and whether the
+steps arrived out of call order (completion order).
+
+    python -m benchmarks.parallel_tools --calls 4 --steps 2 --latency 0.5 --concurrency 1,2,4
+"""
+import argparse
+import json
+import time
+
+import httpx
+
+from benchmarks.common import free_port, percentile, spawn, wait_for_port
+
+
+def run(port: int, question: str) -> tuple[float, float, bool]:
+    """(seconds to the final event, seconds to the first step, steps out of call order)"""
+    t0 = time.perf_counter()
+    first = None
+    call_ids = []
+    event = None
+    with httpx.stream("GET", f"http://127.0.0.1:{port}/root-stream", params={"question": question},
+                      timeout=120) as resp:
+        for line in resp.iter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+                if event == "step" and first is None:
+                    first = time.perf_counter() - t0
+                elif event == "error":
+                    raise RuntimeError("agent run failed")
+            elif line.startswith("data:") and event == "step":
+                call_ids.append(json.loads(line[5:])["call_id"])
+    # the fake upstream numbers its calls call_<turn>_<index>
+    issued = sorted(call_ids, key=lambda call_id: [int(n) for n in call_id.split("_")[1:]])
+    return time.perf_counter() - t0, first, call_ids != issued
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=4, help="tool calls per agent step")
+    parser.add_argument("--steps", type=int, default=2, help="agent steps with tool calls per run")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per tool call of the fake MCP server")
+    parser.add_argument("--jitter", type=float, default=0.2, help="extra random seconds per tool call, at most")
+    parser.add_argument("--concurrency", default="1,2,4", help="comma-separated AGENT_TOOL_CONCURRENCY values")
+    parser.add_argument("--runs", type=int, default=5, help="agent runs per concurrency value")
+    args = parser.parse_args()
+
+    openai_port, mcp_port = free_port(), free_port()
+    fake = spawn(["-m", "benchmarks.fake_openai", "--port", str(openai_port), "--ttft", "0.05", "--tokens", "5",
+                  "--rate", "0", "--tool-steps", str(args.steps), "--parallel-tools", str(args.calls)])
+    fake_mcp = spawn(["-m", "benchmarks.fake_mcp", "--port", str(mcp_port), "--latency", str(args.latency),
+                      "--jitter", str(args.jitter)])
+    try:
+        wait_for_port(openai_port)
+        wait_for_port(mcp_port)
+        print(f"{args.steps} steps x {args.calls} tool calls of {args.latency:g}-{args.latency + args.jitter:g} s")
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            port = free_port()
+            api = spawn(["-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], env={
+                "BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+                "API_KEY": "bench",
+                "MODEL_NAME": "fake",
+                "MCP_SERVER_URL": f"http://127.0.0.1:{mcp_port}/mcp",
+                "AGENT_TOOL_CONCURRENCY": str(concurrency),
+                "ANSWER_CACHE_TTL": "0",
+                "TOOL_CACHE_TTL": "0",  # every call is a round-trip to the MCP server
+            })
+            try:
+                wait_for_port(port)
+                run(port, "warm up")  # imports, pooled MCP sessions, upstream connections
+                results = [run(port, f"question {concurrency} {i}") for i in range(args.runs)]
+                totals = [r[0] for r in results]
+                firsts = [r[1] for r in results]
+                reordered = sum(r[2] for r in results)
+                print(f"concurrency {concurrency:2d}: run p50 {percentile(totals, 50) * 1000:6.0f} ms  "
+                      f"first step p50 {percentile(firsts, 50) * 1000:6.0f} ms  "
+                      f"{reordered}/{args.runs} runs streamed steps out of call order")
+            finally:
+                api.terminate()
+                api.wait()
+    finally:
+        fake.terminate()
+        fake_mcp.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Replays traffic recorded by services/recorder.py (RECORD_SAMPLE_RATE > 0) against a running API.
+
+Requests are sent in recorded order at their recorded arrival offsets divided by --speed, with the
+recorded method, path, query, body and Last-Event-ID. Every recorded client gets its own
+X-Api-Key, so per-client fair queuing sees the same set of clients. Requests whose client
+disconnected are cut off after the recorded duration. Reports per path the send lag behind
+schedule and the replayed vs recorded time to first content frame and total duration.
+
+    python -m benchmarks.replay requests.jsonl --url http://127.0.0.1:8000
+    python -m benchmarks.replay requests.jsonl.1 requests.jsonl --speed 4 --limit 500
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.common import percentile
+
+_CONTENT = ("event: delta", "event: step", "event: final")
+
+
+def load(paths: list[str], limit: int | None) -> list[dict]:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            records += [json.loads(line) for line in f if line.strip()]
+    # stable sort: records with the same arrival time keep their file order
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+def first_content(frames: list[list]) -> float | None:
+    return next((offset for offset, text in frames if any(c in text for c in _CONTENT)), None)
+
+
+async def replay_one(client: httpx.AsyncClient, record: dict, send_at: float, result: dict):
+    await asyncio.sleep(max(0.0, send_at - time.perf_counter()))
+    t0 = time.perf_counter()
+    result["lag"].append(t0 - send_at)
+    headers = {**record["headers"], "X-Api-Key": f"replay-{record['client']}"}
+    url = record["path"] + (f"?{record['query']}" if record["query"] else "")
+    first = None
+
+    async def run():
+        nonlocal first
+        async with client.stream(record["method"], url, headers=headers,
+                                 content=record["body"].encode("utf-8")) as resp:
+            if resp.status_code != record["status"]:
+                result["status_mismatch"] += 1
+            async for text in resp.aiter_text():
+                if first is None and any(c in text for c in _CONTENT):
+                    first = time.perf_counter() - t0
+
+    try:
+        if record["disconnected"]:
+            # the recorded client gave up after this long; so does the replayed one
+            await asyncio.wait_for(run(), timeout=record["duration"])
+        else:
+            await run()
+    except asyncio.TimeoutError:
+        pass
+    except httpx.HTTPError:
+        result["errors"] += 1
+        return
+    result["duration"].append(time.perf_counter() - t0)
+    if first is not None:
+        result["first"].append(first)
+
+
+async def replay(records: list[dict], url: str, speed: float) -> dict:
+    results = defaultdict(lambda: {"lag": [], "first": [], "duration": [], "errors": 0, "status_mismatch": 0})
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(base_url=url, timeout=300, limits=limits) as client:
+        start, ts0 = time.perf_counter() + 0.5, records[0]["ts"]
+        await asyncio.gather(*(
+            replay_one(client, r, start + (r["ts"] - ts0) / speed, results[r["path"]]) for r in records
+        ))
+    return results
+
+
+def ms(values: list[float], pct: float) -> str:
+    return f"{percentile(values, pct) * 1000:7.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="recording(s), e.g. requests.jsonl.1 requests.jsonl")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="arrival-rate multiplier (2 = twice as fast)")
+    parser.add_argument("--limit", type=int, help="replay only the first N recorded requests")
+    args = parser.parse_args()
+
+    records = load(args.files, args.limit)
+    if not records:
+        raise SystemExit("no recorded requests")
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"{len(records)} requests recorded over {span:.1f}s, replaying at {args.speed}x ({span / args.speed:.1f}s)")
+    results = asyncio.run(replay(records, args.url.rstrip("/"), args.speed))
+
+    recorded = defaultdict(lambda: {"first": [], "duration": []})
+    for r in records:
+        first = first_content(r["frames"])
+        if first is not None:
+            recorded[r["path"]]["first"].append(first)
+        recorded[r["path"]]["duration"].append(r["duration"])
+    for path, result in results.items():
+        rec = recorded[path]
+        print(f"{path}: {len(rec['duration'])} requests, {result['errors']} errors, "
+              f"{result['status_mismatch']} status mismatches, send lag p99 {ms(result['lag'], 99)} ms")
+        for name in ("first", "duration"):
+            label = "first content" if name == "first" else "duration"
+            print(f"  {label:<13} recorded p50 {ms(rec[name], 50)} p95 {ms(rec[name], 95)} ms | "
+                  f"replayed p50 {ms(result[name], 50)} p95 {ms(result[name], 95)} ms")
+
+
+if __name__ == "__main__":
+    main()
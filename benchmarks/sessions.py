@@ -0,0 +1,98 @@
+"""
+Multi-turn conversations on /stream/ask-question, with and without server-side sessions.
+
+Without a session the client carries the context itself: every question repeats the transcript so
+far. With one (POST /sessions) it sends only the new question. Reports per turn the request bytes
+sent by the client, the prompt bytes the upstream received, the share of those in a prefix the
+upstream had already seen (what its prompt cache could reuse), and the time to the first delta.
+
+    python -m benchmarks.sessions --conversations 8 --turns 12 --history-tokens 3000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.common import free_port, percentile, spawn, wait_for_port
+
+
+async def turn(client: httpx.AsyncClient, body: dict) -> tuple[str, int, float]:
+    """(answer, request bytes, seconds to the first delta)"""
+    content = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    t0 = time.perf_counter()
+    first = None
+    answer = []
+    event = None
+    async with client.stream("POST", "/stream/ask-question", content=content,
+                             headers={"Content-Type": "application/json"}) as resp:
+        async for line in resp.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:") and event == "delta":
+                first = first or time.perf_counter() - t0
+                answer.append(json.loads(line[5:])["content"])
+    return "".join(answer), len(content), first or float("nan")
+
+
+async def conversation(client: httpx.AsyncClient, n: int, turns: int, session: bool, result: dict):
+    session_id = (await client.post("/sessions")).json()["session_id"] if session else None
+    transcript = ""
+    for i in range(turns):
+        question = f"Conversation {n}, question {i}: what about the next step?"
+        if session:
+            body = {"user_question": question, "session_id": session_id}
+        else:
+            body = {"user_question": f"{transcript}User: {question}"}
+        answer, size, first = await turn(client, body)
+        transcript += f"User: {question}\nAssistant: {answer}\n"
+        result["request_bytes"].append(size)
+        result["first"].append(first)
+
+
+async def run(port: int, conversations: int, turns: int, session: bool) -> dict:
+    result = {"request_bytes": [], "first": []}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+        await asyncio.gather(*(conversation(client, n, turns, session, result) for n in range(conversations)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--history-tokens", type=int, default=3000, help="SESSION_HISTORY_TOKENS of the API")
+    parser.add_argument("--answer-tokens", type=int, default=60, help="tokens per answer of the fake upstream")
+    args = parser.parse_args()
+
+    openai_port, port = free_port(), free_port()
+    fake = spawn(["-m", "benchmarks.fake_openai", "--port", str(openai_port), "--ttft", "0.1",
+                  "--tokens", str(args.answer_tokens), "--rate", "2000"])
+    api = spawn(["-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], env={
+        "BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "API_KEY": "bench",
+        "MODEL_NAME": "fake",
+        "ANSWER_CACHE_TTL": "0",
+        "SESSION_HISTORY_TOKENS": str(args.history_tokens),
+    })
+    try:
+        wait_for_port(openai_port)
+        wait_for_port(port)
+        total = args.conversations * args.turns
+        for session in (False, True):
+            before = httpx.get(f"http://127.0.0.1:{openai_port}/stats").json()
+            result = asyncio.run(run(port, args.conversations, args.turns, session))
+            after = httpx.get(f"http://127.0.0.1:{openai_port}/stats").json()
+            prompt = after["prompt_bytes"] - before["prompt_bytes"]
+            cached = after["cached_prompt_bytes"] - before["cached_prompt_bytes"]
+            print(f"{'session  ' if session else 'stateless'}: request {sum(result['request_bytes']) / total:7.0f} B/turn  "
+                  f"upstream prompt {prompt / total:7.0f} B/turn, {100 * cached / max(1, prompt):5.1f}% in a seen prefix  "
+                  f"first delta p50 {percentile(result['first'], 50) * 1000:5.0f} ms")
+    finally:
+        api.terminate()
+        fake.terminate()
+
+
+if __name__ == "__main__":
+    main()
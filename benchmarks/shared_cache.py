@@ -0,0 +1,123 @@
+"""
+Cache effectiveness with one vs several uvicorn workers, with and without the shared store.
+
+Replays `--requests` questions drawn from `--distinct` different ones against each endpoint and
+reads the fake upstreams' counters to see how much work actually reached them: the answer hit rate
+is the share of requests that needed no completion, the tool hit rate the share of agent tool
+calls that needed no MCP round-trip. Single-flight is off so only the caches are measured.
+
+    python -m benchmarks.shared_cache --workers 4 --requests 200 --distinct 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import free_port, percentile, spawn, wait_for_port
+
+async def one(client: httpx.AsyncClient, endpoint: str, question: str) -> float:
+    t0 = time.perf_counter()
+    if endpoint == "ask":
+        stream = client.stream("POST", "/stream/ask-question", json={"user_question": question})
+    else:
+        stream = client.stream("GET", "/root-stream", params={"question": question})
+    async with stream as resp:
+        async for _ in resp.aiter_lines():
+            pass
+    return time.perf_counter() - t0
+
+
+async def drive(port: int, endpoint: str, requests: int, distinct: int, concurrency: int) -> tuple[list, float]:
+    questions = [f"{endpoint} question {i % distinct}" for i in range(requests)]
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    # no keep-alive: every request is a new connection, so requests spread over the workers
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        async def run(question):
+            async with semaphore:
+                latencies.append(await one(client, endpoint, question))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(run(q) for q in questions))
+        return latencies, time.perf_counter() - t0
+
+
+def wait_warm(port: int, timeout: float = 120):
+    """Until /healthz reports warm many times in a row, i.e. from every worker."""
+    deadline, streak = time.monotonic() + timeout, 0
+    while streak < 50:
+        if time.monotonic() > deadline:
+            raise RuntimeError("workers did not finish prewarming")
+        streak = streak + 1 if httpx.get(f"http://127.0.0.1:{port}/healthz").json()["warm"] else 0
+        time.sleep(0.01)
+
+
+def counters(openai_port: int, mcp_port: int) -> tuple[int, int]:
+    completions = httpx.get(f"http://127.0.0.1:{openai_port}/stats").json()["completions"]
+    tool_calls = httpx.get(f"http://127.0.0.1:{mcp_port}/stats").json()["tool_calls"]
+    return completions, tool_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--distinct", type=int, default=20, help="distinct questions among them")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    openai_port, mcp_port = free_port(), free_port()
+    fakes = [
+        spawn(["-m", "benchmarks.fake_openai", "--port", str(openai_port), "--ttft", "0.2", "--tokens", "30",
+               "--rate", "300", "--tool-steps", "1"]),
+        spawn(["-m", "benchmarks.fake_mcp", "--port", str(mcp_port), "--latency", "0.2"]),
+    ]
+    tmp = tempfile.TemporaryDirectory()
+    try:
+        wait_for_port(openai_port)
+        wait_for_port(mcp_port)
+        setups = [(1, ""), (args.workers, ""), (args.workers, f"sqlite:///{os.path.join(tmp.name, 'shared.db')}")]
+        for workers, store in setups:
+            port = free_port()
+            api = spawn(["-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+                         "--log-level", "warning"], env={
+                "BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+                "API_KEY": "bench",
+                "MODEL_NAME": "fake",
+                "MCP_SERVER_URL": f"http://127.0.0.1:{mcp_port}/mcp",
+                "MCP_POOL_SIZE": "2",
+                "SINGLE_FLIGHT_ENABLED": "false",
+                "SHARED_STORE": store,
+            })
+            try:
+                wait_for_port(port)
+                wait_warm(port)
+                label = f"{workers} worker{'s' if workers > 1 else ' '} {'shared' if store else 'local '}"
+                for endpoint in ("ask", "mcp"):
+                    completions0, tools0 = counters(openai_port, mcp_port)
+                    latencies, elapsed = asyncio.run(
+                        drive(port, endpoint, args.requests, args.distinct, args.concurrency))
+                    completions, tools = counters(openai_port, mcp_port)
+                    # an agent run is two completions (tool call, answer) and one tool call
+                    runs = (completions - completions0) / (1 if endpoint == "ask" else 2)
+                    tool_calls = tools - tools0
+                    hits = f"answer hits {100 * (1 - runs / args.requests):5.1f}%"
+                    if endpoint == "mcp":
+                        hits += f"  tool hits {100 * (1 - tool_calls / max(1, runs)):5.1f}%"
+                    print(f"{label} {endpoint}: {hits:<40} p50 {percentile(latencies, 50) * 1000:6.0f} ms  "
+                          f"p95 {percentile(latencies, 95) * 1000:6.0f} ms  {args.requests / elapsed:6.1f} req/s")
+            finally:
+                api.terminate()
+                api.wait()
+    finally:
+        for fake in fakes:
+            fake.terminate()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Frames/sec and API CPU per stream with and without delta coalescing on /stream/ask-question.
+
+    python -m benchmarks.sse_coalescing --streams 50 --tokens 500 --rate 500
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import free_port, process_cpu_seconds, spawn, wait_for_port
+
+
+async def one_stream(client: httpx.AsyncClient, question: str, coalesce) -> int:
+    frames = 0
+    body = {"user_question": question, "coalesce": coalesce}
+    async with client.stream("POST", "/stream/ask-question", json=body) as resp:
+        async for line in resp.aiter_lines():
+            if line.startswith("event: "):
+                frames += 1
+            if line == "event: end":
+                break
+    return frames
+
+
+async def run(port: int, streams: int, coalesce, tag: str):
+    limits = httpx.Limits(max_connections=streams)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        t0 = time.perf_counter()
+        # distinct questions so neither single-flight nor the answer cache kicks in
+        counts = await asyncio.gather(*(one_stream(client, f"{tag}-{i}", coalesce) for i in range(streams)))
+        return sum(counts), time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=500, help="upstream chunks/sec per stream")
+    parser.add_argument("--window-ms", type=float, default=20)
+    parser.add_argument("--max-bytes", type=int, default=512)
+    args = parser.parse_args()
+
+    upstream_port, api_port = free_port(), free_port()
+    upstream = spawn(["-m", "benchmarks.fake_openai", "--port", str(upstream_port), "--ttft", "0.1",
+                      "--tokens", str(args.tokens), "--rate", str(args.rate)])
+    api = spawn(["-m", "uvicorn", "main:app", "--port", str(api_port), "--log-level", "warning"],
+                env={"BASE_URL": f"http://127.0.0.1:{upstream_port}/v1", "API_KEY": "bench", "MODEL_NAME": "fake",
+                     "MCP_POOL_SIZE": "1", "ANSWER_CACHE_TTL": "0"})
+    try:
+        wait_for_port(upstream_port)
+        wait_for_port(api_port)
+        asyncio.run(run(api_port, 2, False, "warmup"))
+        modes = [("off", False), ("on", {"window_ms": args.window_ms, "max_bytes": args.max_bytes})]
+        print(f"{'coalesce':<9}{'frames':>9}{'frames/s':>11}{'wall s':>9}{'API CPU ms/stream':>20}")
+        for name, coalesce in modes:
+            cpu0 = process_cpu_seconds(api.pid)
+            frames, elapsed = asyncio.run(run(api_port, args.streams, coalesce, name))
+            cpu = process_cpu_seconds(api.pid) - cpu0
+            print(f"{name:<9}{frames:>9}{frames / elapsed:>11.0f}{elapsed:>9.2f}"
+                  f"{cpu / args.streams * 1000:>20.1f}")
+    finally:
+        api.terminate()
+        upstream.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Per-frame cost of SSE encoding: the former str encoders (`utils.common.sse` / `mcp_use._sse`,
+reproduced below, plus the UTF-8 encode Starlette applied to every str chunk) against the shared
+bytes encoder in `utils.sse` with each JSON backend.
+
+    python -m benchmarks.sse_encoding --number 20000
+"""
+import argparse
+import json
+import timeit
+
+from mcp.types import CallToolResult, TextContent
+
+from utils import sse as sse_module
+
+
+def legacy_sse(event, data, id=None, retry=None) -> bytes:
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    head = f"id: {id}\n" if id is not None else ""
+    if retry is not None:
+        head += f"retry: {retry}\n"
+    return (f"{head}event: {event}\n" f"data: {payload}\n\n").encode("utf-8")
+
+
+def _legacy_fallback(o):
+    try:
+        return dict(o)
+    except Exception:
+        return repr(o)
+
+
+def legacy_mcp_sse(event=None, data=None, id=None, retry=None) -> bytes:
+    parts = []
+    if id is not None:
+        parts.append(f"id: {id}")
+    if retry is not None:
+        parts.append(f"retry: {retry}")
+    if event:
+        parts.append(f"event: {event}")
+    if data is not None:
+        if not isinstance(data, str):
+            try:
+                data = json.dumps(data, ensure_ascii=False, default=_legacy_fallback)
+            except Exception:
+                data = str(data)
+        parts.append(f"data: {data}")
+    return ("\n".join(parts) + "\n\n").encode("utf-8")
+
+
+ROWS = [{"id": i, "name": f"dashboard {i}", "owner": f"user{i}", "published": i % 2 == 0} for i in range(25)]
+FRAMES = {
+    "delta": ("delta", {"content": "Xin chào"}),
+    "step (2KB rows)": ("step", {"tool": "list_dashboards", "input": {}, "output": ROWS, "cached": False}),
+    "step (MCP result)": ("step", {"tool": "get_chart", "input": {"id": 1},
+                                   "output": CallToolResult(content=[TextContent(type="text", text="x" * 500)])}),
+}
+
+
+def per_frame_us(fn, event, data, number: int) -> float:
+    return min(timeit.repeat(lambda: fn(event, data, id="run:42", retry=2000), number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="frames per timing")
+    args = parser.parse_args()
+
+    backends = ["json"] + (["orjson"] if sse_module.orjson is not None else [])
+    print(f"{'frame':<20}{'legacy sse':>12}{'legacy _sse':>13}" + "".join(f"{'bytes/' + b:>14}" for b in backends))
+    for name, (event, data) in FRAMES.items():
+        row = []
+        # the legacy sse() could not serialize the MCP result at all
+        row.append(per_frame_us(legacy_sse, event, data, args.number) if "MCP" not in name else None)
+        row.append(per_frame_us(legacy_mcp_sse, event, data, args.number))
+        for backend in backends:
+            sse_module.set_json_backend(backend)
+            row.append(per_frame_us(sse_module.encode, event, data, args.number))
+        cells = [f"{'n/a':>12}" if v is None else f"{v:>10.2f}us" for v in row]
+        print(f"{name:<20}" + "".join(f"{c:>{w}}" for c, w in zip(cells, [12, 13] + [14] * len(backends))))
+
+
+if __name__ == "__main__":
+    main()
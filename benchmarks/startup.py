@@ -0,0 +1,91 @@
+"""
+Cold start of the API: time from process spawn to the first healthy response, to the end of the
+background prewarm, and to the first content of an /stream/ask-question and a /root-stream request
+sent right after the app became healthy. Runs against the fake upstreams, with prewarm on and off.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --path /metrics   # trees without /healthz
+"""
+import argparse
+import time
+
+import httpx
+
+from benchmarks.common import free_port, percentile, spawn, wait_for_port
+
+
+def wait_until(check, timeout: float = 60) -> float:
+    """Poll `check` every 5 ms; returns the time.perf_counter() at which it first held."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"not ready after {timeout}s")
+
+
+def first_content(client: httpx.Client, method: str, url: str, events: set[str], **kwargs) -> float:
+    t0 = time.perf_counter()
+    with client.stream(method, url, **kwargs) as resp:
+        for line in resp.iter_lines():
+            if line.startswith("event:") and line[6:].strip() in events:
+                return time.perf_counter() - t0
+    return float("nan")
+
+
+def one_run(env: dict, path: str) -> dict:
+    port = free_port()
+    t0 = time.perf_counter()
+    api = spawn(["-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], env=env)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            healthy = wait_until(lambda: client.get(path, timeout=1).status_code == 200) - t0
+            ask = first_content(client, "POST", "/stream/ask-question", {"delta"}, json={"user_question": "hi"})
+            mcp = first_content(client, "GET", "/root-stream", {"step", "final"}, params={"question": "dashboards"})
+            warm = float("nan")
+            if env["STARTUP_PREWARM"] == "true" and path == "/healthz":
+                warm = wait_until(lambda: client.get(path).json()["warm"]) - t0
+        return {"healthy": healthy, "warm": warm, "ask": ask, "mcp": mcp}
+    finally:
+        api.terminate()
+        api.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/healthz", help="endpoint polled for the first healthy response")
+    args = parser.parse_args()
+
+    openai_port, mcp_port = free_port(), free_port()
+    fakes = [
+        spawn(["-m", "benchmarks.fake_openai", "--port", str(openai_port), "--ttft", "0.05", "--tool-steps", "1"]),
+        spawn(["-m", "benchmarks.fake_mcp", "--port", str(mcp_port)]),
+    ]
+    try:
+        wait_for_port(openai_port)
+        wait_for_port(mcp_port)
+        for prewarm in ("false", "true"):
+            env = {
+                "BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+                "API_KEY": "bench",
+                "MODEL_NAME": "fake",
+                "MCP_SERVER_URL": f"http://127.0.0.1:{mcp_port}/mcp",
+                "ANSWER_CACHE_TTL": "0",
+                "STARTUP_PREWARM": prewarm,
+            }
+            runs = [one_run(env, args.path) for _ in range(args.runs)]
+            print(f"prewarm {prewarm:<5}: " + "  ".join(
+                f"{name} p50 {percentile([r[name] for r in runs], 50) * 1000:7.0f} ms"
+                for name in ("healthy", "warm", "ask", "mcp")
+            ))
+    finally:
+        for fake in fakes:
+            fake.terminate()
+
+
+if __name__ == "__main__":
+    main()
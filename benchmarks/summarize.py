@@ -0,0 +1,92 @@
+"""
+Document summarization (POST /stream/summarize) against the fake upstream at several values of
+SUMMARY_CONCURRENCY: time to the first partial summary and to the final one for a generated text
+document, then the same upload again (served from the content-hash cache).
+
+    python -m benchmarks.summarize --kib 256 --concurrency 1,4,16 --latency 0.5
+"""
+import argparse
+import json
+import random
+import time
+
+import httpx
+
+from benchmarks.common import free_port, spawn, wait_for_port
+
+_WORDS = "revenue margin growth risk capital insurance float earnings shareholders buyback debt".split()
+
+
+def document(kib: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < kib * 1024:
+        paragraph = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(30, 150))) + "."
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs).encode("utf-8")
+
+
+def upload(port: int, content: bytes) -> tuple[float, float, int, int]:
+    """(seconds to the first partial, seconds to the summary, chunks, levels)"""
+    t0 = time.perf_counter()
+    first = done = None
+    chunks = levels = 0
+    event = None
+    with httpx.stream("POST", f"http://127.0.0.1:{port}/stream/summarize", timeout=600,
+                      files={"file": ("report.txt", content, "text/plain")}) as resp:
+        for line in resp.iter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+                if event == "partial" and first is None:
+                    first = time.perf_counter() - t0
+                elif event == "summary":
+                    done = time.perf_counter() - t0
+                elif event == "error":
+                    raise RuntimeError("summarization failed")
+            elif line.startswith("data:") and event == "summary":
+                summary = json.loads(line[5:])
+                chunks, levels = summary["chunks"], summary["levels"]
+    return first, done, chunks, levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kib", type=int, default=256, help="document size")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated SUMMARY_CONCURRENCY values")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per completion of the fake upstream")
+    parser.add_argument("--chunk-tokens", type=int, default=2000, help="SUMMARY_CHUNK_TOKENS")
+    args = parser.parse_args()
+
+    openai_port = free_port()
+    fake = spawn(["-m", "benchmarks.fake_openai", "--port", str(openai_port), "--ttft", str(args.latency),
+                  "--tokens", "80"])
+    try:
+        wait_for_port(openai_port)
+        for n, concurrency in enumerate(int(c) for c in args.concurrency.split(",")):
+            port = free_port()
+            api = spawn(["-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], env={
+                "BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+                "API_KEY": "bench",
+                "MODEL_NAME": "fake",
+                "SUMMARY_CONCURRENCY": str(concurrency),
+                "SUMMARY_CHUNK_TOKENS": str(args.chunk_tokens),
+            })
+            try:
+                wait_for_port(port)
+                content = document(args.kib, seed=n)
+                upload(port, document(1, seed=-1))  # warm up imports and connections
+                first, done, chunks, levels = upload(port, content)
+                _, cached, _, _ = upload(port, content)
+                print(f"concurrency {concurrency:3d}: {args.kib} KiB, {chunks} chunks, {levels} reduce levels  "
+                      f"first partial {first * 1000:6.0f} ms  summary {done * 1000:7.0f} ms  "
+                      f"re-upload {cached * 1000:5.0f} ms")
+            finally:
+                api.terminate()
+                api.wait()
+    finally:
+        fake.terminate()
+
+
+if __name__ == "__main__":
+    main()
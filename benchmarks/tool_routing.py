@@ -0,0 +1,89 @@
+"""
+MCP agent runs against a fake MCP server with a large tool catalog, with and without question-aware
+tool routing (TOOL_ROUTER_MAX_TOOLS). Reports per LLM call of the agent the tools offered and the
+bytes of the tool definitions plus the messages (whose system prompt lists the tools) the upstream
+received, and the router's own estimate of the prompt tokens it saved.
+
+    python -m benchmarks.tool_routing --extra-tools 60 --max-tools 0,8
+"""
+import argparse
+
+import httpx
+
+from benchmarks.common import free_port, spawn, wait_for_port
+
+QUESTIONS = [
+    "Which dashboards do we have?",
+    "List the charts",
+    "What datasets are available?",
+    "Show me the saved SQL Lab snippets",
+    "Which alerts are configured?",
+    "List all scheduled reports",
+    "Who are the users?",
+    "Which roles exist and what permissions do they have?",
+    "What database connections are set up?",
+    "Show the annotation layers",
+    "Which tags are used?",
+    "List the dashboard CSS templates",
+]
+
+
+def ask(port: int, question: str):
+    with httpx.stream("GET", f"http://127.0.0.1:{port}/root-stream", params={"question": question},
+                      timeout=120) as resp:
+        for line in resp.iter_lines():
+            if line.startswith("event: error"):
+                raise RuntimeError("agent run failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--extra-tools", type=int, default=60, help="tools added to the fake catalog of 5")
+    parser.add_argument("--max-tools", default="0,8", help="comma-separated TOOL_ROUTER_MAX_TOOLS values")
+    args = parser.parse_args()
+
+    openai_port, mcp_port = free_port(), free_port()
+    fake = spawn(["-m", "benchmarks.fake_openai", "--port", str(openai_port), "--ttft", "0.05", "--tokens", "5",
+                  "--rate", "0", "--tool-steps", "1"])
+    fake_mcp = spawn(["-m", "benchmarks.fake_mcp", "--port", str(mcp_port), "--latency", "0.01",
+                      "--extra-tools", str(args.extra_tools)])
+    try:
+        wait_for_port(openai_port)
+        wait_for_port(mcp_port)
+        for max_tools in (int(m) for m in args.max_tools.split(",")):
+            port = free_port()
+            api = spawn(["-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], env={
+                "BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+                "API_KEY": "bench",
+                "ADMIN_API_KEY": "bench",
+                "MODEL_NAME": "fake",
+                "MCP_SERVER_URL": f"http://127.0.0.1:{mcp_port}/mcp",
+                "TOOL_ROUTER_MAX_TOOLS": str(max_tools),
+                "ANSWER_CACHE_TTL": "0",
+            })
+            try:
+                wait_for_port(port)
+                ask(port, "warm up")  # imports, pooled MCP sessions, upstream connections
+                before = httpx.get(f"http://127.0.0.1:{openai_port}/stats").json()
+                for question in QUESTIONS:
+                    ask(port, question)
+                after = httpx.get(f"http://127.0.0.1:{openai_port}/stats").json()
+                calls = after["completions"] - before["completions"]
+                offered = (after["tools_offered"] - before["tools_offered"]) / calls
+                tools_bytes = (after["tools_bytes"] - before["tools_bytes"]) / calls
+                prompt_bytes = (after["prompt_bytes"] - before["prompt_bytes"]) / calls
+                router = httpx.get(f"http://127.0.0.1:{port}/admin/stats", headers={"X-Api-Key": "bench"}).json()["tool_router"]
+                print(f"max tools {max_tools:2d}: {offered:5.1f} tools offered per LLM call  "
+                      f"tool definitions {tools_bytes:6.0f} B  messages {prompt_bytes:6.0f} B  "
+                      f"router estimate {router['prompt_tokens_saved_estimate']} tokens saved "
+                      f"over {router['llm_calls']} calls")
+            finally:
+                api.terminate()
+                api.wait()
+    finally:
+        fake.terminate()
+        fake_mcp.terminate()
+
+
+if __name__ == "__main__":
+    main()
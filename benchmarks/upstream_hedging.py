@@ -0,0 +1,69 @@
+"""
+Failover and hedging of `services.upstreams.UpstreamPool`.
+
+Starts two fake upstreams whose first token is occasionally slow (`--tail-prob` of completions
+wait `--tail-ttft` seconds) and lists a third, dead address first. It then runs the same number of
+completions with hedging off and on, and reports TTFT percentiles, failovers and hedges.
+
+    python -m benchmarks.upstream_hedging --requests 200 --tail-prob 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import free_port, percentile, spawn, wait_for_port
+from services.upstreams import Upstream, UpstreamPool
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+async def run(ports: list[int], dead_port: int, hedge: bool, requests: int, concurrency: int) -> tuple[list, dict]:
+    upstreams = [Upstream("dead", f"http://127.0.0.1:{dead_port}/v1", "bench", "fake", max_retries=0)]
+    upstreams += [Upstream(f"fake{i}", f"http://127.0.0.1:{p}/v1", "bench", "fake", max_retries=0)
+                  for i, p in enumerate(ports)]
+    pool = UpstreamPool(upstreams, cooldown=5, hedge=hedge, hedge_percentile=95, hedge_min_delay=0.05)
+    ttfts = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            t0 = time.perf_counter()
+            started = await pool.start_completion(MESSAGES)
+            ttfts.append(time.perf_counter() - t0)
+            async with started.stream:
+                async for _ in started.chunks:
+                    pass
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return ttfts, pool.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--tail-prob", type=float, default=0.05)
+    parser.add_argument("--tail-ttft", type=float, default=1.5)
+    args = parser.parse_args()
+
+    ports, dead_port = [free_port(), free_port()], free_port()
+    fakes = [spawn(["-m", "benchmarks.fake_openai", "--port", str(p), "--ttft", str(args.ttft), "--tokens", "5",
+                    "--rate", "0", "--tail-prob", str(args.tail_prob), "--tail-ttft", str(args.tail_ttft)])
+             for p in ports]
+    try:
+        for p in ports:
+            wait_for_port(p)
+        for hedge in (False, True):
+            ttfts, stats = asyncio.run(run(ports, dead_port, hedge, args.requests, args.concurrency))
+            print(f"hedge {'on ' if hedge else 'off'}: TTFT p50 {percentile(ttfts, 50) * 1000:7.1f} ms  "
+                  f"p95 {percentile(ttfts, 95) * 1000:7.1f} ms  p99 {percentile(ttfts, 99) * 1000:7.1f} ms  "
+                  f"max {max(ttfts) * 1000:7.1f} ms | failovers {stats['failovers']}, hedges {stats['hedges']} "
+                  f"(won {stats['hedges_won']})")
+    finally:
+        for fake in fakes:
+            fake.terminate()
+
+
+if __name__ == "__main__":
+    main()
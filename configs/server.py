@@ -1,7 +1,9 @@
+import os
+
 server_config = {
     "mcpServers": {
         "superset": {
-            "url": "https://tannguyen-superset-mcp.fastmcp.app/mcp",
+            "url": os.environ.get("MCP_SERVER_URL", "https://tannguyen-superset-mcp.fastmcp.app/mcp"),
         }
     }
 }
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+
+from services import ADMIN_API_KEY
+from services.admission import llm_admission
+from services.agent_limits import agent_limits
+from services.answer_cache import answer_cache, summary_cache
+from services.cancellation_stats import cancellation_stats
+from services.mcp_pool import mcp_pool
+from services.observations import observation_store
+from services.prewarm import prewarm
+from services.recorder import recorder
+from services.sessions import sessions
+from services.shared_store import shared_store
+from services.single_flight import single_flight
+from services.tool_cache import tool_cache
+from services.tool_router import tool_router
+from services.upstreams import upstream_pool
+from utils.common import normalize_question
+
+
+def _require_admin_key(x_api_key: str | None = Header(default=None)):
+    # closed unless a key is configured: these endpoints expose other users' questions and purge shared caches
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_API_KEY is not set)")
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid X-Api-Key")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(_require_admin_key)])
+
+
+@router.get("/cache")
+async def inspect_cache():
+    """Answer cache counters plus one row per stored answer (LRU order, oldest first)."""
+    return {"stats": answer_cache.stats(), "entries": answer_cache.entries()}
+
+
+@router.delete("/cache")
+async def purge_cache(question: str | None = Query(None, description="Only purge answers to this question")):
+    purged = await answer_cache.apurge(normalize_question(question) if question else None)
+    return {"purged": purged}
+
+
+@router.get("/stats")
+async def stats():
+    """Runtime counters of the streaming pipeline."""
+    return {
+        "cancellations": cancellation_stats.stats(),
+        "single_flight": single_flight.stats(),
+        "answer_cache": answer_cache.stats(),
+        "summary_cache": summary_cache.stats(),
+        "mcp_pool": mcp_pool.stats(),
+        "admission": llm_admission.stats(),
+        "upstreams": upstream_pool.stats(),
+        "tool_cache": tool_cache.stats(),
+        "tool_router": tool_router.stats(),
+        "agent_limits": agent_limits.stats(),
+        "observations": observation_store.stats(),
+        "prewarm": prewarm.stats(),
+        "shared_store": await shared_store.astats() if shared_store is not None else None,
+        "recorder": recorder.stats(),
+        "sessions": sessions.stats(),
+    }
+
+
+@router.delete("/tool-cache")
+async def purge_tool_cache():
+    return {"purged": await tool_cache.apurge()}
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from services.prewarm import prewarm
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness: answers as soon as the app accepts requests; `warm` once the prewarm finished."""
+    return {"status": "ok", "warm": prewarm.done}
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, File, Request, UploadFile
 from fastapi.responses import StreamingResponse
 
+from services import SSE_COALESCE_WINDOW_MS, SSE_COALESCE_MAX_BYTES, SUMMARY_MAX_BYTES
+from services.documents import DocumentError, read_upload
 from services.open_ai_service import OpenAIService
-from utils.common import sse
+from services.sessions import sessions
+from utils.common import sse, client_key
 
 router = APIRouter(prefix="/stream", tags=["stream"])
 
@@ -12,11 +15,24 @@ _SSE_HEADERS = {
 }
 
 
+def _coalesce_option(value) -> tuple[float, int] | None:
+    """`true` -> server defaults; {"window_ms": 20, "max_bytes": 512} -> overrides; falsy -> off."""
+    if not value:
+        return None
+    options = value if isinstance(value, dict) else {}
+    window_ms = float(options.get("window_ms", SSE_COALESCE_WINDOW_MS))
+    max_bytes = int(options.get("max_bytes", SSE_COALESCE_MAX_BYTES))
+    return max(0.0, window_ms) / 1000, max(1, max_bytes)
+
+
 @router.post("/ask-question", response_class=StreamingResponse)
 async def ask_question_stream_response(request: Request):
     """
-    Request JSON body: { "user_question": "..." }
-    Response: text/event-stream with events: start, delta*, end, (error)
+    Request JSON body: { "user_question": "...", "coalesce": true | {"window_ms": 20, "max_bytes": 512},
+                         "session_id": "..." }
+    Response: text/event-stream with events: status*, start, delta*, end, (error)
+    A `Last-Event-ID` header resumes a dropped stream from the frame after that id.
+    With `session_id` (from POST /sessions) the question continues that conversation.
     """
     try:
         body = await request.json()
@@ -37,8 +53,65 @@ async def ask_question_stream_response(request: Request):
             headers=_SSE_HEADERS,
         )
 
+    try:
+        coalesce = _coalesce_option(body.get("coalesce"))
+    except (TypeError, ValueError):
+        return StreamingResponse(
+            iter([sse("error", {"message": "'coalesce' must be a boolean or {window_ms, max_bytes}"}),
+                  sse("end", {"finish_reason": "error"})]),
+            media_type="text/event-stream",
+            headers=_SSE_HEADERS,
+        )
+
+    session = None
+    if body.get("session_id"):
+        session = await sessions.get(str(body["session_id"]))
+        if session is None:
+            return StreamingResponse(
+                iter([sse("error", {"message": "Unknown or expired session", "code": 404}),
+                      sse("end", {"finish_reason": "error"})]),
+                media_type="text/event-stream",
+                headers=_SSE_HEADERS,
+            )
+
+    return StreamingResponse(
+        OpenAIService.ask_question_stream_response(
+            user_question,
+            coalesce=coalesce,
+            request=request,
+            last_event_id=request.headers.get("last-event-id"),
+            client_key=client_key(request),
+            session=session,
+        ),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+    )
+
+
+@router.post("/summarize", response_class=StreamingResponse)
+async def summarize_document(request: Request, file: UploadFile = File(...)):
+    """
+    Multipart upload with a `file` field (UTF-8 text or PDF).
+    Response: text/event-stream with events: start, (status | partial)*, summary, end, (error)
+    A `Last-Event-ID` header resumes a dropped stream from the frame after that id.
+    """
+    try:
+        document = await read_upload(file, SUMMARY_MAX_BYTES)
+    except DocumentError as e:
+        return StreamingResponse(
+            iter([sse("error", {"message": str(e), "code": e.code}),
+                  sse("end", {"finish_reason": "error"})]),
+            media_type="text/event-stream",
+            headers=_SSE_HEADERS,
+        )
+
     return StreamingResponse(
-        OpenAIService.ask_question_stream_response(user_question),
+        OpenAIService.sumary_files(
+            document,
+            request=request,
+            last_event_id=request.headers.get("last-event-id"),
+            client_key=client_key(request),
+        ),
         media_type="text/event-stream",
         headers=_SSE_HEADERS,
     )
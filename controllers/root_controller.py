@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Query
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, HTMLResponse, Response
 
 from services.mcp_use import stream_mcp
+from services.observations import observation_store
+from services.sessions import sessions
+from utils.common import client_key
 
 router = APIRouter(tags=["root"])
 
@@ -13,14 +16,39 @@ _SSE_HEADERS = {
 
 
 @router.get("/root-stream", response_class=StreamingResponse)
-async def root(question: str = Query(..., description="User question to send to stream_mcp")):
+async def root(
+    request: Request,
+    question: str = Query(..., description="User question to send to stream_mcp"),
+    session_id: str | None = Query(None, description="Conversation to continue (from POST /sessions)"),
+):
+    session = None
+    if session_id:
+        session = await sessions.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired session")
     return StreamingResponse(
-        stream_mcp(question),
+        stream_mcp(
+            question,
+            request=request,
+            last_event_id=request.headers.get("last-event-id"),
+            client_key=client_key(request),
+            session=session,
+        ),
         media_type="text/event-stream",
         headers=_SSE_HEADERS,
     )
 
 
+@router.get("/observations/{ref}")
+async def observation(ref: str):
+    """Full tool observation referenced by a truncated `step` frame (`"ref"`)."""
+    stored = await observation_store.fetch(ref)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired observation")
+    media_type = "application/json" if stored.is_json else "text/plain; charset=utf-8"
+    return Response(stored.text, media_type=media_type)
+
+
 @router.get("/ui", response_class=HTMLResponse)
 async def ui():
     return HTMLResponse(
@@ -199,7 +227,8 @@ async def ui():
       es.addEventListener("status", (event) => {
         try {
           const payload = JSON.parse(event.data || "{}");
-          const msg = payload.message ?? JSON.stringify(payload);
+          const msg = (payload.message ?? JSON.stringify(payload))
+            + (payload.position ? " (position " + payload.position + " in queue)" : "");
           statusLine.innerHTML = '<span class="badge">status</span> ' + msg;
         } catch (_) {
           statusLine.innerHTML = '<span class="badge">status</span> ' + (event.data || "");
@@ -225,9 +254,19 @@ async def ui():
       es.addEventListener("final", (event) => {
         try {
           const payload = JSON.parse(event.data || "{}");
+          statusLine.innerHTML = '<span class="badge">final</span> Done.';
+          if (payload.observation_ref) {
+            // large observation: fetched once instead of being repeated in the frame
+            fetch("/observations/" + encodeURIComponent(payload.observation_ref))
+              .then((r) => r.text())
+              .then((text) => {
+                try { finalEl.textContent = prettyJSON(JSON.parse(text)); }
+                catch (_) { finalEl.textContent = text; }
+              });
+            return;
+          }
           const obs = payload.observation ?? payload;
           finalEl.textContent = prettyJSON(obs);
-          statusLine.innerHTML = '<span class="badge">final</span> Done.';
         } catch {
           finalEl.textContent = event.data || "";
         }
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException
+
+from services.sessions import sessions
+
+router = APIRouter(prefix="/sessions", tags=["sessions"])
+
+
+@router.post("")
+async def create_session():
+    """New conversation; pass the id as `session_id` to /stream/ask-question or /root-stream."""
+    session = await sessions.create()
+    return {"session_id": session.id, "idle_ttl_s": sessions.idle_ttl}
+
+
+@router.get("/{session_id}")
+async def inspect_session(session_id: str):
+    session = await sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return {
+        "session_id": session.id,
+        "turns": len(session.turns),
+        "tokens": session.tokens,
+        "summarized": bool(session.summary),
+    }
+
+
+@router.delete("/{session_id}")
+async def delete_session(session_id: str):
+    if not await sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return {"deleted": True}
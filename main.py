@@ -1,10 +1,34 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 from controllers.root_controller import router as root_router
 from controllers.question_controller import router as question_router
+from controllers.admin_controller import router as admin_router
+from controllers.metrics_controller import router as metrics_router
+from controllers.health_controller import router as health_router
+from controllers.session_controller import router as session_router
+from services import STARTUP_PREWARM
+from services.mcp_pool import mcp_pool
+from services.prewarm import prewarm
+from services.recorder import RecorderMiddleware, recorder
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # warm up in the background: the app accepts requests (and health checks) right away, and the
+    # first /root-stream request doesn't pay for imports and the MCP handshake if it comes later
+    if STARTUP_PREWARM:
+        prewarm.start()
+    recorder.start()
+    yield
+    await prewarm.stop()
+    await mcp_pool.close()
+    recorder.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -19,11 +43,17 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "OPTIONS"],
-    allow_headers=["Content-Type", "X-Api-Key", "Authorization", "Accept"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+    allow_headers=["Content-Type", "X-Api-Key", "Authorization", "Accept", "Last-Event-ID"],
     expose_headers=["Content-Type", "Cache-Control", "Connection"],
 )
+# outermost, so recorded timelines are what the client received
+app.add_middleware(RecorderMiddleware, recorder=recorder)
 
 # mount controllers
 app.include_router(root_router)
 app.include_router(question_router)
+app.include_router(admin_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
+app.include_router(session_router)
@@ -0,0 +1,112 @@
+# bench_http.py
+# Throughput of the server in HTTP mode against a local stand-in LLM (benchmarks/fake_openai of the API).
+# Starts both, then sends --requests classify_tech calls at each --concurrency level with distinct
+# queries and the fast path off, so every call is a model call. Reports req/s, p50/p95 and errors.
+#
+#   python bench_http.py                                  # levels 1,8,32, stand-in latency 0.2 s
+#   python bench_http.py --concurrency 1,16,64 --requests 256 --llm-latency 0.5 --max-concurrency 32
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fastmcp import Client
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(HERE))  # the API repository, home of benchmarks/fake_openai.py
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+def _ms(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000 if ordered else float("nan")
+
+
+async def _level(url: str, concurrency: int, requests: int, offset: int) -> tuple:
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    async with Client(url, timeout=120) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                t0 = time.perf_counter()
+                try:
+                    await client.call_tool("classify_tech", {"query": f"benchmark query {offset + i}"})
+                except Exception:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return latencies, errors, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client concurrency levels")
+    parser.add_argument("--requests", type=int, default=128, help="calls per level")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds the stand-in takes per call")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="server CLASSIFY_MAX_CONCURRENCY")
+    args = parser.parse_args()
+
+    llm_port, port = _free_port(), _free_port()
+    tmp = tempfile.TemporaryDirectory()
+    llm = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_openai", "--port", str(llm_port), "--ttft", str(args.llm_latency)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    server = subprocess.Popen([sys.executable, "main.py"], cwd=HERE, stdout=subprocess.DEVNULL, env={
+        **os.environ,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "CLASSIFY_TRANSPORT": "http",
+        "CLASSIFY_HOST": "127.0.0.1",
+        "CLASSIFY_PORT": str(port),
+        "CLASSIFY_MAX_CONCURRENCY": str(args.max_concurrency),
+        "CLASSIFY_FAST_PATH_THRESHOLD": "1.01",  # never confident enough: always the model
+        "CLASSIFY_CACHE_PATH": os.path.join(tmp.name, "cache.db"),
+    })
+    try:
+        _wait_for_port(llm_port)
+        _wait_for_port(port)
+        url = f"http://127.0.0.1:{port}/mcp"
+        print(f"stand-in LLM latency {args.llm_latency:g} s, server max concurrency {args.max_concurrency}")
+        for n, concurrency in enumerate(int(c) for c in args.concurrency.split(",")):
+            latencies, errors, elapsed = asyncio.run(_level(url, concurrency, args.requests, n * args.requests))
+            print(f"concurrency {concurrency:4d}: {len(latencies) / elapsed:7.1f} req/s  "
+                  f"p50 {_ms(latencies, 50):7.0f} ms  p95 {_ms(latencies, 95):7.0f} ms  "
+                  f"mean {statistics.fmean(latencies) * 1000 if latencies else float('nan'):7.0f} ms  "
+                  f"{errors} errors")
+    finally:
+        server.terminate()
+        server.wait()
+        llm.terminate()
+        llm.wait()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# eval_fast_path.py
+# Harness for the lexical fast path: coverage (hit rate), precision against the labelled fixtures,
+# agreement with the LLM path and per-path latency. Fixtures marked "defer" (a lone keyword,
+# a query spanning domains) must be left to the LLM; answering them locally counts as a leak.
+#
+#   python eval_fast_path.py                 # fast path only
+#   python eval_fast_path.py --llm           # also call the LLM (needs OPENAI_API_KEY)
+#   python eval_fast_path.py --threshold 0.6 --fixtures fixtures/labelled_queries.jsonl
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from lexical import LEXICON, LexicalClassifier
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _ms(values: list) -> str:
+    if not values:
+        return "n/a"
+    ordered = sorted(values)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return f"p50 {statistics.median(ordered) * 1000:.3f} ms, p95 {p95 * 1000:.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=os.path.join(HERE, "fixtures", "labelled_queries.jsonl"))
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("CLASSIFY_FAST_PATH_THRESHOLD", "0.75")))
+    parser.add_argument("--llm", action="store_true", help="also run the LLM path for agreement/latency")
+    args = parser.parse_args()
+
+    rows = _load(args.fixtures)
+    classifier = LexicalClassifier(list(LEXICON), LEXICON, threshold=args.threshold)
+
+    llm_classify = None
+    if args.llm:
+        import main as server  # requires OPENAI_API_KEY
+
+        # one loop for all calls: the server's pooled client stays bound to it
+        loop = asyncio.new_event_loop()
+        llm_classify = lambda *a: loop.run_until_complete(server._classify_llm(*a))
+
+    fast_times, llm_times = [], []
+    taken = fast_correct = llm_correct = agree = compared = deferrable = leaked = 0
+    for row in rows:
+        query, gold = row["query"], set(row["labels"])
+        deferrable += bool(row.get("defer"))
+
+        t0 = time.perf_counter()
+        fast = classifier.classify(query)
+        fast_times.append(time.perf_counter() - t0)
+        if fast is not None:
+            taken += 1
+            fast_correct += fast["labels"][0] in gold
+            leaked += bool(row.get("defer"))
+
+        llm_top = None
+        if llm_classify is not None:
+            t0 = time.perf_counter()
+            labels = llm_classify(query, "vi", True).get("labels", [])
+            llm_times.append(time.perf_counter() - t0)
+            llm_top = labels[0] if labels else None
+            llm_correct += llm_top in gold
+            if fast is not None:
+                compared += 1
+                agree += fast["labels"][0] == llm_top
+
+        if fast is None:
+            mark = "-"
+        elif row.get("defer"):
+            mark = "LEAK"
+        else:
+            mark = "ok" if fast["labels"][0] in gold else "MISS"
+        print(f"[{mark:>4}] {query}  fast={fast and fast['labels']}  llm={llm_top}")
+
+    n = len(rows)
+    print()
+    print(f"fixtures            : {n}")
+    answerable = n - deferrable
+    print(f"fast path taken     : {taken}/{n} ({taken / n:.0%}) at threshold {args.threshold}")
+    print(f"fast path hit rate  : {taken - leaked}/{answerable} ({(taken - leaked) / answerable:.0%}) of the queries not marked defer"
+          if answerable else "fast path hit rate  : n/a")
+    print(f"fast path precision : {fast_correct}/{taken} top-1 in gold" if taken else "fast path precision : n/a")
+    print(f"left to the llm     : {deferrable - leaked}/{deferrable} of the queries marked defer")
+    print(f"fast path latency   : {_ms(fast_times)}")
+    if llm_classify is not None:
+        print(f"llm accuracy        : {llm_correct}/{n} top-1 in gold")
+        print(f"fast/llm agreement  : {agree}/{compared} on fast-path queries" if compared else "fast/llm agreement  : n/a")
+        print(f"llm latency         : {_ms(llm_times)}")
+
+
+if __name__ == "__main__":
+    main()
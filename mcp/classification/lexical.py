@@ -0,0 +1,167 @@
+# lexical.py
+# Local keyword / n-gram pre-classifier for the 14 VN tech domains.
+# Queries are folded to lowercase ASCII (Vietnamese diacritics removed, đ -> d) and matched against
+# a curated lexicon by n-gram lookup (n up to the longest phrase); scores live in a flat array indexed like CATEGORIES.
+# Only confident, unambiguous matches are answered locally; everything else goes to the LLM.
+
+import re
+import unicodedata
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SMOOTHING = 0.5  # pseudo-score added to the total, so confidence stays below 1 and thin evidence counts less
+# marks a keyword that needs context: short or ambiguous ("iot", "gis", "cnc", "vaccine") -- it adds
+# to the score, but the best category also needs a match without the marker to skip the LLM
+_NEEDS_CONTEXT = "~"
+
+# Keyword phrases per category (with or without diacritics, any case; see _NEEDS_CONTEXT).
+LEXICON: Dict[str, List[str]] = {
+    "Công nghệ số": [
+        "chuyển đổi số", "digital transformation", "điện toán đám mây", "cloud computing",
+        "trí tuệ nhân tạo", "artificial intelligence", "dữ liệu lớn", "big data", "blockchain",
+        "internet vạn vật", "~iot", "phần mềm", "machine learning", "học máy", "~chatbot", "~saas",
+    ],
+    "Hành chính công": [
+        "dịch vụ công", "chữ ký số", "digital signature", "cổng dịch vụ công", "thủ tục hành chính",
+        "căn cước công dân", "định danh điện tử", "vneid", "~một cửa", "e-government",
+        "chính phủ điện tử", "chính quyền số", "hồ sơ trực tuyến", "công chứng điện tử",
+    ],
+    "Đô thị thông minh": [
+        "đô thị thông minh", "smart city", "giao thông thông minh", "đèn tín hiệu thông minh",
+        "camera giám sát giao thông", "bãi đỗ xe thông minh", "smart parking", "chiếu sáng thông minh",
+        "quy hoạch đô thị", "digital twin",
+    ],
+    "Y tế số": [
+        "telemedicine", "khám bệnh từ xa", "y tế từ xa", "bệnh án điện tử", "hồ sơ sức khỏe điện tử",
+        "electronic health record", "~ehr", "đặt lịch khám", "bảo hiểm y tế", "y tế số",
+        "chẩn đoán hình ảnh", "telehealth",
+    ],
+    "Giáo dục thông minh": [
+        "e-learning", "học trực tuyến", "lớp học thông minh", "giáo dục thông minh", "~lms",
+        "học bạ điện tử", "edtech", "thi trực tuyến", "sổ liên lạc điện tử", "smart classroom",
+    ],
+    "Nông nghiệp công nghệ cao": [
+        "nông nghiệp công nghệ cao", "nông nghiệp thông minh", "smart farming", "tưới nhỏ giọt",
+        "~nhà kính", "thủy canh", "hydroponics", "truy xuất nguồn gốc nông sản", "cảm biến độ ẩm đất",
+        "precision agriculture", "vietgap",
+    ],
+    "Tài chính số": [
+        "ví điện tử", "e-wallet", "mobile money", "thanh toán không dùng tiền mặt", "fintech",
+        "ngân hàng số", "digital banking", "mã qr thanh toán", "qr payment", "~chuyển khoản",
+        "tiền mã hóa", "cryptocurrency", "hóa đơn điện tử", "e-invoice",
+    ],
+    "Du lịch thông minh": [
+        "du lịch thông minh", "smart tourism", "du lịch ảo", "virtual tour", "thuyết minh tự động",
+        "đặt phòng khách sạn", "hotel booking", "bản đồ du lịch", "vé tham quan điện tử",
+    ],
+    "An ninh mạng": [
+        "ransomware", "mã độc", "malware", "tấn công mạng", "cyber attack", "phishing",
+        "lừa đảo trực tuyến", "an ninh mạng", "cybersecurity", "tường lửa", "firewall",
+        "lỗ hổng bảo mật", "ddos", "rò rỉ dữ liệu", "data breach", "xác thực hai yếu tố",
+    ],
+    "Công nghệ viễn thám": [
+        "viễn thám", "remote sensing", "ảnh vệ tinh", "satellite imagery", "~lidar", "~gis",
+        "hệ thống thông tin địa lý", "sentinel-2", "landsat", "bản đồ số địa hình",
+    ],
+    "Cơ khí - tự động hóa": [
+        "tự động hóa", "automation", "robot công nghiệp", "industrial robot", "~plc", "~cnc",
+        "dây chuyền sản xuất", "scada", "cánh tay robot", "máy công cụ", "cơ khí chính xác",
+    ],
+    "Công nghệ sinh học": [
+        "công nghệ sinh học", "biotechnology", "giải trình tự gen", "gene sequencing", "crispr",
+        "chỉnh sửa gen", "~vắc xin", "~vaccine", "nuôi cấy mô", "tế bào gốc", "stem cell", "~enzyme",
+    ],
+    "Môi trường – năng lượng": [
+        "năng lượng tái tạo", "renewable energy", "điện mặt trời", "solar panel", "điện gió",
+        "wind power", "quan trắc môi trường", "chất lượng không khí", "xử lý nước thải",
+        "phát thải carbon", "tín chỉ carbon", "lưu trữ năng lượng", "pin lưu trữ",
+    ],
+    "Vật liệu mới": [
+        "vật liệu mới", "vật liệu nano", "nanomaterial", "graphene", "~composite",
+        "vật liệu tổng hợp", "gốm kỹ thuật", "~hợp kim", "polymer sinh học", "vật liệu siêu dẫn",
+    ],
+}
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip Vietnamese diacritics ("Chữ ký số" -> "chu ky so")."""
+    text = text.lower().replace("đ", "d")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+class LexicalClassifier:
+    def __init__(self, categories: List[str], lexicon: Dict[str, List[str]], threshold: float = 0.75):
+        self.categories = categories
+        self.threshold = threshold
+        # n-gram (tuple of folded tokens) -> list of (category index, weight, stands on its own)
+        self._index: Dict[Tuple[str, ...], List[Tuple[int, float, bool]]] = {}
+        for label, phrases in lexicon.items():
+            idx = categories.index(label)
+            for phrase in phrases:
+                distinctive = not phrase.startswith(_NEEDS_CONTEXT)
+                tokens = tuple(tokenize(phrase.lstrip(_NEEDS_CONTEXT)))
+                if tokens:
+                    # longer phrases are more specific
+                    self._index.setdefault(tokens, []).append((idx, 1.0 + 0.5 * len(tokens), distinctive))
+        self._max_ngram = max(map(len, self._index), default=0)
+        self.fast_path_taken = 0
+        self.fast_path_skipped = 0
+
+    def score(self, query: str) -> Tuple[array, array, List[str]]:
+        """(score per category, matches without the needs-context marker per category, matched n-grams)"""
+        tokens = tokenize(query)
+        scores = array("d", bytes(8 * len(self.categories)))
+        distinct = array("i", bytes(4 * len(self.categories)))
+        matched = []
+        seen = set()
+        for n in range(self._max_ngram, 0, -1):
+            for i in range(len(tokens) - n + 1):
+                gram = tuple(tokens[i:i + n])
+                hits = self._index.get(gram)
+                if hits is None or gram in seen:
+                    continue
+                seen.add(gram)
+                matched.append(" ".join(gram))
+                for idx, weight, distinctive in hits:
+                    scores[idx] += weight
+                    distinct[idx] += distinctive
+        return scores, distinct, matched
+
+    def classify(self, query: str, top_k: int = 5) -> Optional[dict]:
+        """
+        Returns {"labels", "top_labels", "matched"} when the top label's share of the total score
+        reaches the threshold and at least one of its matches needs no context, else None (the
+        caller should ask the LLM).
+        """
+        scores, distinct, matched = self.score(query)
+        total = sum(scores)
+        best = max(range(len(scores)), key=scores.__getitem__)
+        confidence = scores[best] / (total + _SMOOTHING) if total else 0.0
+        if self.threshold <= 0 or confidence < self.threshold or not distinct[best]:
+            self.fast_path_skipped += 1
+            return None
+        self.fast_path_taken += 1
+
+        ranked = sorted(
+            (i for i in range(len(scores)) if scores[i] > 0), key=scores.__getitem__, reverse=True
+        )[:top_k]
+        top_labels = [
+            {"label": self.categories[i], "confidence": round(scores[i] / (total + _SMOOTHING), 3)}
+            for i in ranked
+        ]
+        return {"labels": [t["label"] for t in top_labels], "top_labels": top_labels, "matched": matched}
+
+    def stats(self) -> dict:
+        total = self.fast_path_taken + self.fast_path_skipped
+        return {
+            "threshold": self.threshold,
+            "taken": self.fast_path_taken,
+            "skipped": self.fast_path_skipped,
+            "taken_ratio": round(self.fast_path_taken / total, 3) if total else 0.0,
+        }
@@ -2,16 +2,25 @@
 # MCP server that classifies user queries into 14 VN tech domains
 # Requires: fastmcp, openai>=1.40.0
 #   pip install fastmcp "openai>=1.40.0"
-# Run (STDIO): python server.py
-# Optional (HTTP): edit bottom to run(transport="http", host="0.0.0.0", port=9000)
+# Run (STDIO): python main.py
+# Run (HTTP):  CLASSIFY_TRANSPORT=http CLASSIFY_PORT=9000 python main.py   -> http://host:9000/mcp
+# Results are cached in SQLite (CLASSIFY_CACHE_PATH); classify_tech_batch fans out with bounded concurrency.
+# Model calls are async over one pooled AsyncOpenAI client, at most CLASSIFY_MAX_CONCURRENCY at a time.
 
 import os
 import json
+import asyncio
+from functools import lru_cache
 from typing import List, Literal, Optional, TypedDict
 
+import httpx
+import uvicorn
 from dotenv import load_dotenv
 from fastmcp import FastMCP
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from lexical import LEXICON, LexicalClassifier
+from result_cache import ResultCache
 
 # ====== Config ======
 load_dotenv()
@@ -19,10 +28,46 @@ load_dotenv()
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1")  # adjust if needed
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # e.g. a local stand-in for benchmarks
+
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY is not set")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Transport: "stdio" (default) or "http" (streamable HTTP at CLASSIFY_HOST:CLASSIFY_PORT/mcp)
+TRANSPORT = os.getenv("CLASSIFY_TRANSPORT", "stdio").lower()
+HOST = os.getenv("CLASSIFY_HOST", "0.0.0.0")
+PORT = int(os.getenv("CLASSIFY_PORT", "9000"))
+# Stateless HTTP: no per-client session, so any number of concurrent callers (or replicas) can be served
+STATELESS_HTTP = os.getenv("CLASSIFY_STATELESS_HTTP", "true").lower() == "true"
+# Model calls in flight across all requests; also the size of the HTTP connection pool
+MAX_CONCURRENCY = int(os.getenv("CLASSIFY_MAX_CONCURRENCY", "16"))
+# Seconds per model call (including the SDK's retries) before the query fails with a timeout
+CALL_TIMEOUT = float(os.getenv("CLASSIFY_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("CLASSIFY_MAX_RETRIES", "2"))
+# Seconds in-flight requests get to finish on SIGTERM/SIGINT before they are cancelled
+SHUTDOWN_GRACE = float(os.getenv("CLASSIFY_SHUTDOWN_GRACE", "10"))
+
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
+    timeout=CALL_TIMEOUT,
+    max_retries=MAX_RETRIES,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY),
+    ),
+)
+_llm_slots = asyncio.Semaphore(max(1, MAX_CONCURRENCY))
+
+# Persistent result cache keyed on (query, labels_only, language, model)
+CLASSIFY_CACHE_PATH = os.getenv(
+    "CLASSIFY_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "classify_cache.sqlite3")
+)
+CLASSIFY_CACHE_TTL = float(os.getenv("CLASSIFY_CACHE_TTL", "0"))  # seconds, 0 = never expires
+BATCH_MAX_CONCURRENCY = int(os.getenv("CLASSIFY_BATCH_MAX_CONCURRENCY", "8"))
+# Local lexical fast path answers confident cases without the LLM (0 = always ask the LLM)
+FAST_PATH_THRESHOLD = float(os.getenv("CLASSIFY_FAST_PATH_THRESHOLD", "0.75"))
+
+cache = ResultCache(CLASSIFY_CACHE_PATH, ttl=CLASSIFY_CACHE_TTL)
 
 # ====== 14 fixed categories ======
 CATEGORIES: List[str] = [
@@ -67,6 +112,8 @@ class ClassifyResult(TypedDict):
     top_labels: List[LabelScore]
     suggested_next_actions: Optional[List[str]]
 
+fast_path = LexicalClassifier(CATEGORIES, LEXICON, threshold=FAST_PATH_THRESHOLD)
+
 # ====== MCP server ======
 mcp = FastMCP(
     name="VN-Tech-Classifier",
@@ -76,21 +123,63 @@ mcp = FastMCP(
     """
 )
 
-# ====== Tool ======
-@mcp.tool(
-    name="classify_tech",
-    description="Phân loại câu hỏi vào 14 lĩnh vực công nghệ VN.",
-    tags={"public", "classification"},
-)
-def classify_tech(
-    query: str,
-    top_k: int = 3,
-    language: str = "vi",
-    labels_only: bool = True,  # <-- default: labels-only
-):
-    top_k = max(1, min(5, int(top_k)))
+# ====== Prompt & schemas (built once) ======
+LABELS_ONLY_SCHEMA = {
+    "name": "labels_only_schema",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "labels": {
+                "type": "array",
+                "items": {"type": "string", "enum": CATEGORIES},
+                "minItems": 1,
+                "maxItems": 5
+            }
+        },
+        "required": ["labels"],
+        "additionalProperties": False,
+    },
+    "strict": True,
+}
+
+FULL_SCHEMA = {
+    "name": "classification_schema",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "query": {"type": "string"},
+            "top_labels": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "label": {"type": "string", "enum": CATEGORIES},
+                        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+                    },
+                    "required": ["label", "confidence"],
+                    "additionalProperties": False,
+                },
+                "minItems": 1,
+                "maxItems": 5,
+            },
+            "rationale": {"type": "string"},
+            "suggested_next_actions": {
+                "type": "array",
+                "items": {"type": "string"},
+                "maxItems": 3,
+                "default": []
+            },
+        },
+        "required": ["query", "top_labels", "rationale", "suggested_next_actions"],
+        "additionalProperties": False,
+    },
+    "strict": True,
+}
+
 
-    system_prompt = f"""
+@lru_cache(maxsize=16)
+def _system_prompt(language: str) -> str:
+    return f"""
 Bạn là bộ phân loại nội dung theo 14 lĩnh vực công nghệ (Việt Nam).
 Chỉ chọn nhãn từ danh sách: {CATEGORIES}
 Nếu 'labels_only' là true: chỉ trả JSON {{ "labels": [<nhãn> ...] }}.
@@ -98,117 +187,181 @@ Nếu false: trả JSON đầy đủ theo schema mở rộng.
 Ngôn ngữ giải thích = '{language}'.
 """
 
-    # ---- Two schemas: tiny labels-only (default) or full ----
-    if labels_only:
-        json_schema = {
-            "name": "labels_only_schema",
-            "schema": {
-                "type": "object",
-                "properties": {
-                    "labels": {
-                        "type": "array",
-                        "items": {"type": "string", "enum": CATEGORIES},
-                        "minItems": 1,
-                        "maxItems": 5
-                    }
-                },
-                "required": ["labels"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        }
-    else:
-        json_schema = {
-            "name": "classification_schema",
-            "schema": {
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string"},
-                    "top_labels": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "label": {"type": "string", "enum": CATEGORIES},
-                                "confidence": {"type": "number", "minimum": 0, "maximum": 1},
-                            },
-                            "required": ["label", "confidence"],
-                            "additionalProperties": False,
-                        },
-                        "minItems": 1,
-                        "maxItems": 5,
-                    },
-                    "rationale": {"type": "string"},
-                    "suggested_next_actions": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "maxItems": 3,
-                        "default": []
-                    },
-                },
-                "required": ["query", "top_labels", "rationale", "suggested_next_actions"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        }
+
+# ====== LLM call ======
+def _extract_json_from_responses(resp) -> str:
+    data = getattr(resp, "output_text", None)
+    if data:
+        return data
+    for item in getattr(resp, "output", []) or []:
+        for c in getattr(item, "content", []) or []:
+            if getattr(c, "type", "") == "output_text" and getattr(c, "text", None):
+                return c.text
+    raise RuntimeError("No JSON text found in Responses output")
+
+
+async def _classify_llm(query: str, language: str, labels_only: bool) -> dict:
+    """One model call; returns the parsed JSON without any top_k truncation."""
+    async with _llm_slots:
+        try:
+            return await asyncio.wait_for(_call_model(query, language, labels_only), CALL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"classification timed out after {CALL_TIMEOUT:g}s") from None
+
+
+async def _call_model(query: str, language: str, labels_only: bool) -> dict:
+    system_prompt = _system_prompt(language)
+    json_schema = LABELS_ONLY_SCHEMA if labels_only else FULL_SCHEMA
+    user_text = f"labels_only={labels_only}\n\n{query}"
 
     # --- Responses API call (with fallback as you already had) ---
-    def _call_responses_api():
-        return client.responses.create(
+    try:
+        resp = await client.responses.create(
             model=OPENAI_MODEL,
             input=[
                 {"role": "system", "content": [{"type": "text", "text": system_prompt}]},
-                {
-                    "role": "user",
-                    "content": [{"type": "text", "text": f"labels_only={labels_only}\n\n{query}"}],
-                },
+                {"role": "user", "content": [{"type": "text", "text": user_text}]},
             ],
             response_format={"type": "json_schema", "json_schema": json_schema},
             temperature=0,
         )
-
-    def _extract_json_from_responses(resp) -> str:
-        data = getattr(resp, "output_text", None)
-        if data:
-            return data
-        for item in getattr(resp, "output", []) or []:
-            for c in getattr(item, "content", []) or []:
-                if getattr(c, "type", "") == "output_text" and getattr(c, "text", None):
-                    return c.text
-        raise RuntimeError("No JSON text found in Responses output")
-
-    try:
-        resp = _call_responses_api()
         data = _extract_json_from_responses(resp)
     except TypeError:
         # Fallback for older SDKs
-        resp = client.chat.completions.create(
+        resp = await client.chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"labels_only={labels_only}\n\n{query}"},
+                {"role": "user", "content": user_text},
             ],
             response_format={"type": "json_schema", "json_schema": json_schema},
             temperature=0,
         )
         data = resp.choices[0].message.content or "{}"
 
-    import json as _json
-    parsed = _json.loads(data)
+    return json.loads(data)
+
 
+async def _classify_cached(query: str, language: str, labels_only: bool) -> dict:
+    key = ResultCache.make_key(query, labels_only, language, OPENAI_MODEL)
+    # SQLite calls block (a write commits to disk): keep them off the event loop
+    parsed = await asyncio.to_thread(cache.get, key)
+    if parsed is None:
+        parsed = await _classify_llm(query, language, labels_only)
+        await asyncio.to_thread(cache.put, key, parsed)
+    return parsed
+
+
+def _classify_fast(query: str, language: str, labels_only: bool) -> Optional[dict]:
+    """Lexical fast path; returns a result shaped like the LLM output, or None if not confident."""
+    hit = fast_path.classify(query)
+    if hit is None:
+        return None
+    if labels_only:
+        return {"labels": hit["labels"]}
+    prefix = "Khớp từ khóa" if language == "vi" else "Keyword match"
+    return {
+        "query": query,
+        "top_labels": hit["top_labels"],
+        "rationale": f"{prefix}: {', '.join(hit['matched'])}",
+        "suggested_next_actions": [],
+    }
+
+
+def _apply_top_k(parsed: dict, query: str, top_k: int, labels_only: bool) -> dict:
     if labels_only:
         # Ensure at most top_k labels
-        labels = parsed.get("labels", [])
-        parsed = {"labels": labels[:top_k]}
-    else:
-        parsed["query"] = query
-        parsed["top_labels"] = parsed.get("top_labels", [])[:top_k]
-        parsed.setdefault("suggested_next_actions", [])
+        return {"labels": parsed.get("labels", [])[:top_k]}
+    result = dict(parsed)
+    result["query"] = query
+    result["top_labels"] = result.get("top_labels", [])[:top_k]
+    result.setdefault("suggested_next_actions", [])
+    return result
+
+
+# ====== Tools ======
+@mcp.tool(
+    name="classify_tech",
+    description="Phân loại câu hỏi vào 14 lĩnh vực công nghệ VN.",
+    tags={"public", "classification"},
+)
+async def classify_tech(
+    query: str,
+    top_k: int = 3,
+    language: str = "vi",
+    labels_only: bool = True,  # <-- default: labels-only
+):
+    top_k = max(1, min(5, int(top_k)))
+    parsed = _classify_fast(query, language, labels_only) or await _classify_cached(query, language, labels_only)
+    return _apply_top_k(parsed, query, top_k, labels_only)
+
+
+@mcp.tool(
+    name="classify_tech_batch",
+    description="Phân loại nhiều câu hỏi cùng lúc (song song, có giới hạn, dùng cache).",
+    tags={"public", "classification"},
+)
+async def classify_tech_batch(
+    queries: List[str],
+    top_k: int = 3,
+    language: str = "vi",
+    labels_only: bool = True,
+    max_concurrency: int = BATCH_MAX_CONCURRENCY,
+):
+    """
+    Returns one result per input query, in input order. Duplicate queries are classified once;
+    a failed query yields {"query": ..., "error": ...} without failing the whole batch.
+    """
+    top_k = max(1, min(5, int(top_k)))
+    semaphore = asyncio.Semaphore(max(1, min(BATCH_MAX_CONCURRENCY, int(max_concurrency))))
+
+    async def run(query: str):
+        fast = _classify_fast(query, language, labels_only)
+        if fast is not None:
+            return fast
+        async with semaphore:
+            try:
+                return await _classify_cached(query, language, labels_only)
+            except Exception as e:
+                return e
+
+    unique = list(dict.fromkeys(queries))
+    outcomes = dict(zip(unique, await asyncio.gather(*(run(q) for q in unique))))
+
+    results = []
+    for query in queries:
+        outcome = outcomes[query]
+        if isinstance(outcome, Exception):
+            results.append({"query": query, "error": str(outcome)})
+        else:
+            results.append(_apply_top_k(outcome, query, top_k, labels_only))
+    return results
+
+
+@mcp.tool(
+    name="classifier_stats",
+    description="Thống kê cache và tỉ lệ dùng fast path của bộ phân loại.",
+    tags={"classification"},
+)
+def classifier_stats():
+    return {"cache": cache.stats(), "fast_path": fast_path.stats()}
+
+
+async def _serve_http():
+    # Plain JSON responses rather than SSE: tools here never stream, and SSE responses are ended as soon
+    # as uvicorn receives SIGTERM, while JSON ones are left to finish within the grace period.
+    app = mcp.http_app(json_response=True, stateless_http=STATELESS_HTTP)
+    server = uvicorn.Server(uvicorn.Config(app, host=HOST, port=PORT, timeout_graceful_shutdown=SHUTDOWN_GRACE))
+    try:
+        await server.serve()
+    finally:
+        await client.close()
+        cache.close()
 
-    return parsed
 
 if __name__ == "__main__":
-    # Default: STDIO transport (works with MCP-compatible clients)
-    mcp.run()
-    # To expose HTTP, replace the line above with:
-    # mcp.run(transport="http", host="0.0.0.0", port=9000)
+    if TRANSPORT == "http":
+        asyncio.run(_serve_http())
+    else:
+        # STDIO transport (works with MCP-compatible clients)
+        mcp.run()
@@ -0,0 +1,59 @@
+# result_cache.py
+# Persistent classification cache (SQLite, WAL) shared by classify_tech and classify_tech_batch.
+# Stores the *untruncated* model output so every top_k is served from one entry.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class ResultCache:
+    def __init__(self, path: str, ttl: float = 0):
+        self.path = path
+        self.ttl = ttl  # seconds, 0 = never expires
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS classifications ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL, created REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def make_key(query: str, labels_only: bool, language: str, model: str) -> str:
+        raw = json.dumps([query.strip(), bool(labels_only), language, model], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created FROM classifications WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl and time.time() - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict) -> None:
+        payload = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO classifications (key, result, created) VALUES (?, ?, ?)",
+                (key, payload, time.time()),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM classifications").fetchone()
+        return {"entries": entries, "hits": self.hits, "misses": self.misses, "path": self.path}
@@ -6,4 +6,138 @@ load_dotenv()
 
 API_KEY = os.environ.get("API_KEY", "")
 MODEL_NAME= os.environ.get("MODEL_NAME", "")
-BASE_URL = os.environ.get("BASE_URL", "")
\ No newline at end of file
+BASE_URL = os.environ.get("BASE_URL", "")
+
+# heartbeat every N seconds to keep proxies happy
+HEARTBEAT_INTERVAL = float(os.environ.get("HEARTBEAT_INTERVAL", "15"))
+# how often streaming endpoints check whether the client went away
+DISCONNECT_POLL_INTERVAL = float(os.environ.get("DISCONNECT_POLL_INTERVAL", "0.5"))
+
+# defaults for per-request delta coalescing ({"coalesce": true} on /stream/ask-question)
+SSE_COALESCE_WINDOW_MS = float(os.environ.get("SSE_COALESCE_WINDOW_MS", "20"))
+SSE_COALESCE_MAX_BYTES = int(os.environ.get("SSE_COALESCE_MAX_BYTES", "512"))
+
+# share one upstream run between identical in-flight questions (see services/single_flight.py)
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+# resumable streams: events kept per run, how long finished runs stay resumable, how long a run
+# keeps going after its last client dropped, and the reconnect delay suggested to clients
+SSE_REPLAY_BUFFER_EVENTS = int(os.environ.get("SSE_REPLAY_BUFFER_EVENTS", "4096"))
+SSE_REPLAY_TTL = float(os.environ.get("SSE_REPLAY_TTL", "120"))
+SSE_RESUME_GRACE = float(os.environ.get("SSE_RESUME_GRACE", "10"))
+SSE_RETRY_MS = int(os.environ.get("SSE_RETRY_MS", "2000"))
+
+# JSON encoder for SSE frames (see utils/sse.py): auto (orjson when installed), orjson or json
+SSE_JSON_BACKEND = os.environ.get("SSE_JSON_BACKEND", "auto").lower()
+
+# completed-answer cache (see services/answer_cache.py); TTL 0 disables it
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "600"))
+ANSWER_CACHE_MAX_BYTES = int(os.environ.get("ANSWER_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# seconds between replayed frames on a cache hit (0 = instant)
+ANSWER_CACHE_REPLAY_INTERVAL = float(os.environ.get("ANSWER_CACHE_REPLAY_INTERVAL", "0"))
+
+# required as X-Api-Key on /admin endpoints; unset, they answer 403
+ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY", "")
+
+# MCP session pool (see services/mcp_pool.py): sessions at most (0 = one per admitted run, see
+# ADMISSION_MAX_CONCURRENT), how many of them open at startup (the rest on first use), and the
+# seconds a run waits for a free session before it fails
+MCP_POOL_SIZE = int(os.environ.get("MCP_POOL_SIZE", "0"))
+MCP_POOL_WARM = int(os.environ.get("MCP_POOL_WARM", "2"))
+MCP_POOL_WAIT = float(os.environ.get("MCP_POOL_WAIT", "30"))
+MCP_POOL_MAX_USES = int(os.environ.get("MCP_POOL_MAX_USES", "500"))
+MCP_POOL_MAX_AGE = float(os.environ.get("MCP_POOL_MAX_AGE", "1800"))
+MCP_POOL_PING_AFTER = float(os.environ.get("MCP_POOL_PING_AFTER", "60"))
+# tool calls of one agent step that run at the same time over the MCP session (1 = one by one)
+AGENT_TOOL_CONCURRENCY = int(os.environ.get("AGENT_TOOL_CONCURRENCY", "4"))
+# limits of one agent run (see services/agent_limits.py): wall-clock seconds once admitted and
+# seconds per tool call (0 = none), LLM steps at most, and how many steps in a row may only repeat
+# earlier calls and their results before the run stops early (0 = never); stopped runs end with a
+# partial final
+AGENT_RUN_DEADLINE = float(os.environ.get("AGENT_RUN_DEADLINE", "120"))
+AGENT_TOOL_TIMEOUT = float(os.environ.get("AGENT_TOOL_TIMEOUT", "30"))
+AGENT_MAX_STEPS = int(os.environ.get("AGENT_MAX_STEPS", "30"))
+AGENT_STALL_STEPS = int(os.environ.get("AGENT_STALL_STEPS", "3"))
+
+# admission control in front of the LLM upstream (see services/admission.py): concurrent runs,
+# token bucket (runs started per second, 0 = unlimited, with burst), and the bounded wait queue
+ADMISSION_MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", "32"))
+ADMISSION_RATE = float(os.environ.get("ADMISSION_RATE", "0"))
+ADMISSION_BURST = int(os.environ.get("ADMISSION_BURST", "10"))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "100"))
+ADMISSION_MAX_QUEUE_PER_KEY = int(os.environ.get("ADMISSION_MAX_QUEUE_PER_KEY", "20"))
+
+# OpenAI-compatible upstream pool (see services/upstreams.py). UPSTREAMS is a JSON list of
+# {"name", "base_url", "api_key", "model"}; empty = the single BASE_URL/API_KEY/MODEL_NAME above
+UPSTREAMS = os.environ.get("UPSTREAMS", "")
+# seconds an upstream is skipped after a retryable failure (doubles per consecutive failure)
+UPSTREAM_COOLDOWN = float(os.environ.get("UPSTREAM_COOLDOWN", "10"))
+# hedging: start a second upstream when the first token is later than the p-th percentile TTFT
+UPSTREAM_HEDGE = os.environ.get("UPSTREAM_HEDGE", "false").lower() == "true"
+UPSTREAM_HEDGE_PERCENTILE = float(os.environ.get("UPSTREAM_HEDGE_PERCENTILE", "95"))
+UPSTREAM_HEDGE_MIN_DELAY = float(os.environ.get("UPSTREAM_HEDGE_MIN_DELAY", "0.25"))
+
+# MCP tool-result cache (see services/tool_cache.py): comma-separated fnmatch patterns of
+# read-only tools whose results may be reused; TTL 0 disables it
+TOOL_CACHE_TOOLS = os.environ.get("TOOL_CACHE_TOOLS", "list_*,get_*")
+TOOL_CACHE_TTL = float(os.environ.get("TOOL_CACHE_TTL", "60"))
+TOOL_CACHE_MAX_BYTES = int(os.environ.get("TOOL_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# question-aware tool routing (see services/tool_router.py): most tools offered to the agent per
+# question and the session's recent questions (0 = always the whole catalog; a run that calls none
+# of them is repeated with the whole catalog), comma-separated fnmatch patterns of tools offered to
+# every question, and how many per-question selections are cached
+TOOL_ROUTER_MAX_TOOLS = int(os.environ.get("TOOL_ROUTER_MAX_TOOLS", "8"))
+TOOL_ROUTER_ALWAYS = os.environ.get("TOOL_ROUTER_ALWAYS", "")
+TOOL_ROUTER_CACHE_SIZE = int(os.environ.get("TOOL_ROUTER_CACHE_SIZE", "1024"))
+
+# large tool observations (see services/observations.py): byte budget for the observation in one
+# SSE frame (0 = unlimited), whether over-budget observations also follow in full as `observation`
+# chunk frames (off: clients fetch them by reference), and how long / how much of the full
+# payloads stay fetchable (observations of a cached answer are kept as long as the answer)
+SSE_OBSERVATION_BUDGET = int(os.environ.get("SSE_OBSERVATION_BUDGET", "16384"))
+SSE_OBSERVATION_CHUNKS = os.environ.get("SSE_OBSERVATION_CHUNKS", "false").lower() == "true"
+OBSERVATION_STORE_TTL = float(os.environ.get("OBSERVATION_STORE_TTL", "120"))
+OBSERVATION_STORE_MAX_BYTES = int(os.environ.get("OBSERVATION_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# cold start (see services/prewarm.py): heavy libraries load on first use; with prewarm on, they
+# and the MCP session pool are loaded in the background once the app is accepting requests
+STARTUP_PREWARM = os.environ.get("STARTUP_PREWARM", "true").lower() == "true"
+
+# store shared by all uvicorn workers on the host (see services/shared_store.py): "" keeps every
+# cache per process; "sqlite:///path/to/cache.db" shares cached answers, tool results and stored
+# observations, and lets one worker make a tool call the others wait for (up to the lease time)
+SHARED_STORE = os.environ.get("SHARED_STORE", "")
+SHARED_STORE_MAX_BYTES = int(os.environ.get("SHARED_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+SHARED_STORE_LEASE = float(os.environ.get("SHARED_STORE_LEASE", "10"))
+
+# traffic recorder (see services/recorder.py): share of requests under RECORD_PATHS (comma-separated
+# path prefixes) appended with their response timelines to RECORD_PATH; 0 disables it. The file
+# rotates at RECORD_MAX_BYTES keeping RECORD_BACKUPS old files; replay with benchmarks/replay.py
+RECORD_SAMPLE_RATE = float(os.environ.get("RECORD_SAMPLE_RATE", "0"))
+RECORD_PATH = os.environ.get("RECORD_PATH", "requests.jsonl")
+RECORD_PATHS = os.environ.get("RECORD_PATHS", "/stream/,/root-stream")
+RECORD_MAX_BYTES = int(os.environ.get("RECORD_MAX_BYTES", str(64 * 1024 * 1024)))
+RECORD_BACKUPS = int(os.environ.get("RECORD_BACKUPS", "3"))
+RECORD_QUEUE_SIZE = int(os.environ.get("RECORD_QUEUE_SIZE", "1000"))
+RECORD_MAX_BODY_BYTES = int(os.environ.get("RECORD_MAX_BODY_BYTES", "65536"))
+
+# conversation sessions (see services/sessions.py): sessions idle longer than SESSION_IDLE_TTL are
+# dropped, at most SESSION_MAX are kept (least recently used go first). History sent upstream is
+# kept under SESSION_HISTORY_TOKENS (estimated); older turns are dropped or, with
+# SESSION_SUMMARIZE, folded into a running summary by an extra completion. With SHARED_STORE, one
+# worker at a time runs a turn of a session, holding it for at most SESSION_TURN_LEASE seconds
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", "1800"))
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "10000"))
+SESSION_HISTORY_TOKENS = int(os.environ.get("SESSION_HISTORY_TOKENS", "3000"))
+SESSION_SUMMARIZE = os.environ.get("SESSION_SUMMARIZE", "false").lower() == "true"
+SESSION_TURN_LEASE = float(os.environ.get("SESSION_TURN_LEASE", "300"))
+
+# document summarization (POST /stream/summarize, see OpenAIService.sumary_files): upload size
+# limit, chunk size (estimated tokens), chunk summaries in flight per document, and the cache of
+# finished summaries keyed by content hash
+SUMMARY_MAX_BYTES = int(os.environ.get("SUMMARY_MAX_BYTES", str(20 * 1024 * 1024)))
+SUMMARY_CHUNK_TOKENS = int(os.environ.get("SUMMARY_CHUNK_TOKENS", "2000"))
+SUMMARY_CONCURRENCY = int(os.environ.get("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_CACHE_TTL = float(os.environ.get("SUMMARY_CACHE_TTL", "86400"))
+SUMMARY_CACHE_MAX_BYTES = int(os.environ.get("SUMMARY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
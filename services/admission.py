@@ -0,0 +1,215 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator
+
+from services import (
+    ADMISSION_MAX_CONCURRENT,
+    ADMISSION_RATE,
+    ADMISSION_BURST,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_QUEUE_PER_KEY,
+)
+
+
+class AdmissionRejected(Exception):
+    """The wait queue (overall or for this client key) is full."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self) -> float:
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class Ticket:
+    """A place in the queue; `positions()` waits for admission, `release()` must always follow."""
+
+    def __init__(self, controller: "AdmissionController", key: str):
+        self.controller = controller
+        self.key = key
+        self.admitted = False
+        self.released = False
+        self.enqueued_at = time.monotonic()
+
+    async def positions(self) -> AsyncIterator[int]:
+        """Yield the 1-based queue position whenever it changes, until admitted."""
+        last = None
+        while not self.admitted:
+            position = self.controller.position(self)
+            if position != last:
+                last = position
+                yield position
+            await self.controller.changed()
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Bounds the upstream runs started by this process.
+
+    At most `max_concurrent` runs hold a slot at once, and new runs start at no more than `rate`
+    per second (token bucket with `burst`; rate 0 = unlimited). Runs that cannot start wait in a
+    queue bounded overall (`max_queue`) and per client key (`max_queue_per_key`); waiting keys are
+    served round-robin, so one busy API key cannot starve the others. When the queue is full,
+    `enqueue` raises `AdmissionRejected` right away instead of letting the run time out upstream.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, rate: float, burst: int, max_queue: int,
+                 max_queue_per_key: int):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.max_queue_per_key = max_queue_per_key
+        self._bucket = _TokenBucket(rate, burst)
+        self._queues: OrderedDict[str, deque] = OrderedDict()
+        self._queued = 0
+        self._active = 0
+        self._refill_handle: asyncio.TimerHandle | None = None
+        self._changed = asyncio.Event()
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def enqueue(self, key: str) -> Ticket:
+        ticket = Ticket(self, key)
+        if self._queued == 0 and self._active < self.max_concurrent and self._bucket.take():
+            self._admit(ticket)
+            return ticket
+        queue = self._queues.get(key)
+        if self._queued >= self.max_queue or (queue is not None and len(queue) >= self.max_queue_per_key):
+            self.rejected += 1
+            raise AdmissionRejected(f"{self.name} is at capacity, retry later", self._retry_after())
+        if queue is None:
+            queue = self._queues[key] = deque()
+        queue.append(ticket)
+        self._queued += 1
+        self._dispatch()
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """Where `ticket` stands given the round-robin order of the waiting keys."""
+        own = self._queues.get(ticket.key)
+        if own is None or ticket not in own:
+            return 0
+        index = own.index(ticket)
+        ahead = index
+        before = True
+        for key, queue in self._queues.items():
+            if key == ticket.key:
+                before = False
+                continue
+            ahead += min(len(queue), index + 1 if before else index)
+        return ahead + 1
+
+    async def changed(self):
+        await self._changed.wait()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _admit(self, ticket: Ticket):
+        ticket.admitted = True
+        self._active += 1
+        self.admitted += 1
+        waited = time.monotonic() - ticket.enqueued_at
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def _next_waiter(self) -> Ticket:
+        key, queue = next(iter(self._queues.items()))
+        ticket = queue.popleft()
+        self._queued -= 1
+        if queue:
+            self._queues.move_to_end(key)
+        else:
+            del self._queues[key]
+        return ticket
+
+    def _dispatch(self):
+        admitted_any = False
+        while self._queued and self._active < self.max_concurrent:
+            if not self._bucket.take():
+                if self._refill_handle is None:
+                    loop = asyncio.get_running_loop()
+                    self._refill_handle = loop.call_later(self._bucket.wait_time(), self._on_refill)
+                break
+            self._admit(self._next_waiter())
+            admitted_any = True
+        if admitted_any:
+            self._notify()
+
+    def _on_refill(self):
+        self._refill_handle = None
+        self._dispatch()
+
+    def _release(self, ticket: Ticket):
+        if ticket.admitted:
+            self._active -= 1
+        else:
+            queue = self._queues.get(ticket.key)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                self._queued -= 1
+                if not queue:
+                    del self._queues[ticket.key]
+        self._dispatch()
+        self._notify()
+
+    def _retry_after(self) -> float:
+        """Rough time until a queue slot frees up, from the average wait so far."""
+        average = self.wait_total / self.admitted if self.admitted else 1.0
+        return round(max(1.0, average), 1)
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "max_concurrent": self.max_concurrent,
+            "queued": self._queued,
+            "queued_keys": len(self._queues),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_s": round(self.wait_total / self.admitted, 3) if self.admitted else 0.0,
+            "max_wait_s": round(self.wait_max, 3),
+        }
+
+
+llm_admission = AdmissionController(
+    "llm",
+    max_concurrent=ADMISSION_MAX_CONCURRENT,
+    rate=ADMISSION_RATE,
+    burst=ADMISSION_BURST,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_queue_per_key=ADMISSION_MAX_QUEUE_PER_KEY,
+)
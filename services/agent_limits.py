@@ -0,0 +1,105 @@
+import hashlib
+import time
+
+from services import AGENT_RUN_DEADLINE, AGENT_TOOL_TIMEOUT, AGENT_MAX_STEPS, AGENT_STALL_STEPS
+from services.metrics import metrics
+from services.tool_cache import canonical_input
+from utils.sse import dumps
+
+# how agent runs end: the model answered, mcp_use gave up on an error, or one of the limits stopped it
+_ENDINGS = ("answered", "error", "deadline", "stalled", "max_steps")
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def remaining(deadline: float | None) -> float | None:
+    """Seconds left until `deadline` (`time.monotonic()`), None without one."""
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired(deadline: float | None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+class RunProgress:
+    """
+    Whether an agent run still learns anything. Tool calls are compared per (tool, input) across
+    steps: a call that returns the same result as the same call did before brings nothing new
+    (calls of one step, run side by side, never make each other repeats). The run has stalled
+    once `stall_steps` steps in a row brought nothing new.
+    """
+
+    def __init__(self, stall_steps: int):
+        self.stall_steps = stall_steps
+        self._results: dict[bytes, bytes] = {}
+        self._step_new = False
+        self.repeats = 0
+
+    def observe(self, tool: str, tool_input, observation):
+        """Record a tool call of the current step."""
+        call = _digest(f"{tool}\0{canonical_input(tool_input)}".encode("utf-8"))
+        result = _digest(observation.encode("utf-8") if isinstance(observation, str) else dumps(observation))
+        if self._results.get(call) != result:
+            self._step_new = True
+        self._results[call] = result
+
+    def step_done(self) -> bool:
+        """Close the current step once all its calls are observed; True when the run has stalled."""
+        self.repeats = 0 if self._step_new else self.repeats + 1
+        self._step_new = False
+        return 0 < self.stall_steps <= self.repeats
+
+
+class AgentLimits:
+    """
+    Bounds of one MCP agent run, and how runs ended, to size them from real traffic.
+
+    A run gets `deadline` seconds of wall-clock time once admitted (waiting for an MCP session and
+    setting up the agent included), each tool call `tool_timeout`
+    seconds (the model then sees a timeout observation and may carry on), at most `max_steps` LLM
+    steps, and stops early when `stall_steps` steps in a row bring nothing new (see `RunProgress`).
+    0 disables a limit. A run stopped by a limit ends with a partial `final`.
+    """
+
+    def __init__(self, deadline: float, tool_timeout: float, max_steps: int, stall_steps: int):
+        self.deadline = deadline
+        self.tool_timeout = tool_timeout
+        self.max_steps = max(1, max_steps)
+        self.stall_steps = stall_steps
+        self.endings = dict.fromkeys(_ENDINGS, 0)
+        self.tool_timeouts: dict[str, int] = {}
+
+    def run_deadline(self) -> float | None:
+        """`time.monotonic()` by which a run starting now has to end, None without a deadline."""
+        return time.monotonic() + self.deadline if self.deadline > 0 else None
+
+    def progress(self) -> RunProgress:
+        return RunProgress(self.stall_steps)
+
+    def ended(self, how: str):
+        self.endings[how] += 1
+        metrics.agent_endings.inc(how)
+
+    def tool_timed_out(self, tool: str):
+        self.tool_timeouts[tool] = self.tool_timeouts.get(tool, 0) + 1
+        metrics.tool_timeouts.inc(tool)
+
+    def stats(self) -> dict:
+        return {
+            "deadline_s": self.deadline,
+            "tool_timeout_s": self.tool_timeout,
+            "max_steps": self.max_steps,
+            "stall_steps": self.stall_steps,
+            "endings": dict(self.endings),
+            "tool_timeouts": dict(self.tool_timeouts),
+        }
+
+
+agent_limits = AgentLimits(
+    deadline=AGENT_RUN_DEADLINE,
+    tool_timeout=AGENT_TOOL_TIMEOUT,
+    max_steps=AGENT_MAX_STEPS,
+    stall_steps=AGENT_STALL_STEPS,
+)
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import AsyncIterator
+
+from services import (
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_MAX_BYTES,
+    ANSWER_CACHE_REPLAY_INTERVAL,
+    SUMMARY_CACHE_TTL,
+    SUMMARY_CACHE_MAX_BYTES,
+)
+from services.observations import ObservationStore, observation_store
+from services.shared_store import SharedStore, shared_key, shared_store
+from utils.sse import dumps
+
+_NS = "answers"
+# mcp_use ends a run it gave up on (a tool or parsing error) with a normal final text starting with this
+_AGENT_STOPPED = "Agent stopped"
+
+
+class _Entry:
+    def __init__(self, events: list[tuple], age: float = 0.0, size: int | None = None):
+        self.events = events
+        # approximate encoded size of the stored events
+        if size is None:
+            size = len(json.dumps(events, ensure_ascii=False, default=repr).encode("utf-8"))
+        self.size = size
+        self.created = time.monotonic() - age
+        self.hits = 0
+
+
+def _refs(events: list[tuple]) -> list[str]:
+    """`observation_store` references in stored events: truncated steps and the final."""
+    refs = []
+    for event, data in events:
+        if isinstance(data, dict):
+            ref = data.get("ref") if event == "step" else data.get("observation_ref")
+            if ref:
+                refs.append(ref)
+    return refs
+
+
+def incomplete(data) -> bool:
+    """A `final` that is not an answer: partial (stopped by a limit) or mcp_use giving up."""
+    if not isinstance(data, dict):
+        return False
+    text = data.get("text")
+    return bool(data.get("partial")) or (isinstance(text, str) and text.startswith(_AGENT_STOPPED))
+
+
+class AnswerCache:
+    """
+    Bounded cache of completed answers, stored as their (event, data) pairs without the `status`
+    events. A stored `start` (which names the model that answered) is merged into the fresh one on
+    replay.
+
+    Entries expire after `ttl` seconds; when the total size exceeds `max_bytes` the least recently
+    used entries are evicted. Only runs that finished without an `error` event are stored.
+    With a `shared` store, answers are also written there and a local miss is looked up there,
+    so an answer completed by one worker serves the same question at every other worker.
+    Large tool observations an answer references by id are kept in `observations` as long as the
+    answer; an answer whose observations are gone anyway (evicted) is a miss rather than a replay
+    of references that no longer resolve.
+    """
+
+    def __init__(self, ttl: float, max_bytes: int, replay_interval: float, shared: SharedStore | None = None,
+                 namespace: str = _NS, observations: ObservationStore | None = None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.replay_interval = replay_interval
+        self.shared = shared
+        self.namespace = namespace
+        self.observations = observations
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_bytes > 0
+
+    async def get(self, key: tuple) -> list[tuple] | None:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.created > self.ttl:
+            self._remove(key)
+            entry = None
+        if entry is None:
+            entry = await self._get_shared(key)
+        if entry is not None and not await self._observations_kept(entry, 0):
+            self._remove(key)
+            if self.shared is not None:
+                await self.shared.adelete(self.namespace, [shared_key(key)])
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self.hits += 1
+        return entry.events
+
+    async def _get_shared(self, key: tuple) -> _Entry | None:
+        found = await self.shared.aget(self.namespace, shared_key(key)) if self.shared is not None else None
+        if found is None:
+            return None
+        value, expires_in = found
+        self.shared_hits += 1
+        entry = _Entry([tuple(item) for item in json.loads(value)], age=self.ttl - expires_in, size=len(value))
+        self._insert(key, entry)
+        return entry
+
+    async def _observations_kept(self, entry: _Entry, ttl: float) -> bool:
+        refs = _refs(entry.events) if self.observations is not None else []
+        return not refs or await self.observations.keep(refs, ttl)
+
+    async def put(self, key: tuple, events: list[tuple]):
+        if not self.enabled:
+            return
+        value = dumps(events) if self.shared is not None else None
+        entry = _Entry(events) if value is None else _Entry(events, size=len(value))
+        if entry.size > self.max_bytes or not await self._observations_kept(entry, self.ttl):
+            return
+        if value is not None:
+            await self.shared.aput(self.namespace, shared_key(key), value, self.ttl)
+        self._insert(key, entry)
+
+    def _insert(self, key: tuple, entry: _Entry):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    async def apurge(self, question: str | None = None) -> int:
+        """Drop every entry, or only those whose normalized question (last key part) matches."""
+        keys = [k for k in self._entries if question is None or k[-1] == question]
+        for key in keys:
+            self._remove(key)
+        if self.shared is None:
+            return len(keys)
+        if question is None:
+            return max(len(keys), await self.shared.adelete(self.namespace))
+        shared = [k for k in await self.shared.akeys(self.namespace) if json.loads(k)[-1] == question]
+        return max(len(keys), await self.shared.adelete(self.namespace, shared))
+
+    async def record(self, key: tuple, events: AsyncIterator[tuple]) -> AsyncIterator[tuple]:
+        """
+        Pass `events` through and store them on a clean finish. `status` events (progress, queue
+        positions) only make sense live and are not stored, and a run whose `final` is partial
+        (stopped by a limit) or mcp_use's "Agent stopped ..." text is not stored at all.
+        """
+        recorded = []
+        failed = False
+        async for item in events:
+            if item[0] != "status":
+                recorded.append(item)
+                failed = failed or item[0] == "error" or (item[0] == "final" and incomplete(item[1]))
+            yield item
+        if not failed:
+            await self.put(key, recorded)
+
+    async def replay(self, first: tuple, events: list[tuple]) -> AsyncIterator[tuple]:
+        """Yield a fresh opening event followed by the stored ones, optionally paced."""
+        if events and events[0][0] == first[0] == "start":
+            # the stored start names the model that answered; the fresh one this response
+            first, events = ("start", {**events[0][1], **first[1]}), events[1:]
+        yield first
+        for item in events:
+            if self.replay_interval > 0:
+                await asyncio.sleep(self.replay_interval)
+            yield item
+
+    def entries(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "key": list(key),
+                "bytes": entry.size,
+                "events": len(entry.events),
+                "hits": entry.hits,
+                "age_s": round(now - entry.created, 1),
+                "expires_in_s": round(self.ttl - (now - entry.created), 1),
+            }
+            for key, entry in self._entries.items()
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+answer_cache = AnswerCache(
+    ttl=ANSWER_CACHE_TTL,
+    max_bytes=ANSWER_CACHE_MAX_BYTES,
+    replay_interval=ANSWER_CACHE_REPLAY_INTERVAL,
+    shared=shared_store,
+    observations=observation_store,
+)
+
+# document summaries, keyed by content hash; a re-upload replays the stored partials and summary at once
+summary_cache = AnswerCache(
+    ttl=SUMMARY_CACHE_TTL,
+    max_bytes=SUMMARY_CACHE_MAX_BYTES,
+    replay_interval=0,
+    shared=shared_store,
+    namespace="summaries",
+)
@@ -0,0 +1,46 @@
+class CancellationStats:
+    """
+    Counts runs cancelled because every client disconnected, and estimates the upstream work
+    saved: the average tokens (delta events) / tool calls (step events) of completed runs of the
+    same kind, minus what the cancelled run had already produced.
+    """
+
+    def __init__(self):
+        self._kinds: dict[str, dict] = {}
+
+    def _kind(self, kind: str) -> dict:
+        return self._kinds.setdefault(kind, {
+            "completed": 0,
+            "completed_tokens": 0,
+            "completed_tool_calls": 0,
+            "cancelled": 0,
+            "tokens_saved": 0,
+            "tool_calls_saved": 0,
+        })
+
+    def completed(self, kind: str, tokens: int, tool_calls: int):
+        k = self._kind(kind)
+        k["completed"] += 1
+        k["completed_tokens"] += tokens
+        k["completed_tool_calls"] += tool_calls
+
+    def cancelled(self, kind: str, tokens: int, tool_calls: int):
+        k = self._kind(kind)
+        k["cancelled"] += 1
+        if k["completed"]:
+            k["tokens_saved"] += max(0, round(k["completed_tokens"] / k["completed"]) - tokens)
+            k["tool_calls_saved"] += max(0, round(k["completed_tool_calls"] / k["completed"]) - tool_calls)
+
+    def stats(self) -> dict:
+        return {
+            kind: {
+                "cancelled": k["cancelled"],
+                "tokens_saved_estimate": k["tokens_saved"],
+                "tool_calls_saved_estimate": k["tool_calls_saved"],
+                "completed": k["completed"],
+            }
+            for kind, k in self._kinds.items()
+        }
+
+
+cancellation_stats = CancellationStats()
@@ -0,0 +1,103 @@
+import codecs
+import hashlib
+import tempfile
+from typing import Iterator
+
+# uploads are copied into a file of our own (in memory up to this size): a summary run can outlive
+# the request that started it, and concurrent uploads of the same document join that run
+_SPOOL_BYTES = 1024 * 1024
+_READ_BLOCK = 64 * 1024
+
+_PDF_MAGIC = b"%PDF-"
+
+
+class DocumentError(ValueError):
+    """Upload that cannot be summarized (too large, binary, PDF without pypdf, no text)."""
+
+    def __init__(self, message: str, code: int = 400):
+        super().__init__(message)
+        self.code = code
+
+
+class Document:
+    """An uploaded file: name, size, SHA-256 of the content and the content itself."""
+
+    def __init__(self, name: str, file, size: int, sha256: str):
+        self.name = name
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+
+    def close(self):
+        self.file.close()
+
+
+async def read_upload(upload, max_bytes: int) -> Document:
+    """Copy an `UploadFile` block by block into a `Document`, hashing it on the way."""
+    file = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while block := await upload.read(_READ_BLOCK):
+            size += len(block)
+            if size > max_bytes:
+                raise DocumentError(f"Document is larger than {max_bytes} bytes", code=413)
+            digest.update(block)
+            file.write(block)
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return Document(upload.filename or "document", file, size, digest.hexdigest())
+
+
+def iter_text(document: Document) -> Iterator[str]:
+    """
+    Text of the document in pieces, read incrementally: UTF-8 text (invalid bytes replaced) block
+    by block, PDFs page by page (needs the optional `pypdf` package).
+    """
+    file = document.file
+    file.seek(0)
+    head = file.read(_READ_BLOCK)
+    if head.startswith(_PDF_MAGIC):
+        yield from _iter_pdf(file)
+        return
+    if b"\x00" in head:
+        raise DocumentError("Unsupported document type (expected text or PDF)", code=415)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    block = head
+    while block:
+        yield decoder.decode(block)
+        block = file.read(_READ_BLOCK)
+    yield decoder.decode(b"", final=True)
+
+
+def _iter_pdf(file) -> Iterator[str]:
+    from pypdf import PdfReader  # loaded by prewarm, or on the first PDF
+
+    file.seek(0)
+    for page in PdfReader(file).pages:
+        yield (page.extract_text() or "") + "\n\n"
+
+
+def _cut(text: str, limit: int) -> int:
+    """Where to end a chunk of at most `limit` characters: paragraph, line, sentence, word, anywhere."""
+    for separator in ("\n\n", "\n", ". ", " "):
+        cut = text.rfind(separator, limit // 2, limit)
+        if cut != -1:
+            return cut + len(separator)
+    return limit
+
+
+def iter_chunks(pieces: Iterator[str], max_chars: int) -> Iterator[str]:
+    """Regroup text pieces into chunks of at most `max_chars`, cut at the most natural boundary."""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) > max_chars:
+            cut = _cut(buffer, max_chars)
+            chunk, buffer = buffer[:cut].strip(), buffer[cut:]
+            if chunk:
+                yield chunk
+    if buffer.strip():
+        yield buffer.strip()
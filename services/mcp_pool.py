@@ -0,0 +1,283 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator
+
+from configs.server import server_config
+from services import (
+    ADMISSION_MAX_CONCURRENT,
+    MCP_POOL_SIZE,
+    MCP_POOL_WARM,
+    MCP_POOL_WAIT,
+    MCP_POOL_MAX_USES,
+    MCP_POOL_MAX_AGE,
+    MCP_POOL_PING_AFTER,
+)
+from services.metrics import metrics
+from services.recorder import record_timing
+from services.tool_cache import tool_cache
+
+if TYPE_CHECKING:
+    from mcp_use import MCPClient
+    from mcp_use.adapters.langchain_adapter import LangChainAdapter
+
+
+def _instrument(connector):
+    """Record latency, result size and failures of every `call_tool` made through `connector`."""
+    call_tool = connector.call_tool
+
+    async def timed_call_tool(name: str, arguments: dict, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            result = await call_tool(name, arguments, *args, **kwargs)
+        except Exception as e:
+            metrics.upstream_errors.inc("mcp_tool", type(e).__name__)
+            raise
+        finally:
+            metrics.tool_latency.observe(time.perf_counter() - t0, name)
+            record_timing("tool", time.perf_counter() - t0, tool=name)
+        if getattr(result, "isError", False):
+            metrics.upstream_errors.inc("mcp_tool", "ToolError")
+        size = sum(len((getattr(c, "text", None) or "").encode("utf-8")) for c in result.content)
+        metrics.tool_bytes.observe(size, name)
+        return result
+
+    connector.call_tool = timed_call_tool
+
+
+class PooledSession:
+    """
+    One initialized MCPClient (transport + MCP `initialize` + tool discovery already done)
+    together with the adapter that holds its converted LangChain tools.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.client: "MCPClient | None" = None
+        self.adapter: "LangChainAdapter | None" = None
+        self.tools: list = []
+        self.created_at = 0.0
+        self.last_used = 0.0
+        self.uses = 0
+
+    async def open(self):
+        from mcp_use import MCPClient
+        from mcp_use.adapters.langchain_adapter import LangChainAdapter
+
+        self.client = MCPClient.from_dict(self.config)
+        # A fresh adapter per connection: it caches tools per connector instance.
+        self.adapter = LangChainAdapter()
+        await self.client.create_all_sessions()
+        for session in self.client.get_all_active_sessions().values():
+            _instrument(session.connector)
+            # outermost, so cache hits skip the round-trip and stay out of the latency metrics
+            tool_cache.wrap(session.connector)
+        self.tools = await self.adapter.create_tools(self.client)
+        self.created_at = self.last_used = time.monotonic()
+        self.uses = 0
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close_all_sessions()
+        self.client = None
+        self.adapter = None
+        self.tools = []
+
+    def is_connected(self) -> bool:
+        if self.client is None:
+            return False
+        sessions = self.client.get_all_active_sessions()
+        return bool(sessions) and all(s.is_connected for s in sessions.values())
+
+    async def ping(self) -> bool:
+        try:
+            for session in self.client.get_all_active_sessions().values():
+                await session.connector.client_session.send_ping()
+            return True
+        except Exception:
+            return False
+
+
+class PoolTimeout(Exception):
+    """No MCP session came free within the pool's wait bound."""
+
+
+class Checkout:
+    """A claim on a pooled session; `positions()` waits for one, `release()` must always follow."""
+
+    def __init__(self, pool: "MCPSessionPool"):
+        self.pool = pool
+        self.slot: PooledSession | None = None
+        self.used = False
+        self.released = False
+        self.enqueued_at = time.monotonic()
+
+    async def positions(self, until: float | None = None) -> AsyncIterator[int]:
+        """
+        Yield the 1-based position among the waiting runs whenever it changes, until a session is
+        free; `PoolTimeout` if none is by `until` (`time.monotonic()`, None = the pool's `wait`).
+        """
+        deadline = self.enqueued_at + self.pool.wait if until is None else until
+        last = None
+        while self.slot is None:
+            position = self.pool.position(self)
+            if position != last:
+                last = position
+                yield position
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.pool.timeouts += 1
+                raise PoolTimeout(f"no MCP session free after {time.monotonic() - self.enqueued_at:.1f} s, retry later")
+            try:
+                await asyncio.wait_for(self.pool.changed(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def ready(self) -> PooledSession:
+        """The session handed to this claim, checked (and reopened if needed) before use."""
+        await self.pool._ensure_healthy(self.slot)
+        self.slot.uses += 1
+        self.used = True
+        return self.slot
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            if self.used:
+                self.slot.last_used = time.monotonic()
+            self.pool._release(self)
+
+
+class MCPSessionPool:
+    """
+    App-lifetime pool of pre-warmed MCP sessions, one per agent run at a time.
+
+    `start()` opens `warm` of the `size` sessions up front (called from the FastAPI lifespan); the
+    others open on first use, so idle workers keep few connections while concurrent runs still get
+    a session each. `checkout()` claims one per request: the most recently used free session first,
+    so warm ones are reused before cold ones are opened. When all are busy, runs wait in order for
+    at most `wait` seconds. A session is recycled (closed and reopened) when it lost its
+    connection, exceeded `max_uses`/`max_age`, or fails a ping after being idle for `ping_after`
+    seconds.
+    """
+
+    def __init__(self, config: dict, size: int, max_uses: int, max_age: float, ping_after: float,
+                 warm: int = 2, wait: float = 30.0):
+        self.config = config
+        self.size = max(1, size)
+        self.warm = min(max(0, warm), self.size)
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.ping_after = ping_after
+        self.wait = wait
+        self._slots: list[PooledSession] = []
+        self._idle: list[PooledSession] | None = None
+        self._waiters: deque[Checkout] = deque()
+        self._changed = asyncio.Event()
+        self._start_lock = asyncio.Lock()
+        self.recycled = 0
+        self.waited = 0
+        self.timeouts = 0
+
+    async def start(self):
+        async with self._start_lock:
+            if self._idle is not None:
+                return
+            self._slots = [PooledSession(self.config) for _ in range(self.size)]
+            # A failed open leaves the slot closed; it is reopened on first checkout.
+            await asyncio.gather(*(slot.open() for slot in self._slots[:self.warm]), return_exceptions=True)
+            # the free list is used from its end: the warm sessions go there
+            self._idle = self._slots[::-1]
+
+    async def close(self):
+        if self._idle is None:
+            return
+        for slot in self._idle:
+            try:
+                await slot.close()
+            except Exception:
+                pass
+        self._idle = None
+
+    async def _ensure_healthy(self, slot: PooledSession):
+        now = time.monotonic()
+        healthy = (
+            slot.is_connected()
+            and slot.uses < self.max_uses
+            and now - slot.created_at < self.max_age
+        )
+        if healthy and now - slot.last_used > self.ping_after:
+            healthy = await slot.ping()
+        if not healthy:
+            if slot.client is not None:
+                self.recycled += 1
+                try:
+                    await slot.close()
+                except Exception:
+                    pass
+            await slot.open()
+
+    async def checkout(self) -> Checkout:
+        """Claim a session: at once when one is free, else once `positions()` has waited for it."""
+        if self._idle is None:
+            await self.start()
+        checkout = Checkout(self)
+        if self._idle and not self._waiters:
+            checkout.slot = self._idle.pop()
+        else:
+            self._waiters.append(checkout)
+            self.waited += 1
+        return checkout
+
+    @asynccontextmanager
+    async def acquire(self, timeout: float | None = None):
+        """Borrow a ready session for the duration of one request (waiting up to `timeout`)."""
+        checkout = await self.checkout()
+        try:
+            async for _ in checkout.positions(None if timeout is None else checkout.enqueued_at + timeout):
+                pass
+            yield await checkout.ready()
+        finally:
+            checkout.release()
+
+    def position(self, checkout: Checkout) -> int:
+        return self._waiters.index(checkout) + 1 if checkout in self._waiters else 0
+
+    async def changed(self):
+        await self._changed.wait()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _release(self, checkout: Checkout):
+        if checkout.slot is None:
+            self._waiters.remove(checkout)
+        elif self._idle is not None:
+            self._idle.append(checkout.slot)
+        while self._waiters and self._idle:
+            self._waiters.popleft().slot = self._idle.pop()
+        self._notify()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "open": sum(slot.client is not None for slot in self._slots),
+            "idle": len(self._idle) if self._idle is not None else 0,
+            "waiting": len(self._waiters),
+            "waited": self.waited,
+            "wait_timeouts": self.timeouts,
+            "recycled": self.recycled,
+        }
+
+
+mcp_pool = MCPSessionPool(
+    server_config,
+    size=MCP_POOL_SIZE or ADMISSION_MAX_CONCURRENT,
+    max_uses=MCP_POOL_MAX_USES,
+    max_age=MCP_POOL_MAX_AGE,
+    ping_after=MCP_POOL_PING_AFTER,
+    warm=MCP_POOL_WARM,
+    wait=MCP_POOL_WAIT,
+)
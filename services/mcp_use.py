@@ -1,80 +1,515 @@
-import json
+import asyncio
+import time
+from contextvars import ContextVar
+from functools import lru_cache
 
-from langchain_openai import ChatOpenAI
-from mcp_use import MCPClient, MCPAgent
+from services import (
+    AGENT_TOOL_CONCURRENCY,
+    HEARTBEAT_INTERVAL,
+    DISCONNECT_POLL_INTERVAL,
+    SSE_RETRY_MS,
+    SSE_OBSERVATION_BUDGET,
+    SSE_OBSERVATION_CHUNKS,
+)
+from services.admission import AdmissionRejected, llm_admission
+from services.agent_limits import agent_limits, expired, remaining
+from services.answer_cache import answer_cache, incomplete
+from services.mcp_pool import PooledSession, PoolTimeout, mcp_pool
+from services.metrics import metrics
+from services.observations import iter_chunks, measure, observation_store
+from services.recorder import record_timing
+from services.sessions import Session, sessions
+from services.single_flight import single_flight
+from services.tool_cache import tool_cache
+from services.tool_router import tool_router
+from services.upstreams import Upstream, is_retryable, upstream_pool
+from utils.common import normalize_question, sse, with_heartbeat
+from utils.sse import dumps
 
-from configs.server import server_config
-from services import API_KEY, MODEL_NAME, BASE_URL
 
+async def _bounded_observation(observation) -> tuple[object, str | None, int]:
+    """
+    (frame value, ref, size): an observation over SSE_OBSERVATION_BUDGET bytes is kept in
+    `observation_store` (not copied) and replaced by a preview of that size plus its reference.
+    """
+    budget = SSE_OBSERVATION_BUDGET
+    if budget <= 0:
+        return observation, None, 0
+    if isinstance(observation, str):
+        head, size = measure(observation, budget)
+    else:
+        # encoding a large JSON value to size it takes a while: not on the event loop
+        head, size = await asyncio.to_thread(measure, observation, budget)
+    if size is None:
+        return observation, None, 0
+    ref = await observation_store.put(observation, size)
+    return head, ref, size
+
+
+async def _expand_observations(events):
+    """After a `step` with an over-budget observation, stream the full text as `observation` chunks."""
+    async for item in events:
+        yield item
+        event_id, event, data = item
+        if event != "step" or not isinstance(data, dict) or "ref" not in data:
+            continue
+        stored = await observation_store.get(data["ref"])
+        if stored is None:
+            continue
+        chunks = iter_chunks(stored.text, SSE_OBSERVATION_BUDGET)
+        chunk = next(chunks, "")
+        seq = 0
+        while True:
+            following = next(chunks, None)
+            # no id: a resumed stream continues after the step, the client can fetch the rest by ref
+            yield None, "observation", {"ref": data["ref"], "seq": seq, "data": chunk, "last": following is None}
+            if following is None:
+                break
+            chunk, seq = following, seq + 1
+
+
+# the final text mcp_use ends a run with when it used up its steps, and our tool timeout observation
+_MAX_STEPS_TEXT = "Agent stopped after reaching the maximum number of steps ({})."
+_TOOL_TIMEOUT_TEXT = "Error: tool call timed out after {:g} s"
+
+# LLM errors of the current agent run; mcp_use turns them into a final text instead of raising
+_llm_errors: ContextVar[list | None] = ContextVar("llm_errors", default=None)
+# LLM calls started by the current agent run (one per step, plus the final answer)
+_llm_calls: ContextVar[list | None] = ContextVar("llm_calls", default=None)
+
+
+@lru_cache(maxsize=None)
+def _get_llm(upstream: Upstream):
+    """One per upstream, shared across requests; holds that upstream's HTTP connection pool."""
+    # LangChain is imported on first use (or by the startup prewarm), not with the app
+    from langchain_core.callbacks import AsyncCallbackHandler
+    from langchain_openai import ChatOpenAI
+
+    class _LLMErrorTap(AsyncCallbackHandler):
+        async def on_chat_model_start(self, serialized, messages, **kwargs):
+            calls = _llm_calls.get()
+            if calls is not None:
+                calls.append(None)
+
+        async def on_llm_error(self, error: BaseException, **kwargs):
+            errors = _llm_errors.get()
+            if errors is not None:
+                errors.append(error)
+
+    return ChatOpenAI(
+        model=upstream.model,
+        streaming=True,
+        api_key=upstream.api_key,
+        base_url=upstream.base_url or None,
+        max_retries=upstream.max_retries,
+        callbacks=[_LLMErrorTap()],
+    )
+
+
+def _dispatch_tools(executor, done: asyncio.Queue, concurrency: int, timeout: float) -> set[int]:
+    """
+    Run the tool calls of one agent step at most `concurrency` at a time over the MCP session, and
+    put every (action, observation) on `done` as soon as it completes. The executor itself starts
+    them all at once and hands them back only when the slowest has returned. A call taking more
+    than `timeout` seconds (0 = no limit) is abandoned; the model sees a timeout observation.
+
+    Returns the set that collects the ids of the actions run this way.
+    """
+    from langchain_core.agents import AgentStep
 
-# ========= SSE helper =========
-def _sse(event: str | None = None, data: dict | str | list | None = None) -> str:
-    """Build an SSE frame (UTF-8, no ASCII escaping)."""
-    parts = []
-    if event:
-        parts.append(f"event: {event}")
-    if data is not None:
-        if not isinstance(data, str):
+    perform = executor._aperform_agent_action
+    slots = asyncio.Semaphore(max(1, concurrency))
+    dispatched = set()
+
+    async def perform_limited(name_to_tool_map, color_mapping, agent_action, *args, **kwargs):
+        dispatched.add(id(agent_action))
+        async with slots:
+            call = perform(name_to_tool_map, color_mapping, agent_action, *args, **kwargs)
             try:
-                data = json.dumps(data, ensure_ascii=False, default=_json_fallback)
-            except Exception:
-                # As a last resort, stringify
-                data = str(data)
-        parts.append(f"data: {data}")
-    return "\n".join(parts) + "\n\n"
+                step = await asyncio.wait_for(call, timeout) if timeout > 0 else await call
+            except asyncio.TimeoutError:
+                agent_limits.tool_timed_out(agent_action.tool)
+                step = AgentStep(action=agent_action, observation=_TOOL_TIMEOUT_TEXT.format(timeout))
+        done.put_nowait((step.action, step.observation))
+        return step
 
+    # a pydantic model: bypass its field validation to override the method on this instance only
+    object.__setattr__(executor, "_aperform_agent_action", perform_limited)
+    return dispatched
 
-def _json_fallback(o):
-    """Fallback serializer for non-JSON-serializable objects."""
-    try:
-        return dict(o)
-    except Exception:
-        return repr(o)
+
+class _RoutedTools:
+    """Stands in for the pooled adapter, so the agent's prompt and executor get only the routed tools."""
+
+    def __init__(self, tools: list):
+        self.tools = tools
+
+    async def create_tools(self, client) -> list:
+        return self.tools
+
+
+def _partial_final(stopped: str, last_ref: str | None, last_observation) -> dict:
+    """`final` of a run stopped by a limit: the last useful observation, if any."""
+    if last_ref is not None:
+        data = {"observation_ref": last_ref}
+    elif last_observation is not None:
+        data = {"observation": last_observation}
+    else:
+        data = {"text": ""}
+    data.update(partial=True, stopped=stopped)
+    return data
+
+
+def warm_llms():
+    """Build the chat model of every upstream ahead of the first agent run."""
+    for upstream in upstream_pool.upstreams:
+        _get_llm(upstream)
 
 
 # ========= Main streamer =========
-async def stream_mcp(question: str):
+async def stream_mcp(
+    question: str,
+    request=None,
+    last_event_id: str | None = None,
+    client_key: str = "",
+    session: Session | None = None,
+):
     """
     Streams MCP agent steps. Final event returns the *original* last observation:
       {"observation": <raw observation from tool>}
+
+    The MCP session (handshake, `initialize`, tool discovery) is borrowed from the pre-warmed
+    `mcp_pool` instead of being built per request. While every session is busy, `status` events
+    (`"waiting_for_session"`) carry the run's place in line; after MCP_POOL_WAIT seconds it ends
+    with an `error` event (`"code": 503`). Identical in-flight questions share one
+    agent run, and completed runs are replayed from `answer_cache` with `"cached": true` on the
+    status event. With `request`, a client disconnect cancels the agent loop and returns the MCP
+    session to the pool (once no other subscriber shares the run).
+
+    Every frame carries an `id:`; a reconnect sending it back as `last_event_id` receives only the
+    frames it missed from the still running or recently finished run.
+
+    The agent's LLM is the best healthy upstream of `upstream_pool`; a retryable upstream error
+    before the first step fails over to the next one (no hedging: tool calls may have side
+    effects). Agent runs are admitted through `llm_admission` (fair per `client_key`); while queued,
+    `status` events carry the queue position, and a full queue answers with an `error` event
+    (`"code": 429`).
+
+    Observations larger than SSE_OBSERVATION_BUDGET bytes are kept in `observation_store`: the
+    `step` frame carries a preview plus `"ref"` (full text at GET /observations/{ref}), the text
+    optionally follows as `observation` frames of at most the budget each (SSE_OBSERVATION_CHUNKS),
+    and `final` then carries `{"observation_ref": ...}` instead of repeating the payload.
+
+    Independent tool calls the model makes in one step run concurrently over the MCP session (at
+    most AGENT_TOOL_CONCURRENCY at a time); their `step` events follow in completion order, each
+    tagged with the `"call_id"` of its tool call.
+
+    The agent is offered only the tools `tool_router` picks for the question and the session's
+    recent questions (at most TOOL_ROUTER_MAX_TOOLS), not the whole MCP catalog; a run that calls
+    none of them is repeated with the whole catalog.
+
+    Runs are bounded by `agent_limits`: a tool call past AGENT_TOOL_TIMEOUT gets a `"timed_out":
+    true` step (the model carries on without it), and a run past AGENT_RUN_DEADLINE (counted from
+    admission: waiting for and opening the MCP session count too), out of steps, or stalled on
+    repeating observations ends with a `final` carrying its last observation plus `"partial": true`
+    and `"stopped"` (`deadline`, `max_steps` or `stalled`). Partial runs are not cached.
+
+    With a `session`, the agent sees the conversation so far and the run is recorded as its next
+    turn (see `_session_events`).
     """
+    key = ("mcp", upstream_pool.model_name, normalize_question(question))
+    events = single_flight.resume(last_event_id)
+    if events is None and session is not None:
+        session_key = ("mcp", upstream_pool.model_name, f"session:{session.id}", key[-1])
+        events = single_flight.subscribe(session_key, lambda: _session_events(session, question, key, client_key))
+    elif events is None:
+        cached = await answer_cache.get(key)
+        if cached is not None:
+            first = ("status", {"message": "starting", "cached": True})
+            events = single_flight.subscribe(key, lambda: answer_cache.replay(first, cached), share=False)
+        else:
+            events = single_flight.subscribe(key, lambda: answer_cache.record(key, _agent_events(question, client_key)))
+    events = metrics.observe_stream("mcp", events, {"step", "final"})
+    if SSE_OBSERVATION_CHUNKS:
+        events = _expand_observations(events)
+    frames = (
+        sse(event, data, id=event_id, retry=SSE_RETRY_MS) async for event_id, event, data in events
+    )
+    async for frame in with_heartbeat(frames, HEARTBEAT_INTERVAL, request, DISCONNECT_POLL_INTERVAL):
+        yield frame
 
-    client = MCPClient.from_dict(server_config)
-    # client = MCPClient.from_dict({})
 
-    llm = ChatOpenAI(model=MODEL_NAME, streaming=True, api_key=API_KEY, base_url=BASE_URL)
+async def _final_answer(data: dict) -> str:
+    """What the client was shown as the answer, as text for the session history."""
+    if "text" in data:
+        return data["text"]
+    if "observation_ref" in data:
+        stored = await observation_store.get(data["observation_ref"])
+        return stored.text if stored is not None else ""
+    observation = data.get("observation")
+    return observation if isinstance(observation, str) else dumps(observation).decode("utf-8")
 
-    agent = MCPAgent(llm=llm, client=client, max_steps=30)
 
-    yield _sse(event="status", data={"message": "starting"})
+async def _session_events(session: Session, question: str, key: tuple, client_key: str):
+    """
+    Agent run as the next turn of `session`, after its previous turn has finished. The agent gets
+    the history between its (fixed) system prompt and the question; the final answer is recorded
+    in the session unless the run was stopped short (a partial `final`). Only the opening turn
+    (no history yet) uses `answer_cache`.
+    """
+    async with sessions.turn(session):
+        if session.empty:
+            cached = await answer_cache.get(key)
+            if cached is not None:
+                first = ("status", {"message": "starting", "cached": True, "session": session.id})
+                events = answer_cache.replay(first, cached)
+            else:
+                events = answer_cache.record(key, _agent_events(question, client_key, session_id=session.id))
+        else:
+            events = _agent_events(question, client_key, session.history(), session.id)
+
+        answer = None
+        failed = False
+        async for event, data in events:
+            if event == "final" and not incomplete(data):
+                # a run stopped by a limit (or that mcp_use gave up on) is no turn to build on
+                answer = await _final_answer(data)
+            failed = failed or event == "error"
+            yield event, data
+        if answer is not None and not failed:
+            await sessions.append(session, question, answer)
+
+
+async def _agent_events(
+    question: str, client_key: str = "", history: list[tuple[str, str]] = (), session_id: str | None = None
+):
+    """Agent run as (event, data) pairs; `stream_mcp` encodes them as SSE frames."""
+    status = {"message": "starting"}
+    if session_id is not None:
+        status["session"] = session_id
+    yield "status", status
+
+    try:
+        ticket = llm_admission.enqueue(client_key)
+    except AdmissionRejected as e:
+        yield "error", {"message": str(e), "code": 429, "retry_after": e.retry_after}
+        yield None, "[DONE]"
+        return
+
+    checkout = None
+    try:
+        # wait for an upstream slot; every subscriber sees the queue position
+        queued_at = time.perf_counter()
+        async for position in ticket.positions():
+            yield "status", {"message": "queued", "position": position}
+        record_timing("admission_wait", time.perf_counter() - queued_at)
+
+        # the run's deadline starts once admitted: waiting for an MCP session and opening it count too
+        deadline = agent_limits.run_deadline()
+        # an MCP session of its own for the run; while all are busy, the wait is reported the same way
+        checkout = await mcp_pool.checkout()
+        waiting_at = time.perf_counter()
+        until = checkout.enqueued_at + mcp_pool.wait
+        try:
+            async for position in checkout.positions(until if deadline is None else min(until, deadline)):
+                yield "status", {"message": "waiting_for_session", "position": position}
+            pooled = await asyncio.wait_for(checkout.ready(), remaining(deadline))
+        except (PoolTimeout, asyncio.TimeoutError):
+            if not expired(deadline):
+                raise
+            agent_limits.ended("deadline")
+            yield "final", _partial_final("deadline", None, None)
+            yield None, "[DONE]"
+            return
+        record_timing("mcp_session_wait", time.perf_counter() - waiting_at)
+
+        # retryable upstream errors before the agent produced anything move to the next upstream
+        tried = []
+        while True:
+            upstream = upstream_pool.select(exclude=tried)
+            tried.append(upstream)
+            produced = False
+            run_at = time.perf_counter()
+            try:
+                async for event in _run_agent(question, pooled, upstream, history, deadline):
+                    produced = True
+                    yield event
+                record_timing("agent_run", time.perf_counter() - run_at, upstream=upstream.name)
+                break
+            except Exception as e:
+                record_timing(
+                    "agent_run", time.perf_counter() - run_at, upstream=upstream.name, error=type(e).__name__
+                )
+                if produced or not is_retryable(e) or upstream_pool.select(exclude=tried) is None:
+                    raise
+                upstream_pool.failed_over(upstream)
+
+        # Stream termination sentinel
+        yield None, "[DONE]"
+
+    except PoolTimeout as e:
+        yield "error", {"message": str(e), "code": 503}
+        yield None, "[DONE]"
+    except Exception as e:
+        metrics.upstream_errors.inc("mcp", type(e).__name__)
+        yield "error", {"message": str(e)}
+        yield None, "[DONE]"
+    finally:
+        if checkout is not None:
+            checkout.release()
+        ticket.release()
+
+
+async def _run_agent(
+    question: str,
+    pooled: PooledSession,
+    upstream: Upstream,
+    history: list[tuple[str, str]] = (),
+    deadline: float | None = None,
+    route: bool = True,
+):
+    """
+    One agent run on the `pooled` MCP session, yielding step/final events. Past the `deadline`
+    (`time.monotonic()`), on running out of steps, or once it stalls (see `agent_limits`), the run
+    is stopped and ends with a partial `final`. With `route`, the agent gets the tools
+    `tool_router` picks; if it then ends without calling any, it runs again with all of them.
+    """
+    from langchain_core.messages import AIMessage, HumanMessage
+    from mcp_use import MCPAgent
 
     last_observation = None  # store the most recent raw observation we see
+    last_ref = None
+    steps = 0
+    dispatched_steps = 0  # observations received of the tool calls in `dispatched`
+    errors = []
+    _llm_errors.set(errors)
+    calls = []
+    _llm_calls.set(calls)
+    tool_hits = tool_cache.track_run()
+    progress = agent_limits.progress()
+    upstream.requests += 1
+
+    agent = MCPAgent(llm=_get_llm(upstream), client=pooled.client, max_steps=agent_limits.max_steps)
+    # The pooled session's tools are already converted; offer only those relevant to the conversation.
+    tools, saved_per_call = tool_router.select(question, pooled.tools, history) if route else (pooled.tools, 0)
+    agent.adapter = _RoutedTools(tools)
+
+    # earlier turns go between the agent's system prompt and the question
+    external_history = [
+        HumanMessage(content=content) if role == "user" else AIMessage(content=content)
+        for role, content in history
+    ]
+    # setting up the agent (system prompt, tool binding) counts against the deadline too
+    try:
+        await asyncio.wait_for(agent.initialize(), remaining(deadline))
+    except asyncio.TimeoutError:
+        if not expired(deadline):
+            raise
+        agent_limits.ended("deadline")
+        yield "final", _partial_final("deadline", None, None)
+        return
+    done = asyncio.Queue()
+    dispatched = _dispatch_tools(agent._agent_executor, done, AGENT_TOOL_CONCURRENCY, agent_limits.tool_timeout)
+    timed_out = _TOOL_TIMEOUT_TEXT.format(agent_limits.tool_timeout)
 
+    async def run():
+        # steps come through `done` in completion order; the agent's own (action-ordered) copies
+        # are only forwarded for steps that were not dispatched, like parsing-error observations
+        try:
+            async for chunk in agent.stream(question, external_history=external_history):
+                if isinstance(chunk, str) or id(chunk[0]) not in dispatched:
+                    done.put_nowait(chunk)
+        finally:
+            done.put_nowait(None)
+
+    runner = asyncio.create_task(run())
+    stopped = None
+    retry = False
     try:
-        async for chunk in agent.stream(question):
+        while True:
+            try:
+                chunk = await asyncio.wait_for(done.get(), remaining(deadline))
+            except asyncio.TimeoutError:
+                stopped = "deadline"
+                break
+            if chunk is None:
+                break
             if isinstance(chunk, str):
+                if not steps and errors and is_retryable(errors[-1]):
+                    # the upstream failed before anything was produced: let the caller fail over
+                    raise errors[-1]
+                if chunk == _MAX_STEPS_TEXT.format(agent_limits.max_steps):
+                    stopped = "max_steps"
+                    break
+                if not steps and len(tools) < len(pooled.tools):
+                    # none of the routed tools fit: nothing was streamed yet, so start over with all of them
+                    retry = True
+                    break
                 # Final LLM message. Prefer returning the raw observation if we have any.
-                if last_observation is not None:
-                    yield _sse(event="final", data={"observation": last_observation})
+                if chunk.startswith("Agent stopped"):
+                    # mcp_use gave up on an error; say so rather than pass off the last observation
+                    agent_limits.ended("error")
+                    yield "final", {"text": chunk}
+                    continue
+                agent_limits.ended("answered")
+                if last_ref is not None:
+                    # already streamed with the step; don't send the full payload twice
+                    yield "final", {"observation_ref": last_ref}
+                elif last_observation is not None:
+                    yield "final", {"observation": last_observation}
                 else:
-                    yield _sse(event="final", data={"text": chunk})
+                    yield "final", {"text": chunk}
+                continue
+
+            action, observation = chunk
+            steps += 1
+
+            # Forward step frames for debugging/telemetry
+            tool = getattr(action, "tool", None)
+            tool_input = getattr(action, "tool_input", None)
+            output, ref, size = await _bounded_observation(observation)
+            step = {
+                "tool": tool,
+                "input": tool_input,
+                "call_id": getattr(action, "tool_call_id", None),
+                "output": output,  # raw observation (dict/list/str), serialized via utils.sse
+                "cached": tool_cache.was_hit(tool_hits, tool, tool_input),
+            }
+            if ref is not None:
+                step.update(truncated=True, ref=ref, output_chars=size)
+            if observation == timed_out:
+                step["timed_out"] = True
             else:
-                action, observation = chunk
-                last_observation = observation  # keep the raw, unmodified observation
-
-                # Forward step frames for debugging/telemetry
-                yield _sse(
-                    event="step",
-                    data={
-                        "tool": getattr(action, "tool", None),
-                        "input": getattr(action, "tool_input", None),
-                        "output": observation,  # raw observation (dict/list/str), serialized via _sse
-                    },
-                )
+                # keep the raw, unmodified observation; a timeout has none to offer
+                last_observation, last_ref = observation, ref
+            yield "step", step
+            progress.observe(tool, tool_input, observation)
+            if id(action) in dispatched:
+                dispatched_steps += 1
+            # the calls of one step are all dispatched before the first returns: the step is
+            # over once every dispatched call has come back
+            if dispatched_steps == len(dispatched) and progress.step_done():
+                stopped = "stalled"
+                break
 
-        # Stream termination sentinel
-        yield _sse(data="[DONE]")
+        if stopped is not None:
+            agent_limits.ended(stopped)
+            yield "final", _partial_final(stopped, last_ref, last_observation)
+        else:
+            await runner
+    finally:
+        tool_router.record(saved_per_call, len(calls))
+        if not runner.done():
+            runner.cancel()
+            try:
+                await runner
+            except (asyncio.CancelledError, Exception):
+                pass
 
-    except Exception as e:
-        yield _sse(event="error", data={"message": str(e)})
-        yield _sse(data="[DONE]")
+    if retry:
+        tool_router.retried()
+        async for event in _run_agent(question, pooled, upstream, history, deadline, route=False):
+            yield event
+        return
+    upstream.succeeded()
+    metrics.agent_steps.observe(steps)
@@ -0,0 +1,142 @@
+import time
+from bisect import bisect_left
+from typing import AsyncIterator
+
+# Every recording call happens on the event loop thread, so the metrics are plain dicts/lists
+# without locks; rendering walks them once per scrape. Each worker process has its own registry.
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 500, 1000)
+_BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+_STEP_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = _LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Metrics:
+    """Series exported on /metrics (Prometheus text format 0.0.4)."""
+
+    def __init__(self):
+        self.stream_ttft = Histogram(
+            "chat_stream_ttft_seconds", "Time from request to the first content frame.", ("endpoint",))
+        self.stream_duration = Histogram(
+            "chat_stream_duration_seconds", "Total duration of a client stream.", ("endpoint",))
+        self.streams_active = Gauge("chat_streams_active", "Client streams currently open.", ("endpoint",))
+        self.tokens_per_second = Histogram(
+            "llm_tokens_per_second", "Delta chunks per second of an upstream completion.", ("endpoint",),
+            buckets=_RATE_BUCKETS)
+        self.tool_latency = Histogram("mcp_tool_call_seconds", "MCP tool call latency.", ("tool",))
+        self.tool_bytes = Histogram(
+            "mcp_tool_observation_bytes", "Size of the text returned by an MCP tool call.", ("tool",),
+            buckets=_BYTES_BUCKETS)
+        self.tool_cache = Counter(
+            "mcp_tool_cache_total", "MCP tool-result cache lookups by tool and result.", ("tool", "result"))
+        self.agent_steps = Histogram("mcp_agent_steps", "Tool steps per agent run.", buckets=_STEP_BUCKETS)
+        self.agent_endings = Counter(
+            "mcp_agent_endings_total", "Agent runs by how they ended (answered or the limit that stopped them).",
+            ("how",))
+        self.tool_timeouts = Counter("mcp_tool_timeouts_total", "MCP tool calls that timed out.", ("tool",))
+        self.upstream_errors = Counter(
+            "upstream_errors_total", "Upstream failures by endpoint and exception type.", ("endpoint", "type"))
+        self.upstream_failovers = Counter(
+            "upstream_failovers_total", "Retryable failures before the first token, by upstream.", ("upstream",))
+        self.upstream_hedges = Counter("upstream_hedges_total", "Second upstream requests started by hedging.")
+
+    def _all(self) -> list:
+        return [value for value in vars(self).values() if hasattr(value, "render")]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._all():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    async def observe_stream(self, endpoint: str, events: AsyncIterator[tuple], content_events: set) -> AsyncIterator[tuple]:
+        """
+        Pass (event_id, event, data) triples through, recording the time to the first event in
+        `content_events`, the total stream duration and the active stream gauge.
+        """
+        t0 = time.perf_counter()
+        first = True
+        self.streams_active.inc(endpoint)
+        try:
+            async for item in events:
+                if first and item[1] in content_events:
+                    first = False
+                    self.stream_ttft.observe(time.perf_counter() - t0, endpoint)
+                yield item
+        finally:
+            self.streams_active.dec(endpoint)
+            self.stream_duration.observe(time.perf_counter() - t0, endpoint)
+
+
+metrics = Metrics()
@@ -0,0 +1,168 @@
+import json
+import secrets
+import time
+from collections import OrderedDict
+from typing import Iterator
+
+from services import OBSERVATION_STORE_TTL, OBSERVATION_STORE_MAX_BYTES
+from services.shared_store import SharedStore, shared_store
+from utils.sse import dumps, to_jsonable
+
+_NS = "observations"
+# walks a JSON observation piece by piece (compact, like the orjson frames), never as one string
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=to_jsonable)
+
+
+def preview(text: str, budget: int) -> str:
+    """Longest prefix of `text` that fits in `budget` UTF-8 bytes (without encoding all of it)."""
+    head = text[:budget].encode("utf-8")[:budget]
+    return head.decode("utf-8", errors="ignore")
+
+
+def measure(observation, budget: int) -> tuple[str, int | None]:
+    """
+    (preview, size in characters) of an observation's text, size None when it fits in `budget`
+    UTF-8 bytes. A JSON value is encoded incrementally: only the first `budget` characters of
+    its text are ever held, the rest is counted and dropped.
+    """
+    if isinstance(observation, str):
+        # characters <= UTF-8 bytes <= 4 * characters, so most sizes are known without encoding
+        if len(observation) * 4 <= budget or (
+            len(observation) <= budget and len(observation.encode("utf-8")) <= budget
+        ):
+            return observation, None
+        return preview(observation, budget), len(observation)
+    head, size = [], 0
+    for piece in _ENCODER.iterencode(observation):
+        if size < budget:
+            head.append(piece)
+        size += len(piece)
+    text = "".join(head)
+    if size <= budget and len(text.encode("utf-8")) <= budget:
+        return text, None
+    return preview(text, budget), size
+
+
+def iter_chunks(text: str, budget: int) -> Iterator[str]:
+    """Consecutive slices of `text`, each at most `budget` UTF-8 bytes."""
+    start = 0
+    while start < len(text):
+        chunk = preview(text[start:start + budget], budget)
+        if not chunk:
+            # a single character wider than the budget
+            chunk = text[start]
+        yield chunk
+        start += len(chunk)
+
+
+class _Stored:
+    def __init__(self, value, is_json: bool, size: int, ttl: float):
+        # the observation itself (a str, or a JSON value encoded only when fetched) or, loaded
+        # from the shared store, its text
+        self.value = value
+        self.is_json = is_json
+        self.size = size
+        self.expires = time.monotonic() + ttl
+
+    @property
+    def text(self) -> str:
+        return self.value if isinstance(self.value, str) else dumps(self.value).decode("utf-8")
+
+
+class ObservationStore:
+    """
+    Full tool observations that were too large for one SSE frame, fetchable by reference id.
+
+    An entry references the observation the agent produced rather than a copy of it; a JSON value
+    is only encoded when fetched. Entries expire after `ttl` seconds -- long enough for a client
+    to fetch what it was streamed -- unless a cached answer that references them `keep`s them
+    for its own lifetime. Beyond `max_bytes` (sizes counted in characters) the least recently
+    stored ones are dropped. With a `shared` store they are also written there, so a reference
+    can be fetched from any worker.
+    """
+
+    def __init__(self, ttl: float, max_bytes: int, shared: SharedStore | None = None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries: OrderedDict[str, _Stored] = OrderedDict()
+        self._bytes = 0
+        self.stored = 0
+        self.fetched = 0
+        self.evictions = 0
+
+    async def put(self, observation, size: int) -> str:
+        """Keep `observation` (`size` characters of text) and return its reference."""
+        self._expire()
+        ref = "obs_" + secrets.token_urlsafe(12)
+        is_json = not isinstance(observation, str)
+        entry = _Stored(observation, is_json, size, self.ttl)
+        self._entries[ref] = entry
+        self._bytes += entry.size
+        self.stored += 1
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        if self.shared is not None:
+            body = dumps(observation) if is_json else observation.encode("utf-8")
+            await self.shared.aput(_NS, ref, (b"j" if is_json else b"t") + body, self.ttl)
+        return ref
+
+    async def get(self, ref: str) -> _Stored | None:
+        entry = self._entries.get(ref)
+        if entry is not None and entry.expires <= time.monotonic():
+            self._remove(ref)
+            entry = None
+        if entry is None and self.shared is not None:
+            found = await self.shared.aget(_NS, ref)
+            if found is not None:
+                value, expires_in = found
+                entry = _Stored(value[1:].decode("utf-8"), value[:1] == b"j", len(value) - 1, expires_in)
+        return entry
+
+    async def fetch(self, ref: str) -> _Stored | None:
+        entry = await self.get(ref)
+        if entry is not None:
+            self.fetched += 1
+        return entry
+
+    async def keep(self, refs: list[str], ttl: float) -> bool:
+        """Keep `refs` for at least `ttl` more seconds; False if any of them is already gone."""
+        now = time.monotonic()
+        missing = []
+        for ref in refs:
+            entry = self._entries.get(ref)
+            if entry is not None and entry.expires > now:
+                entry.expires = max(entry.expires, now + ttl)
+            else:
+                missing.append(ref)
+        if self.shared is not None:
+            # the shared rows are what other workers fetch: extend them all
+            return await self.shared.atouch(_NS, refs, ttl) == len(refs)
+        return not missing
+
+    def _remove(self, ref: str):
+        self._bytes -= self._entries.pop(ref).size
+
+    def _expire(self):
+        now = time.monotonic()
+        for ref in [ref for ref, entry in self._entries.items() if entry.expires <= now]:
+            self._remove(ref)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl,
+            "stored": self.stored,
+            "fetched": self.fetched,
+            "evictions": self.evictions,
+        }
+
+
+observation_store = ObservationStore(
+    ttl=OBSERVATION_STORE_TTL,
+    max_bytes=OBSERVATION_STORE_MAX_BYTES,
+    shared=shared_store,
+)
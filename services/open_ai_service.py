@@ -1,78 +1,406 @@
+import asyncio
 import time
-from typing import Iterable
+from functools import partial
+from typing import AsyncIterator, Iterator
 
-from openai import OpenAI
+from services import (
+    HEARTBEAT_INTERVAL,
+    DISCONNECT_POLL_INTERVAL,
+    SSE_RETRY_MS,
+    SUMMARY_CHUNK_TOKENS,
+    SUMMARY_CONCURRENCY,
+)
+from services.admission import AdmissionRejected, llm_admission
+from services.answer_cache import answer_cache, summary_cache
+from services.documents import Document, DocumentError, iter_chunks, iter_text
+from services.metrics import metrics
+from services.recorder import record_timing
+from services.sessions import Session, sessions
+from services.single_flight import single_flight
+from services.upstreams import upstream_pool
+from utils.common import sse, with_heartbeat, normalize_question, coalesce_deltas
 
-from services import MODEL_NAME, API_KEY, BASE_URL
-from utils.common import sse, heartbeat
+SYSTEM_PROMPT = "You are a helpful assistant."
 
-client = OpenAI(
-    base_url=BASE_URL,
-    api_key=API_KEY,
+SUMMARY_SYSTEM_PROMPT = (
+    "You summarize documents. Keep names, figures, dates and conclusions; leave out repetition. "
+    "Write in the language of the document."
 )
 
+_END = object()
+
+
+async def _in_thread(iterator: Iterator):
+    """Iterate a blocking iterator (file reads, PDF parsing) without blocking the event loop."""
+    while True:
+        item = await asyncio.to_thread(next, iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+def _part_prompt(name: str, index: int, text: str) -> str:
+    return f'Part {index + 1} of the document "{name}":\n\n{text}\n\nSummarize the key points of this part.'
+
+
+def _combine_prompt(name: str, index: int, text: str) -> str:
+    return (f'Summaries of consecutive parts of the document "{name}":\n\n{text}\n\n'
+            "Combine them into one summary of the key points.")
+
+
+async def _iter_list(items: list):
+    for item in items:
+        yield item
+
+
+def _groups(summaries: list[str], max_chars: int) -> list[str]:
+    """Consecutive summaries joined into inputs of about `max_chars` (at least two per group)."""
+    groups, current = [], []
+    for summary in summaries:
+        if len(current) >= 2 and sum(len(s) for s in current) + len(summary) > max_chars:
+            groups.append("\n\n".join(current))
+            current = []
+        current.append(summary)
+    if len(current) == 1 and groups:
+        groups[-1] += "\n\n" + current[0]
+    elif current:
+        groups.append("\n\n".join(current))
+    return groups
+
 
 class OpenAIService:
     @staticmethod
-    def sumary_files():
-        response = client.responses.create(
-            model=MODEL_NAME,
-            input=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "input_text",
-                            "text": "Analyze the letter and provide a summary of the key points.",
-                        },
-                        {
-                            "type": "input_file",
-                            "file_url": "https://www.berkshirehathaway.com/letters/2024ltr.pdf",
-                        },
-                    ],
-                },
-            ],
-            stream=True
-        )
-        yield response.choices[0].message.content[0].text
+    async def ask_question_stream_response(
+        prompt: str,
+        coalesce: tuple[float, int] | None = None,
+        request=None,
+        last_event_id: str | None = None,
+        client_key: str = "",
+        session: Session | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Yields SSE lines from OpenAI Chat Completions streaming.
+        Event sequence: status* -> start -> (delta...)+ -> end  OR status* -> start -> error -> end
+        `start` follows once an upstream answered and names its `"model"` (null when none did).
+
+        Runs on the event loop (AsyncOpenAI), so concurrent streams are not bounded by the
+        threadpool. Heartbeats are timer driven and also cover a slow first token.
+        Identical in-flight questions share one upstream completion, and completed answers are
+        replayed from `answer_cache` with `"cached": true` on the start event.
+        `coalesce=(window_seconds, max_bytes)` merges consecutive deltas into fewer frames.
+        With `request`, a client disconnect cancels the upstream completion (once no other
+        subscriber shares it; the run is kept alive for SSE_RESUME_GRACE seconds first).
+        Every frame carries an `id:`; passing the last one seen as `last_event_id` resumes the
+        run and yields only the missing frames.
+        Completions go to the best healthy upstream of `upstream_pool`, with failover (and optional
+        hedging) until the first delta. Upstream runs go through `llm_admission`: while queued, `status` events report the
+        position; a full queue ends the stream with an `error` carrying `"code": 429`.
+        `client_key` (API key or client address) is the unit of fair queuing.
+        With a `session`, the question is answered after the conversation so far (see `_session_turn`).
+        """
+        key = ("ask", upstream_pool.model_name, SYSTEM_PROMPT, normalize_question(prompt))
+        events = single_flight.resume(last_event_id)
+        if events is None and session is not None:
+            session_key = ("ask", upstream_pool.model_name, SYSTEM_PROMPT, f"session:{session.id}", key[-1])
+            events = single_flight.subscribe(
+                session_key, lambda: OpenAIService._session_turn(session, prompt, key, client_key)
+            )
+        elif events is None:
+            cached = await answer_cache.get(key)
+            if cached is not None:
+                # the model comes with the stored start
+                start = ("start", {"id": OpenAIService._response_id(), "created": int(time.time()), "cached": True})
+                events = single_flight.subscribe(key, lambda: answer_cache.replay(start, cached), share=False)
+            else:
+                events = single_flight.subscribe(
+                    key, lambda: answer_cache.record(key, OpenAIService._completion_events(prompt, client_key))
+                )
+        events = metrics.observe_stream("ask", events, {"delta"})
+        if coalesce:
+            events = coalesce_deltas(events, *coalesce)
+        frames = (sse(event, data, id=event_id, retry=SSE_RETRY_MS) async for event_id, event, data in events)
+        async for frame in with_heartbeat(frames, HEARTBEAT_INTERVAL, request, DISCONNECT_POLL_INTERVAL):
+            yield frame
 
     @staticmethod
-    def ask_question_stream_response(prompt: str) -> Iterable[str]:
+    async def sumary_files(
+        document: Document,
+        request=None,
+        last_event_id: str | None = None,
+        client_key: str = "",
+    ) -> AsyncIterator[bytes]:
         """
-        Yields SSE lines from OpenAI Chat Completions streaming.
-        Event sequence: start -> (delta...)+ -> end  OR start -> error -> end
+        Summarizes an uploaded document (map-reduce) as SSE frames.
+        Event sequence: start -> (status | partial)* -> summary -> end  OR ... -> error -> end
+
+        The text is extracted and cut into chunks of about SUMMARY_CHUNK_TOKENS in one streaming
+        pass, and each chunk is summarized as soon as it is cut, at most SUMMARY_CONCURRENCY at a
+        time (`partial` with `"level": 0`, in completion order). The partial summaries are then
+        combined group by group, level after level, until one is left (`summary`). `status` events
+        report the stage and progress. Every completion is admitted through `llm_admission`.
+        Finished summaries are cached by the document's SHA-256, so a re-upload is replayed at once
+        with `"cached": true` on the start event; identical uploads in flight share one run, and
+        `last_event_id` resumes a dropped stream, as for questions.
         """
-        rid = f"resp_{int(time.time() * 1000)}"
+        key = ("summary", upstream_pool.model_name, document.sha256)
+        # the run this request starts (if any) owns the upload and closes it when done
+        handed_over = False
 
-        # 1) start
-        yield sse("start", {"id": rid, "model": MODEL_NAME, "created": int(time.time())})
+        def summarize():
+            nonlocal handed_over
+            handed_over = True
+            return summary_cache.record(key, OpenAIService._summary_events(document, client_key))
 
-        last_heartbeat = time.time()
+        events = single_flight.resume(last_event_id)
+        if events is None:
+            cached = await summary_cache.get(key)
+            if cached is not None:
+                start = ("start", {"id": OpenAIService._response_id(), "created": int(time.time()),
+                                   "document": OpenAIService._describe(document), "cached": True})
+                events = single_flight.subscribe(key, lambda: summary_cache.replay(start, cached), share=False)
+            else:
+                events = single_flight.subscribe(key, summarize)
+        events = metrics.observe_stream("summary", events, {"partial", "summary"})
+        frames = (sse(event, data, id=event_id, retry=SSE_RETRY_MS) async for event_id, event, data in events)
         try:
-            stream = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt},
-                ],
-                stream=True,
-            )
+            async for frame in with_heartbeat(frames, HEARTBEAT_INTERVAL, request, DISCONNECT_POLL_INTERVAL):
+                yield frame
+        finally:
+            if not handed_over:
+                # resumed, replayed from the cache or joined an identical upload in flight
+                document.close()
+
+    @staticmethod
+    def _describe(document: Document) -> dict:
+        return {"name": document.name, "bytes": document.size, "sha256": document.sha256}
+
+    @staticmethod
+    async def _summary_events(document: Document, client_key: str = "") -> AsyncIterator[tuple[str, dict]]:
+        # chunk summaries may go to any upstream of the pool: name its models
+        yield "start", {"id": OpenAIService._response_id(), "model": upstream_pool.model_name,
+                        "created": int(time.time()), "document": OpenAIService._describe(document)}
+        max_chars = SUMMARY_CHUNK_TOKENS * 4
+        try:
+            # map: chunks are summarized while the rest of the document is still being read
+            yield "status", {"message": "summarizing", "level": 0, "done": 0, "total": None}
+            chunks = _in_thread(iter_chunks(iter_text(document), max_chars))
+            partials: dict[int, str] = {}
+            prompt = partial(_part_prompt, document.name)
+            async for index, summary, total in OpenAIService._summarize_all(chunks, prompt, client_key):
+                partials[index] = summary
+                yield "partial", {"level": 0, "index": index, "summary": summary}
+                yield "status", {"message": "summarizing", "level": 0, "done": len(partials), "total": total}
+            if not partials:
+                raise DocumentError("No text found in the document", code=422)
+
+            # reduce: combine consecutive summaries until one is left
+            summaries = [partials[i] for i in range(len(partials))]
+            level = 0
+            while len(summaries) > 1:
+                level += 1
+                groups = _groups(summaries, max_chars)
+                yield "status", {"message": "combining", "level": level, "done": 0, "total": len(groups)}
+                combined: dict[int, str] = {}
+                prompt = partial(_combine_prompt, document.name)
+                async for index, summary, total in OpenAIService._summarize_all(
+                    _iter_list(groups), prompt, client_key, total=len(groups)
+                ):
+                    combined[index] = summary
+                    if total > 1:
+                        yield "partial", {"level": level, "index": index, "summary": summary}
+                    yield "status", {"message": "combining", "level": level, "done": len(combined), "total": total}
+                summaries = [combined[i] for i in range(len(combined))]
+
+            yield "summary", {"text": summaries[0], "chunks": len(partials), "levels": level}
+            yield "end", {"finish_reason": "stop"}
+
+        except AdmissionRejected as e:
+            yield "error", {"message": str(e), "code": 429, "retry_after": e.retry_after}
+            yield "end", {"finish_reason": "rejected"}
+        except DocumentError as e:
+            yield "error", {"message": str(e), "code": e.code}
+            yield "end", {"finish_reason": "error"}
+        except Exception as e:
+            metrics.upstream_errors.inc("summary", type(e).__name__)
+            yield "error", {"message": str(e)}
+            yield "end", {"finish_reason": "error"}
+        finally:
+            document.close()
+
+    @staticmethod
+    async def _summarize_all(texts, prompt, client_key: str, total: int | None = None):
+        """
+        Summarize `texts` (an async iterator) at most SUMMARY_CONCURRENCY at a time; the next text
+        is only pulled once a slot is free. Yields (index, summary, total) in completion order,
+        `total` being None while texts are still coming unless the caller knows it up front.
+        """
+        slots = asyncio.Semaphore(max(1, SUMMARY_CONCURRENCY))
+        results: asyncio.Queue = asyncio.Queue()
+        tasks: list[asyncio.Task] = []
+
+        async def summarize(index: int, text: str):
+            try:
+                await results.put((index, await OpenAIService._summarize(prompt(index, text), client_key)))
+            except Exception as e:
+                await results.put(e)
+            finally:
+                slots.release()
+
+        async def feed():
+            nonlocal total
+            count = 0
+            try:
+                async for text in texts:
+                    await slots.acquire()
+                    tasks.append(asyncio.create_task(summarize(count, text)))
+                    count += 1
+            except Exception as e:
+                await results.put(e)
+            total = count
+            await results.put(None)
+
+        feeder = asyncio.create_task(feed())
+        done = 0
+        try:
+            while total is None or done < total:
+                item = await results.get()
+                if isinstance(item, Exception):
+                    raise item
+                if item is None:
+                    continue
+                done += 1
+                yield item[0], item[1], total
+        finally:
+            feeder.cancel()
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    async def _summarize(content: str, client_key: str) -> str:
+        ticket = llm_admission.enqueue(client_key)
+        try:
+            async for _ in ticket.positions():
+                pass
+            text = await upstream_pool.complete([
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": content},
+            ])
+            return text.strip()
+        finally:
+            ticket.release()
+
+    @staticmethod
+    def _response_id() -> str:
+        return f"resp_{int(time.time() * 1000)}"
+
+    @staticmethod
+    async def _session_turn(
+        session: Session, prompt: str, key: tuple, client_key: str
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """
+        One turn of a conversation, run after the session's previous turn has finished. The prompt
+        is the fixed system message, then the history, then the new question, so consecutive turns
+        share a growing prefix that upstream prompt caching can reuse. A completed answer is
+        recorded in the session; only the opening turn (no history yet) uses `answer_cache`.
+        """
+        async with sessions.turn(session):
+            if session.empty:
+                cached = await answer_cache.get(key)
+                if cached is not None:
+                    start = ("start", {"id": OpenAIService._response_id(), "created": int(time.time()),
+                                       "cached": True, "session": session.id})
+                    events = answer_cache.replay(start, cached)
+                else:
+                    events = answer_cache.record(
+                        key, OpenAIService._completion_events(prompt, client_key, session_id=session.id)
+                    )
+            else:
+                events = OpenAIService._completion_events(prompt, client_key, session.history(), session.id)
+
+            answer = []
+            finish_reason = None
+            async for event, data in events:
+                if event == "delta":
+                    answer.append(data["content"])
+                elif event == "end":
+                    finish_reason = data.get("finish_reason")
+                yield event, data
+            if finish_reason == "stop":
+                await sessions.append(session, prompt, "".join(answer))
+
+    @staticmethod
+    async def _completion_events(
+        prompt: str,
+        client_key: str = "",
+        history: list[tuple[str, str]] = (),
+        session_id: str | None = None,
+    ) -> AsyncIterator[tuple[str, dict]]:
+        rid = OpenAIService._response_id()
+
+        # 1) start, once an upstream answered: it names that upstream's model
+        start = {"id": rid, "model": None, "created": int(time.time())}
+        if session_id is not None:
+            start["session"] = session_id
+        announced = False
+
+        try:
+            ticket = llm_admission.enqueue(client_key)
+        except AdmissionRejected as e:
+            yield "start", start
+            yield "error", {"message": str(e), "code": 429, "retry_after": e.retry_after}
+            yield "end", {"finish_reason": "rejected"}
+            return
+
+        try:
+            # wait for an upstream slot; every subscriber sees the queue position
+            queued_at = time.perf_counter()
+            async for position in ticket.positions():
+                yield "status", {"message": "queued", "position": position}
+            record_timing("admission_wait", time.perf_counter() - queued_at)
+
+            # picks a healthy upstream, fails over / hedges until the first delta arrives
+            started_at = time.perf_counter()
+            # stable part first (system, earlier turns), the new question last
+            started = await upstream_pool.start_completion([
+                {"role": "system", "content": SYSTEM_PROMPT},
+                *({"role": role, "content": content} for role, content in history),
+                {"role": "user", "content": prompt},
+            ])
+            record_timing("upstream_ttft", time.perf_counter() - started_at, upstream=started.upstream.name)
+            start["model"] = started.upstream.model
+            announced = True
+            yield "start", start
 
-            for chunk in stream:
-                # delta text lives here (may be None)
-                delta = getattr(chunk.choices[0].delta, "content", None)
-                if delta:
-                    yield sse("delta", {"index": 0, "content": delta})
+            deltas = 0
+            first_delta_at = time.perf_counter()
+            # closing the stream releases the upstream connection, also on cancellation
+            async with started.stream:
+                if started.first_delta:
+                    deltas += 1
+                    yield "delta", {"index": 0, "content": started.first_delta}
+                async for chunk in started.chunks:
+                    if not chunk.choices:
+                        continue
+                    # delta text lives here (may be None)
+                    delta = getattr(chunk.choices[0].delta, "content", None)
+                    if delta:
+                        deltas += 1
+                        yield "delta", {"index": 0, "content": delta}
 
-                # heartbeat every 15s to keep proxies happy
-                if time.time() - last_heartbeat > 15:
-                    yield heartbeat()
-                    last_heartbeat = time.time()
+            elapsed = time.perf_counter() - first_delta_at
+            record_timing("upstream_stream", elapsed, upstream=started.upstream.name, deltas=deltas)
+            if deltas > 1 and elapsed > 0:
+                metrics.tokens_per_second.observe((deltas - 1) / elapsed, "ask")
 
             # 3) end
-            yield sse("end", {"finish_reason": "stop"})
+            yield "end", {"finish_reason": "stop"}
 
         except Exception as e:
             # 2) error -> end
-            yield sse("error", {"message": str(e)})
-            yield sse("end", {"finish_reason": "error"})
+            metrics.upstream_errors.inc("ask", type(e).__name__)
+            if not announced:
+                yield "start", start
+            yield "error", {"message": str(e)}
+            yield "end", {"finish_reason": "error"}
+        finally:
+            ticket.release()
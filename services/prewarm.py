@@ -0,0 +1,70 @@
+import asyncio
+import importlib
+import time
+
+from services.mcp_pool import mcp_pool
+from services.mcp_use import warm_llms
+from services.upstreams import upstream_pool
+
+# imported lazily by the request paths; together they are most of a cold start
+HEAVY_MODULES = ("openai", "langchain_openai", "mcp_use", "mcp_use.adapters.langchain_adapter", "pypdf")
+
+
+def _import_heavy():
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+
+class Prewarm:
+    """
+    Background warm-up started from the FastAPI lifespan, after which the first requests no longer
+    pay for library imports, client construction or the MCP handshake.
+
+    Imports run in a worker thread so the event loop keeps answering (e.g. /healthz) meanwhile; a
+    request that needs a module still being imported simply waits for that import. Failures are
+    recorded, not raised: everything falls back to being loaded on first use.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self.stages: dict[str, float] = {}
+        self.error: str | None = None
+        self.done = False
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _stage(self, name: str, awaitable):
+        t0 = time.perf_counter()
+        await awaitable
+        self.stages[name] = round(time.perf_counter() - t0, 3)
+
+    async def _run(self):
+        async def clients():
+            for upstream in upstream_pool.upstreams:
+                upstream.client
+            warm_llms()
+
+        try:
+            await self._stage("imports", asyncio.to_thread(_import_heavy))
+            await self._stage("clients", clients())
+            await self._stage("mcp_pool", mcp_pool.start())
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.done = True
+
+    def stats(self) -> dict:
+        return {"started": self._task is not None, "done": self.done, "stages_s": self.stages, "error": self.error}
+
+
+prewarm = Prewarm()
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from starlette.requests import Request
+
+from services import (
+    RECORD_SAMPLE_RATE,
+    RECORD_PATH,
+    RECORD_PATHS,
+    RECORD_MAX_BYTES,
+    RECORD_BACKUPS,
+    RECORD_QUEUE_SIZE,
+    RECORD_MAX_BODY_BYTES,
+)
+from utils.common import client_key
+
+# upstream timings of the request being recorded (a list shared with the tasks it spawns)
+_timings: ContextVar[list | None] = ContextVar("recorded_timings", default=None)
+
+_STOP = object()
+
+
+def record_timing(name: str, seconds: float, **labels):
+    """Attach an upstream timing (TTFT, tool call, admission wait, ...) to the recorded request, if any."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.append({"name": name, "s": round(seconds, 4), **labels})
+
+
+class TrafficRecorder:
+    """
+    Appends sampled requests, with their full response timeline, to a JSONL file.
+
+    One line per request: arrival time, method, path, query, body, a few replay-relevant headers,
+    an anonymized client id, status, every response chunk (SSE frames) with its offset from arrival,
+    upstream timings reported through `record_timing`, and whether the client disconnected.
+    Lines are serialized and written by a background thread; when its queue is full records are
+    dropped (and counted) rather than slowing requests down. The file is rotated at `max_bytes`,
+    keeping `backups` older files (`path.1` is the most recent).
+    """
+
+    def __init__(self, path: str, sample_rate: float, paths: list[str], max_bytes: int, backups: int,
+                 queue_size: int, max_body_bytes: int):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.paths = paths
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_body_bytes = max_body_bytes
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: threading.Thread | None = None
+        self.recorded = 0
+        self.dropped = 0
+        self.rotations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def sampled(self, path: str) -> bool:
+        return self.enabled and path.startswith(tuple(self.paths)) and random.random() < self.sample_rate
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._write_loop, name="traffic-recorder", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Write what is queued, then stop the writer."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def submit(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # unbuffered O_APPEND: each line is one write(), so workers sharing the file don't interleave
+        f = open(self.path, "ab", buffering=0)
+        try:
+            while True:
+                record = self._queue.get()
+                if record is _STOP:
+                    break
+                line = json.dumps(record, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+                try:
+                    current = os.stat(self.path)
+                except FileNotFoundError:
+                    current = None
+                if current is None or current.st_ino != os.fstat(f.fileno()).st_ino:
+                    # rotated by another worker
+                    f.close()
+                    f = open(self.path, "ab", buffering=0)
+                elif self.max_bytes and current.st_size and current.st_size + len(line) > self.max_bytes:
+                    f.close()
+                    self._rotate()
+                    f = open(self.path, "ab", buffering=0)
+                f.write(line)
+                self.recorded += 1
+        finally:
+            f.close()
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "recorded": self.recorded,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+        }
+
+
+class RecorderMiddleware:
+    """ASGI middleware feeding sampled HTTP requests and their responses to a `TrafficRecorder`."""
+
+    def __init__(self, app, recorder: TrafficRecorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.recorder.sampled(scope["path"]):
+            return await self.app(scope, receive, send)
+
+        request = Request(scope)
+        headers = request.headers
+        t0 = time.perf_counter()
+        body = bytearray()
+        frames = []
+        timings = []
+        record = {
+            "ts": round(time.time(), 4),
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope["query_string"].decode("latin-1"),
+            "headers": {k: headers[k] for k in ("content-type", "last-event-id") if k in headers},
+            # stable per client, so a replay can reproduce per-client fairness without the real key
+            "client": hashlib.sha256(client_key(request).encode("utf-8")).hexdigest()[:12],
+            "status": None,
+            "disconnected": False,
+        }
+        complete = False
+
+        async def recording_receive():
+            message = await receive()
+            if message["type"] == "http.request" and len(body) < self.recorder.max_body_bytes:
+                body.extend(message.get("body", b"")[:self.recorder.max_body_bytes - len(body)])
+            elif message["type"] == "http.disconnect" and not complete:
+                record["disconnected"] = True
+            return message
+
+        async def recording_send(message):
+            nonlocal complete
+            if message["type"] == "http.response.start":
+                record["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                if message.get("body"):
+                    offset = round(time.perf_counter() - t0, 4)
+                    frames.append([offset, message["body"].decode("utf-8", errors="replace")])
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        token = _timings.set(timings)
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        except BaseException:
+            record["disconnected"] = record["disconnected"] or not complete
+            raise
+        finally:
+            _timings.reset(token)
+            record.update(
+                body=body.decode("utf-8", errors="replace"),
+                duration=round(time.perf_counter() - t0, 4),
+                frames=frames,
+                timings=timings,
+            )
+            self.recorder.submit(record)
+
+
+recorder = TrafficRecorder(
+    path=RECORD_PATH,
+    sample_rate=RECORD_SAMPLE_RATE,
+    paths=[p.strip() for p in RECORD_PATHS.split(",") if p.strip()],
+    max_bytes=RECORD_MAX_BYTES,
+    backups=RECORD_BACKUPS,
+    queue_size=RECORD_QUEUE_SIZE,
+    max_body_bytes=RECORD_MAX_BODY_BYTES,
+)
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import secrets
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from services import (
+    SESSION_IDLE_TTL,
+    SESSION_MAX,
+    SESSION_HISTORY_TOKENS,
+    SESSION_SUMMARIZE,
+    SESSION_TURN_LEASE,
+)
+from services.admission import llm_admission
+from services.shared_store import SharedStore, shared_store
+from services.upstreams import upstream_pool
+from utils.sse import dumps
+
+_NS = "sessions"
+# leases on sessions whose turn a worker is running
+_NS_TURNS = "session_turns"
+# how often a worker waiting for another worker's turn of the same session checks the lease
+_TURN_POLL = 0.1
+
+# over budget, history is cut down to this share of it at once: the prompt prefix then stays the
+# same (and cacheable upstream) for the next several turns instead of shifting every turn
+_COMPACT_TO = 0.5
+
+_SUMMARY_INTRO = "Summary of our conversation so far:"
+_SUMMARY_PROMPT = (
+    "You maintain the running summary of a conversation between a user and an assistant. Merge the "
+    "summary so far (if any) with the new exchanges into one concise summary that keeps names, facts, "
+    "decisions and open questions. Answer with the summary only, in the language of the conversation."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 UTF-8 bytes per token), good enough for budgeting history."""
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text.encode("utf-8")[:max_tokens * 4].decode("utf-8", errors="ignore") + "…"
+
+
+class Session:
+    """One conversation: an optional running summary plus the (question, answer, tokens) turns after it."""
+
+    __slots__ = ("id", "summary", "turns", "tokens", "version", "last_used", "lock", "summarizing")
+
+    def __init__(self, id: str, summary: str = "", turns: list[tuple[str, str, int]] | None = None,
+                 version: int = 0):
+        self.id = id
+        self.summary = summary
+        self.turns = turns or []
+        self.tokens = estimate_tokens(summary) + sum(t[2] for t in self.turns)
+        # bumped on every save; a shared copy with a higher one is newer than this one
+        self.version = version
+        self.last_used = time.monotonic()
+        # turns of one session run one after the other, each seeing the previous one
+        self.lock = asyncio.Lock()
+        self.summarizing = False
+
+    @property
+    def empty(self) -> bool:
+        return not self.turns and not self.summary
+
+    def history(self) -> list[tuple[str, str]]:
+        """
+        (role, content) messages of the conversation so far, oldest first. Turns only ever leave
+        from the front, in batches, so consecutive prompts share everything before the new turn.
+        """
+        messages = []
+        if self.summary:
+            messages += [("user", f"{_SUMMARY_INTRO}\n{self.summary}"), ("assistant", "OK.")]
+        for question, answer, _ in self.turns:
+            messages += [("user", question), ("assistant", answer)]
+        return messages
+
+    def _drop(self, count: int):
+        del self.turns[:count]
+        self.tokens = estimate_tokens(self.summary) + sum(t[2] for t in self.turns)
+
+    def _load(self, other: "Session"):
+        self.summary, self.turns, self.tokens, self.version = other.summary, other.turns, other.tokens, other.version
+
+
+class SessionStore:
+    """
+    In-memory conversation sessions, so clients send only the new question of each turn.
+
+    Sessions idle for `idle_ttl` seconds expire, and beyond `max_sessions` the least recently used
+    are evicted. The history of a session is kept under `history_tokens` (estimated): once a turn
+    pushes it over, the oldest turns are removed down to half the budget, or with `summarize` first
+    folded into a running summary by a background completion (admitted like any other upstream
+    run; on failure they are simply dropped). With a `shared` store, sessions are also written
+    there, versioned, and the shared copy is authoritative: a session is (re)loaded from it when
+    it is newer than the local one, so every worker can continue any conversation, and turns of a
+    session run one at a time across workers (see `turn`).
+    """
+
+    def __init__(self, idle_ttl: float, max_sessions: int, history_tokens: int, summarize: bool,
+                 shared: SharedStore | None = None, turn_lease: float = 300.0):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max(1, max_sessions)
+        self.history_tokens = max(1, history_tokens)
+        self.summarize = summarize
+        self.shared = shared
+        self.turn_lease = turn_lease
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.shared_hits = 0
+        self.shared_reloads = 0
+        self.turn_waits = 0
+        self.compactions = 0
+        self.summaries = 0
+        self.summary_errors = 0
+
+    async def create(self) -> Session:
+        self._expire()
+        session = Session(secrets.token_urlsafe(16))
+        self._insert(session)
+        await self._save(session)
+        self.created += 1
+        return session
+
+    async def get(self, session_id: str) -> Session | None:
+        self._expire()
+        session = self._sessions.get(session_id)
+        if self.shared is not None:
+            shared = await self._get_shared(session_id)
+            if shared is None:
+                # deleted or expired by another worker: the local copy is stale too
+                if session is not None:
+                    del self._sessions[session_id]
+                return None
+            if session is None:
+                session = shared
+                self._insert(session)
+                self.shared_hits += 1
+            elif shared.version > session.version:
+                session._load(shared)
+                self.shared_reloads += 1
+        if session is None:
+            return None
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def delete(self, session_id: str) -> bool:
+        deleted = self._sessions.pop(session_id, None) is not None
+        if self.shared is not None:
+            deleted = await self.shared.adelete(_NS, [session_id]) > 0 or deleted
+        return deleted
+
+    @asynccontextmanager
+    async def turn(self, session: Session):
+        """
+        Hold `session` for one turn: turns run one after the other, each seeing the previous one.
+        Within the process that is the session's lock; with a shared store also a lease on the
+        session across workers, after which the session is brought up to date with the shared copy.
+        """
+        async with session.lock:
+            if self.shared is None:
+                yield session
+                return
+            waited = False
+            while not await self.shared.aacquire(_NS_TURNS, session.id, self.turn_lease):
+                # another worker is running a turn of it (the lease expires if that worker died)
+                waited = True
+                await asyncio.sleep(_TURN_POLL)
+            self.turn_waits += waited
+            try:
+                shared = await self._get_shared(session.id)
+                if shared is not None and shared.version > session.version:
+                    session._load(shared)
+                    self.shared_reloads += 1
+                yield session
+            finally:
+                await self.shared.arelease(_NS_TURNS, session.id)
+
+    async def append(self, session: Session, question: str, answer: str):
+        """Record a completed turn, compacting the history when it goes over budget."""
+        question = _clip(question, self.history_tokens // 2)
+        answer = _clip(answer, self.history_tokens // 2)
+        tokens = estimate_tokens(question) + estimate_tokens(answer)
+        session.turns.append((question, answer, tokens))
+        session.tokens += tokens
+        session.last_used = time.monotonic()
+        if session.tokens > self.history_tokens and not session.summarizing:
+            self._compact(session)
+        await self._save(session)
+
+    def _compact(self, session: Session):
+        target = self.history_tokens * _COMPACT_TO
+        count, tokens = 0, session.tokens
+        while count < len(session.turns) and tokens > target:
+            tokens -= session.turns[count][2]
+            count += 1
+        self.compactions += 1
+        if not self.summarize:
+            session._drop(count)
+            return
+        # the history stays over budget for the turn or two the summary takes
+        session.summarizing = True
+        task = asyncio.create_task(self._fold(session, count))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, session: Session, count: int):
+        """Replace the oldest `count` turns by an updated summary."""
+        folded = session.turns[:count]
+        try:
+            summary = await self._write_summary(session.summary, folded)
+        except Exception:
+            summary = None
+            self.summary_errors += 1
+        # applied like a turn, so it neither overwrites nor is overwritten by one on another worker
+        async with self.turn(session):
+            session.summarizing = False
+            if session.turns[:count] != folded:
+                return  # another worker compacted the session meanwhile
+            if summary is not None:
+                session.summary = _clip(summary, self.history_tokens // 4)
+                self.summaries += 1
+            session._drop(count)
+            if self._sessions.get(session.id) is session:
+                await self._save(session)
+
+    async def _write_summary(self, summary: str, turns: list[tuple[str, str, int]]) -> str:
+        ticket = llm_admission.enqueue("sessions")
+        try:
+            async for _ in ticket.positions():
+                pass
+            conversation = "\n\n".join(f"User: {q}\nAssistant: {a}" for q, a, _ in turns)
+            so_far = f"Summary so far:\n{summary}\n\n" if summary else ""
+            text = await upstream_pool.complete(
+                [
+                    {"role": "system", "content": _SUMMARY_PROMPT},
+                    {"role": "user", "content": f"{so_far}New exchanges:\n{conversation}"},
+                ],
+                max_tokens=max(64, self.history_tokens // 4),
+            )
+            return text.strip()
+        finally:
+            ticket.release()
+
+    def _insert(self, session: Session):
+        self._sessions[session.id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used < self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    async def _save(self, session: Session):
+        session.version += 1
+        if self.shared is not None:
+            value = {
+                "version": session.version,
+                "summary": session.summary,
+                "turns": [[q, a] for q, a, _ in session.turns],
+            }
+            await self.shared.aput(_NS, session.id, dumps(value), self.idle_ttl)
+
+    async def _get_shared(self, session_id: str) -> Session | None:
+        """The shared copy of a session, not inserted locally."""
+        found = await self.shared.aget(_NS, session_id)
+        if found is None:
+            return None
+        value = json.loads(found[0])
+        turns = [(q, a, estimate_tokens(q) + estimate_tokens(a)) for q, a in value["turns"]]
+        return Session(session_id, value["summary"], turns, value.get("version", 0))
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "turns": sum(len(s.turns) for s in self._sessions.values()),
+            "tokens": sum(s.tokens for s in self._sessions.values()),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_s": self.idle_ttl,
+            "history_tokens": self.history_tokens,
+            "summarize": self.summarize,
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "shared_hits": self.shared_hits,
+            "shared_reloads": self.shared_reloads,
+            "turn_waits": self.turn_waits,
+            "compactions": self.compactions,
+            "summaries": self.summaries,
+            "summary_errors": self.summary_errors,
+        }
+
+
+sessions = SessionStore(
+    idle_ttl=SESSION_IDLE_TTL,
+    max_sessions=SESSION_MAX,
+    history_tokens=SESSION_HISTORY_TOKENS,
+    summarize=SESSION_SUMMARIZE,
+    shared=shared_store,
+    turn_lease=SESSION_TURN_LEASE,
+)
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services import SHARED_STORE, SHARED_STORE_MAX_BYTES
+
+# expired rows are swept (and the size bound enforced) every this many writes
+_PRUNE_EVERY = 256
+
+
+def shared_key(key) -> str:
+    """Stable text form of a cache key (tuples of str/int/...), identical in every worker."""
+    return json.dumps(key, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class SharedStore:
+    """
+    Key/value store in one SQLite file (WAL mode) that every worker process on the host opens, so
+    entries written by one uvicorn worker serve requests arriving at the others.
+
+    Values are bytes grouped by namespace, each with its own expiry; beyond `max_bytes` the oldest
+    entries are dropped. Leases (`acquire`/`release`) let one worker claim a piece of work, such as
+    a tool call, that the other workers then wait for instead of repeating it.
+
+    SQLite calls block (a write waits up to 5 s for another worker's lock, values can be megabytes),
+    so request handlers (the admin endpoints included) use the `a*` forms, which run them on the
+    store's own thread; the plain methods are what those forms run.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # one connection, used under one lock: a single thread is all the store can keep busy
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-store")
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, expires REAL NOT NULL, PRIMARY KEY (ns, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases (ns TEXT NOT NULL, key TEXT NOT NULL, expires REAL NOT NULL,"
+            " PRIMARY KEY (ns, key))"
+        )
+
+    @classmethod
+    def from_url(cls, url: str, max_bytes: int) -> "SharedStore | None":
+        """`""` -> None (caches stay per process); `sqlite:///abs/path.db` or `sqlite://rel.db`."""
+        if not url:
+            return None
+        if not url.startswith("sqlite:"):
+            raise ValueError(f"unsupported SHARED_STORE {url!r} (expected sqlite:///path/to/file.db)")
+        path = url[len("sqlite:"):]
+        return cls(path[2:] if path.startswith("//") else path, max_bytes)
+
+    def get(self, ns: str, key: str) -> tuple[bytes, float] | None:
+        """(value, seconds until it expires), or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM entries WHERE ns = ? AND key = ? AND expires > ?", (ns, key, now)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], row[1] - now
+
+    def put(self, ns: str, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (ns, key, value, size, created, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                (ns, key, value, len(value), now, now + ttl),
+            )
+            self.writes += 1
+            if self.writes % _PRUNE_EVERY == 0:
+                self._prune(now)
+
+    def delete(self, ns: str, keys: list[str] | None = None) -> int:
+        """Delete `keys` of the namespace, or the whole namespace."""
+        with self._lock:
+            if keys is None:
+                return self._conn.execute("DELETE FROM entries WHERE ns = ?", (ns,)).rowcount
+            return sum(
+                self._conn.execute("DELETE FROM entries WHERE ns = ? AND key = ?", (ns, key)).rowcount
+                for key in keys
+            )
+
+    def touch(self, ns: str, keys: list[str], ttl: float) -> int:
+        """Let unexpired `keys` live at least `ttl` more seconds; how many of them were found."""
+        now = time.time()
+        with self._lock:
+            return sum(
+                self._conn.execute(
+                    "UPDATE entries SET expires = MAX(expires, ?) WHERE ns = ? AND key = ? AND expires > ?",
+                    (now + ttl, ns, key, now),
+                ).rowcount
+                for key in keys
+            )
+
+    def keys(self, ns: str) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT key FROM entries WHERE ns = ?", (ns,))]
+
+    def acquire(self, ns: str, key: str, ttl: float) -> bool:
+        """Claim `key` for `ttl` seconds; False while another process holds an unexpired lease."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM leases WHERE ns = ? AND key = ? AND expires <= ?", (ns, key, now))
+                claimed = self._conn.execute(
+                    "INSERT OR IGNORE INTO leases (ns, key, expires) VALUES (?, ?, ?)", (ns, key, now + ttl)
+                ).rowcount
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return bool(claimed)
+
+    def release(self, ns: str, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE ns = ? AND key = ?", (ns, key))
+
+    def held(self, ns: str, key: str) -> bool:
+        """Whether some process holds an unexpired lease on `key` (a read: no write lock taken)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM leases WHERE ns = ? AND key = ? AND expires > ?", (ns, key, time.time())
+            ).fetchone()
+        return row is not None
+
+    async def _off_loop(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, method, *args)
+
+    async def aget(self, ns: str, key: str) -> tuple[bytes, float] | None:
+        return await self._off_loop(self.get, ns, key)
+
+    async def aput(self, ns: str, key: str, value: bytes, ttl: float):
+        await self._off_loop(self.put, ns, key, value, ttl)
+
+    async def adelete(self, ns: str, keys: list[str] | None = None) -> int:
+        return await self._off_loop(self.delete, ns, keys)
+
+    async def akeys(self, ns: str) -> list[str]:
+        return await self._off_loop(self.keys, ns)
+
+    async def atouch(self, ns: str, keys: list[str], ttl: float) -> int:
+        return await self._off_loop(self.touch, ns, keys, ttl)
+
+    async def aacquire(self, ns: str, key: str, ttl: float) -> bool:
+        return await self._off_loop(self.acquire, ns, key, ttl)
+
+    async def arelease(self, ns: str, key: str):
+        await self._off_loop(self.release, ns, key)
+
+    async def aheld(self, ns: str, key: str) -> bool:
+        return await self._off_loop(self.held, ns, key)
+
+    def _prune(self, now: float):
+        self._conn.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+        self._conn.execute("DELETE FROM leases WHERE expires <= ?", (now,))
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        while total > self.max_bytes:
+            rows = self._conn.execute("SELECT ns, key, size FROM entries ORDER BY created LIMIT 64").fetchall()
+            if not rows:
+                break
+            for ns, key, size in rows:
+                self._conn.execute("DELETE FROM entries WHERE ns = ? AND key = ?", (ns, key))
+                total -= size
+                self.evictions += 1
+
+    async def astats(self) -> dict:
+        return await self._off_loop(self.stats)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+
+shared_store = SharedStore.from_url(SHARED_STORE, SHARED_STORE_MAX_BYTES)
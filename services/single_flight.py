@@ -0,0 +1,185 @@
+import asyncio
+import secrets
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable
+
+from services import (
+    SINGLE_FLIGHT_ENABLED,
+    SSE_REPLAY_BUFFER_EVENTS,
+    SSE_REPLAY_TTL,
+    SSE_RESUME_GRACE,
+)
+from services.cancellation_stats import cancellation_stats
+
+
+class _Flight:
+    """
+    One upstream run plus a ring buffer of the (event, data) pairs it emitted.
+
+    Events are numbered from 0; `base_seq` is the number of the oldest event still buffered.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.run_id = secrets.token_urlsafe(9)
+        self.events: deque = deque(maxlen=buffer_size)
+        self.base_seq = 0
+        self.next_seq = 0
+        self.done = False
+        self.finished_at = 0.0
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self.cancel_handle: asyncio.TimerHandle | None = None
+        self.tokens = 0
+        self.tool_calls = 0
+        self._wakeup = asyncio.Event()
+
+    def publish(self, event: tuple):
+        if len(self.events) == self.events.maxlen:
+            self.base_seq += 1
+        self.events.append(event)
+        self.next_seq += 1
+        if event[0] == "delta":
+            self.tokens += 1
+        elif event[0] == "step":
+            self.tool_calls += 1
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def _notify(self):
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    async def wait(self):
+        await self._wakeup.wait()
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight requests onto one upstream run, and lets dropped clients resume.
+
+    The first subscriber for a key starts `factory()` in a background task; later subscribers for
+    the same key get the events emitted so far replayed, then the live tail. Once the run finishes
+    the key is released, so the next request starts a fresh run.
+
+    Every event is yielded as (event_id, event, data) with `event_id = "<run_id>:<seq>"`. Runs stay
+    addressable by run id for `replay_ttl` seconds after they finish, so a reconnect carrying
+    `Last-Event-ID` gets only the missing events (`resume`). When the last subscriber goes away the
+    run is cancelled after `resume_grace` seconds unless someone reattaches.
+    """
+
+    def __init__(self, enabled: bool, buffer_size: int, replay_ttl: float, resume_grace: float):
+        self.enabled = enabled
+        self.buffer_size = max(1, buffer_size)
+        self.replay_ttl = replay_ttl
+        self.resume_grace = resume_grace
+        self._flights: dict[tuple, _Flight] = {}
+        self._runs: dict[str, _Flight] = {}
+        self._finished: OrderedDict[str, _Flight] = OrderedDict()
+        self.started = 0
+        self.joined = 0
+        self.resumed = 0
+
+    async def subscribe(
+        self, key: tuple, factory: Callable[[], AsyncIterator[tuple]], share: bool = True
+    ) -> AsyncIterator[tuple]:
+        """Join the in-flight run for `key` (if `share` and still fully buffered) or start one."""
+        self._expire()
+        flight = self._flights.get(key) if self.enabled and share else None
+        if flight is not None and flight.base_seq == 0:
+            self.joined += 1
+        else:
+            flight = self._start(key, factory(), register=self.enabled and share, upstream=share)
+        async for item in self._follow(flight, 0):
+            yield item
+
+    def resume(self, last_event_id: str | None) -> AsyncIterator[tuple] | None:
+        """Events after `last_event_id`, or None if the run is unknown/expired or the gap was evicted."""
+        self._expire()
+        run_id, _, seq = (last_event_id or "").rpartition(":")
+        flight = self._runs.get(run_id)
+        if flight is None or not seq.isdigit() or int(seq) + 1 < flight.base_seq:
+            return None
+        self.resumed += 1
+        return self._follow(flight, int(seq) + 1)
+
+    def _start(self, key: tuple, events: AsyncIterator[tuple], register: bool, upstream: bool) -> _Flight:
+        flight = _Flight(self.buffer_size)
+        if register:
+            self._flights[key] = flight
+        self._runs[flight.run_id] = flight
+        flight.task = asyncio.create_task(self._run(key, flight, events, upstream))
+        self.started += 1
+        return flight
+
+    async def _follow(self, flight: _Flight, sent: int) -> AsyncIterator[tuple]:
+        flight.subscribers += 1
+        if flight.cancel_handle is not None:
+            flight.cancel_handle.cancel()
+            flight.cancel_handle = None
+        try:
+            while True:
+                # a subscriber that fell more than a buffer behind skips the evicted events
+                sent = max(sent, flight.base_seq)
+                while sent < flight.next_seq:
+                    event, data = flight.events[sent - flight.base_seq]
+                    yield f"{flight.run_id}:{sent}", event, data
+                    sent += 1
+                if flight.done:
+                    break
+                await flight.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                if self.resume_grace > 0:
+                    loop = asyncio.get_running_loop()
+                    flight.cancel_handle = loop.call_later(self.resume_grace, flight.task.cancel)
+                else:
+                    flight.task.cancel()
+
+    async def _run(self, key: tuple, flight: _Flight, events: AsyncIterator[tuple], upstream: bool):
+        # private (share=False) flights replay cached answers and are kept out of the upstream stats
+        try:
+            async for event in events:
+                flight.publish(event)
+            if upstream:
+                cancellation_stats.completed(key[0], flight.tokens, flight.tool_calls)
+        except asyncio.CancelledError:
+            if upstream:
+                cancellation_stats.cancelled(key[0], flight.tokens, flight.tool_calls)
+        finally:
+            flight.finish()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            self._finished[flight.run_id] = flight
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._finished:
+            run_id, flight = next(iter(self._finished.items()))
+            if now - flight.finished_at < self.replay_ttl:
+                break
+            del self._finished[run_id]
+            self._runs.pop(run_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._runs) - len(self._finished),
+            "replayable": len(self._runs),
+            "started": self.started,
+            "joined": self.joined,
+            "resumed": self.resumed,
+        }
+
+
+single_flight = SingleFlight(
+    enabled=SINGLE_FLIGHT_ENABLED,
+    buffer_size=SSE_REPLAY_BUFFER_EVENTS,
+    replay_ttl=SSE_REPLAY_TTL,
+    resume_grace=SSE_RESUME_GRACE,
+)
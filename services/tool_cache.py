@@ -0,0 +1,238 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from fnmatch import fnmatchcase
+
+from services import TOOL_CACHE_TOOLS, TOOL_CACHE_TTL, TOOL_CACHE_MAX_BYTES, SHARED_STORE_LEASE
+from services.metrics import metrics
+from services.shared_store import SharedStore, shared_key, shared_store
+
+_NS = "tool_results"
+# how often a worker waiting on another worker's call checks for its result
+_LEASE_POLL = 0.05
+
+# (tool, canonical input) -> whether the last such call of the current agent run was a cache hit
+_run_hits: ContextVar[dict | None] = ContextVar("tool_cache_run_hits", default=None)
+
+
+def canonical_input(arguments) -> str:
+    return json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _result_size(result) -> int:
+    # text content dominates; the fixed part covers the result/content objects themselves
+    return 256 + sum(len(getattr(c, "text", None) or "") for c in getattr(result, "content", []))
+
+
+class _Entry:
+    def __init__(self, result, size: int):
+        self.result = result
+        self.size = size
+        self.created = time.monotonic()
+
+
+class ToolResultCache:
+    """
+    Reuses results of read-only MCP tool calls within and across agent runs.
+
+    Only tools matching one of the `patterns` (fnmatch) are cached, keyed on server, tool name and
+    canonicalized input. Entries expire after `ttl` seconds and the least recently used ones are
+    evicted beyond `max_bytes`; failed calls (`isError`) are never stored. Concurrent identical
+    calls share one round-trip. With a `shared` store, results are shared between workers too, and
+    a worker whose identical call is already running elsewhere waits up to `lease` seconds for it.
+    """
+
+    def __init__(self, patterns: list[str], ttl: float, max_bytes: int, shared: SharedStore | None = None,
+                 lease: float = 10.0):
+        self.patterns = patterns
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.lease = lease
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._pending: dict[tuple, asyncio.Future] = {}
+        self._bytes = 0
+        self._tools: dict[str, dict] = {}
+        self.evictions = 0
+        self.shared_hits = 0
+        self.lease_waits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_bytes > 0 and bool(self.patterns)
+
+    def cacheable(self, tool: str) -> bool:
+        return any(fnmatchcase(tool, pattern) for pattern in self.patterns)
+
+    def _count(self, tool: str, hit: bool):
+        counts = self._tools.setdefault(tool, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+        metrics.tool_cache.inc(tool, "hit" if hit else "miss")
+
+    def _get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.result
+
+    async def _get_shared(self, key: tuple):
+        found = await self.shared.aget(_NS, shared_key(key)) if self.shared is not None else None
+        if found is None:
+            return None
+        from mcp.types import CallToolResult  # loaded by now: the connector that calls tools uses it
+
+        result = CallToolResult.model_validate_json(found[0])
+        self.shared_hits += 1
+        self._put(key, result)
+        return result
+
+    async def _call(self, key: tuple, call_tool, name: str, arguments: dict, *args, **kwargs):
+        """
+        Make the call; with a shared store, unless another worker is making it (see `lease`).
+        While waiting, only reads poll the store; the lease is tried again once it is gone.
+        """
+        if self.shared is None:
+            return await call_tool(name, arguments, *args, **kwargs)
+        skey = shared_key(key)
+        deadline = time.monotonic() + self.lease
+        while not await self.shared.aacquire(_NS, skey, self.lease):
+            while True:
+                if time.monotonic() >= deadline:
+                    # the holder is slow or died without releasing: make the call ourselves
+                    return await call_tool(name, arguments, *args, **kwargs)
+                await asyncio.sleep(_LEASE_POLL)
+                result = await self._get_shared(key)
+                if result is not None:
+                    self.lease_waits += 1
+                    return result
+                if not await self.shared.aheld(_NS, skey):
+                    break  # released without a result (the call failed): try to take it over
+        try:
+            result = await call_tool(name, arguments, *args, **kwargs)
+            dump = getattr(result, "model_dump_json", None)
+            if dump is not None and not getattr(result, "isError", False):
+                await self.shared.aput(_NS, skey, dump().encode("utf-8"), self.ttl)
+            return result
+        finally:
+            await self.shared.arelease(_NS, skey)
+
+    def _put(self, key: tuple, result):
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(result, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: tuple):
+        self._bytes -= self._entries.pop(key).size
+
+    async def apurge(self) -> int:
+        count = len(self._entries)
+        self._entries.clear()
+        self._bytes = 0
+        if self.shared is not None:
+            count = max(count, await self.shared.adelete(_NS))
+        return count
+
+    def wrap(self, connector):
+        """Route `connector.call_tool` through the cache."""
+        call_tool = connector.call_tool
+        server = canonical_input(getattr(connector, "public_identifier", None))
+
+        async def cached_call_tool(name: str, arguments: dict, *args, **kwargs):
+            if not self.enabled or not self.cacheable(name):
+                return await call_tool(name, arguments, *args, **kwargs)
+            canonical = canonical_input(arguments)
+            key = (server, name, canonical)
+            result = self._get(key)
+            pending = self._pending.get(key)
+            if result is None and pending is None:
+                result = await self._get_shared(key)
+                if result is None:
+                    # an identical call may have started here while the store was read
+                    pending = self._pending.get(key)
+            hit = result is not None or pending is not None
+            self._count(name, hit)
+            hits = _run_hits.get()
+            if hits is not None:
+                hits[(name, canonical)] = hit
+            if result is not None:
+                return result
+            if pending is not None:
+                try:
+                    return await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if not pending.cancelled():
+                        raise
+                # the run that issued the call was cancelled; make the call ourselves
+                return await call_tool(name, arguments, *args, **kwargs)
+
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            try:
+                result = await self._call(key, call_tool, name, arguments, *args, **kwargs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                # retrieved here so an unshared failure is not reported as never retrieved
+                future.exception()
+                raise
+            finally:
+                del self._pending[key]
+            future.set_result(result)
+            if not getattr(result, "isError", False):
+                self._put(key, result)
+            return result
+
+        connector.call_tool = cached_call_tool
+
+    @staticmethod
+    def track_run() -> dict:
+        """Start recording hits for the current agent run; see `was_hit`."""
+        hits = {}
+        _run_hits.set(hits)
+        return hits
+
+    @staticmethod
+    def was_hit(hits: dict, tool: str, arguments) -> bool:
+        return hits.get((tool, canonical_input(arguments)), False)
+
+    def stats(self) -> dict:
+        hits = sum(t["hits"] for t in self._tools.values())
+        misses = sum(t["misses"] for t in self._tools.values())
+        return {
+            "enabled": self.enabled,
+            "patterns": self.patterns,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "shared_hits": self.shared_hits,
+            "lease_waits": self.lease_waits,
+            "evictions": self.evictions,
+            "tools": self._tools,
+        }
+
+
+tool_cache = ToolResultCache(
+    patterns=[p.strip() for p in TOOL_CACHE_TOOLS.split(",") if p.strip()],
+    ttl=TOOL_CACHE_TTL,
+    max_bytes=TOOL_CACHE_MAX_BYTES,
+    shared=shared_store,
+    lease=SHARED_STORE_LEASE,
+)
@@ -0,0 +1,191 @@
+import math
+import re
+from collections import Counter, OrderedDict
+from fnmatch import fnmatchcase
+
+from services import TOOL_ROUTER_MAX_TOOLS, TOOL_ROUTER_ALWAYS, TOOL_ROUTER_CACHE_SIZE
+from services.sessions import estimate_tokens
+from utils.common import normalize_question
+from utils.sse import dumps
+
+# BM25 parameters; tool names are short and say the most, so their terms count several times
+_K1 = 1.2
+_B = 0.75
+_NAME_WEIGHT = 3
+# earlier questions of a session routed along with the new one, so a follow-up keeps its tools
+_HISTORY_QUESTIONS = 2
+
+_STOPWORDS = frozenset(
+    "a about all also an and any are as at be by can do does each every first for from give has have how "
+    "i in is it its just me more my next of on one or other please second show some tell than that the "
+    "their them then there these this those to us was we what when where which who with you".split()
+)
+
+
+def _terms(text: str) -> list[str]:
+    """Lower-case word terms; snake_case and camelCase are split, plurals reduced to the singular."""
+    text = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", text or "").casefold()
+    terms = []
+    for word in re.findall(r"[^\W_]+", text):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def _tool_terms(tool) -> list[str]:
+    terms = _terms(tool.name) * _NAME_WEIGHT + _terms(tool.description)
+    for name, schema in (getattr(tool, "args", None) or {}).items():
+        terms += _terms(name) + _terms(schema.get("description", "") if isinstance(schema, dict) else "")
+    return terms
+
+
+def _tool_tokens(tool) -> int:
+    """Estimated prompt tokens of a tool: its function definition plus its line in the system prompt."""
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    definition = dumps(convert_to_openai_tool(tool)).decode("utf-8")
+    return estimate_tokens(definition) + estimate_tokens(f"- {tool.name}: {tool.description}")
+
+
+class _Index:
+    """BM25 index over one tool catalog."""
+
+    def __init__(self, tools: list):
+        self.tools = tools
+        self.docs = [Counter(_tool_terms(tool)) for tool in tools]
+        self.lengths = [sum(doc.values()) for doc in self.docs]
+        self.avg_length = sum(self.lengths) / max(1, len(self.lengths))
+        frequencies = Counter(term for doc in self.docs for term in doc)
+        n = len(tools)
+        self.idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in frequencies.items()}
+        self.tokens = [_tool_tokens(tool) for tool in tools]
+
+    def scores(self, terms: list[str]) -> list[float]:
+        scores = []
+        for doc, length in zip(self.docs, self.lengths):
+            score = 0.0
+            for term in set(terms):
+                tf = doc.get(term, 0)
+                if tf:
+                    norm = tf + _K1 * (1 - _B + _B * length / self.avg_length)
+                    score += self.idf[term] * tf * (_K1 + 1) / norm
+            scores.append(score)
+        return scores
+
+
+class ToolRouter:
+    """
+    Chooses the MCP tools offered to the agent for a question, so the model is not sent the whole
+    catalog (every definition is part of the prompt of every agent step).
+
+    Tools are ranked by BM25 over a local index of their names (weighted up), descriptions and
+    argument names/descriptions. In a session, the last `_HISTORY_QUESTIONS` questions are routed
+    along with the new one, so a follow-up ("and the second one?") keeps the tools of its
+    conversation. The best `max_tools` sharing a term with that query are offered, plus those
+    matching one of the `always` patterns (fnmatch). A query that matches no tool gets the whole
+    catalog, as does every question when `max_tools` is 0 or the catalog is not larger; a routed
+    run that ends without calling any tool is run again with the whole catalog (see `retried`).
+    The selection per (query, catalog) is kept in an LRU of `cache_size` entries; the index is
+    rebuilt when the catalog changes.
+    """
+
+    def __init__(self, max_tools: int, always: list[str], cache_size: int):
+        self.max_tools = max_tools
+        self.always = always
+        self.cache_size = max(0, cache_size)
+        self._index: tuple[tuple, _Index] | None = None
+        self._routes: OrderedDict[str, tuple[tuple[int, ...], int]] = OrderedDict()
+        self.routed = 0
+        self.fallbacks = 0
+        self.retries = 0
+        self.whole_catalog = 0
+        self.cache_hits = 0
+        self.tools_offered = 0
+        self.catalog_tools = 0
+        self.llm_calls = 0
+        self.tokens_saved = 0
+
+    def _get_index(self, tools: list) -> _Index:
+        catalog = tuple(tool.name for tool in tools)
+        if self._index is None or self._index[0] != catalog:
+            self._index = (catalog, _Index(tools))
+            self._routes.clear()
+        return self._index[1]
+
+    def select(self, question: str, tools: list, history: list[tuple[str, str]] = ()) -> tuple[list, int]:
+        """(tools to offer, estimated prompt tokens that saves on each LLM call of the run)"""
+        if self.max_tools <= 0 or len(tools) <= self.max_tools:
+            self.whole_catalog += 1
+            return tools, 0
+        index = self._get_index(tools)
+        earlier = [content for role, content in history if role == "user"][-_HISTORY_QUESTIONS:]
+        question = "\n".join([*earlier, question])
+        key = normalize_question(question)
+        route = self._routes.get(key)
+        if route is not None:
+            self._routes.move_to_end(key)
+            self.cache_hits += 1
+        else:
+            route = self._route(index, question)
+            if self.cache_size:
+                self._routes[key] = route
+                while len(self._routes) > self.cache_size:
+                    self._routes.popitem(last=False)
+        chosen, saved = route
+        if len(chosen) == len(tools):
+            self.fallbacks += 1
+        else:
+            self.routed += 1
+        self.tools_offered += len(chosen)
+        self.catalog_tools += len(tools)
+        return [index.tools[i] for i in chosen], saved
+
+    def _route(self, index: _Index, question: str) -> tuple[tuple[int, ...], int]:
+        scores = index.scores(_terms(question))
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        if not ranked:
+            return tuple(range(len(index.tools))), 0
+        chosen = set(ranked[:self.max_tools])
+        chosen.update(i for i, tool in enumerate(index.tools)
+                      if any(fnmatchcase(tool.name, pattern) for pattern in self.always))
+        saved = sum(tokens for i, tokens in enumerate(index.tokens) if i not in chosen)
+        # catalog order, so the same selection always renders the same prompt
+        return tuple(sorted(chosen)), saved
+
+    def retried(self):
+        """A routed run called no tool and is run again with the whole catalog."""
+        self.retries += 1
+
+    def record(self, saved_per_call: int, llm_calls: int):
+        """Account the savings of a finished run that made `llm_calls` LLM calls."""
+        self.llm_calls += llm_calls
+        self.tokens_saved += saved_per_call * llm_calls
+
+    def stats(self) -> dict:
+        runs = self.routed + self.fallbacks
+        return {
+            "max_tools": self.max_tools,
+            "always": self.always,
+            "routed": self.routed,
+            "fallbacks": self.fallbacks,
+            "retries": self.retries,
+            "whole_catalog": self.whole_catalog,
+            "cache_hits": self.cache_hits,
+            "cached_routes": len(self._routes),
+            "tools_offered_avg": round(self.tools_offered / runs, 1) if runs else 0,
+            "catalog_tools_avg": round(self.catalog_tools / runs, 1) if runs else 0,
+            "llm_calls": self.llm_calls,
+            "prompt_tokens_saved_estimate": self.tokens_saved,
+        }
+
+
+tool_router = ToolRouter(
+    max_tools=TOOL_ROUTER_MAX_TOOLS,
+    always=[p.strip() for p in TOOL_ROUTER_ALWAYS.split(",") if p.strip()],
+    cache_size=TOOL_ROUTER_CACHE_SIZE,
+)
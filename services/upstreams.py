@@ -0,0 +1,288 @@
+import asyncio
+import json
+import time
+from collections import deque
+from functools import cached_property
+
+from services import (
+    API_KEY,
+    BASE_URL,
+    MODEL_NAME,
+    UPSTREAMS,
+    UPSTREAM_COOLDOWN,
+    UPSTREAM_HEDGE,
+    UPSTREAM_HEDGE_PERCENTILE,
+    UPSTREAM_HEDGE_MIN_DELAY,
+)
+from services.metrics import metrics
+
+_MAX_COOLDOWN = 300.0
+_EWMA_ALPHA = 0.2
+
+
+def _close_unused(task: asyncio.Task):
+    """Done callback for abandoned attempts: close a stream that still got opened."""
+    if not task.cancelled() and task.exception() is None:
+        asyncio.ensure_future(task.result().close())
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Connection problems, timeouts, 429 and 5xx: worth retrying on another upstream."""
+    import openai  # already loaded by whoever raised an API error
+
+    return isinstance(
+        error, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError, openai.InternalServerError)
+    )
+
+
+class Upstream:
+    """One OpenAI-compatible endpoint plus its observed time-to-first-token and health."""
+
+    def __init__(self, name: str, base_url: str, api_key: str, model: str, max_retries: int):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.max_retries = max_retries
+        self.ttft_ewma: float | None = None
+        self._ttfts: deque = deque(maxlen=200)
+        self.failures = 0
+        self.unhealthy_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    @cached_property
+    def client(self):
+        # created on first use: importing openai is a large part of the API's cold start
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(base_url=self.base_url or None, api_key=self.api_key, max_retries=self.max_retries)
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def succeeded(self, ttft: float | None = None):
+        self.failures = 0
+        self.unhealthy_until = 0.0
+        if ttft is None:
+            return
+        self._ttfts.append(ttft)
+        self.ttft_ewma = ttft if self.ttft_ewma is None else (1 - _EWMA_ALPHA) * self.ttft_ewma + _EWMA_ALPHA * ttft
+
+    def failed(self, cooldown: float):
+        self.errors += 1
+        self.failures += 1
+        self.unhealthy_until = time.monotonic() + min(_MAX_COOLDOWN, cooldown * 2 ** (self.failures - 1))
+
+    def ttft_percentile(self, pct: float) -> float | None:
+        if len(self._ttfts) < 5:
+            return None
+        ordered = sorted(self._ttfts)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def stats(self) -> dict:
+        p95 = self.ttft_percentile(95)
+        return {
+            "name": self.name,
+            "model": self.model,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "errors": self.errors,
+            "consecutive_failures": self.failures,
+            "ttft_ewma_s": round(self.ttft_ewma, 3) if self.ttft_ewma is not None else None,
+            "ttft_p95_s": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class Started:
+    """A completion stream that produced its first content delta (or ended without any)."""
+
+    def __init__(self, upstream: Upstream, stream, chunks, first_delta: str | None):
+        self.upstream = upstream
+        self.stream = stream
+        self.chunks = chunks
+        self.first_delta = first_delta
+
+    async def close(self):
+        await self.stream.close()
+
+
+class UpstreamPool:
+    """
+    OpenAI-compatible upstreams with health tracking and latency-aware selection.
+
+    `select()` prefers healthy upstreams with the lowest TTFT moving average (unmeasured ones
+    first, so new upstreams get sampled). `start_completion()` opens a stream and waits for the
+    first content delta: a retryable error before that point marks the upstream unhealthy for a
+    cooldown and fails over to the next one. With `hedge`, a second upstream is started when the
+    first token is later than the upstream's p95 TTFT (at least `hedge_min_delay`); whichever
+    stream produces a token first is kept and the other is cancelled.
+    """
+
+    def __init__(self, upstreams: list[Upstream], cooldown: float, hedge: bool, hedge_percentile: float,
+                 hedge_min_delay: float):
+        self.upstreams = upstreams
+        self.cooldown = cooldown
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.failovers = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    @classmethod
+    def from_env(cls) -> "UpstreamPool":
+        specs = json.loads(UPSTREAMS) if UPSTREAMS.strip() else [
+            {"name": "default", "base_url": BASE_URL, "api_key": API_KEY, "model": MODEL_NAME}
+        ]
+        # with several upstreams, fail over right away instead of retrying the same one
+        max_retries = 0 if len(specs) > 1 else 2
+        upstreams = [
+            Upstream(
+                name=spec.get("name") or f"upstream{i}",
+                base_url=spec.get("base_url", ""),
+                api_key=spec.get("api_key", API_KEY),
+                model=spec.get("model", MODEL_NAME),
+                max_retries=max_retries,
+            )
+            for i, spec in enumerate(specs)
+        ]
+        return cls(upstreams, UPSTREAM_COOLDOWN, UPSTREAM_HEDGE, UPSTREAM_HEDGE_PERCENTILE, UPSTREAM_HEDGE_MIN_DELAY)
+
+    @property
+    def model_name(self) -> str:
+        """The pool's models (comma-separated): cache keys are per model set, answers name their own model."""
+        return ",".join(sorted({u.model for u in self.upstreams}))
+
+    def select(self, exclude: list[Upstream] = ()) -> Upstream | None:
+        candidates = [u for u in self.upstreams if u not in exclude]
+        if not candidates:
+            return None
+        healthy = [u for u in candidates if u.healthy]
+        if not healthy:
+            # everything is cooling down: try the one that recovers first rather than failing
+            return min(candidates, key=lambda u: u.unhealthy_until)
+        return min(healthy, key=lambda u: -1.0 if u.ttft_ewma is None else u.ttft_ewma)
+
+    def failed_over(self, upstream: Upstream):
+        """Record a retryable failure of `upstream` that the caller is about to retry elsewhere."""
+        upstream.failed(self.cooldown)
+        self.failovers += 1
+        metrics.upstream_failovers.inc(upstream.name)
+
+    def _hedge_delay(self, upstream: Upstream) -> float | None:
+        if not self.hedge:
+            return None
+        p = upstream.ttft_percentile(self.hedge_percentile)
+        return None if p is None else max(self.hedge_min_delay, p)
+
+    async def _open(self, upstream: Upstream, messages: list[dict]) -> Started:
+        upstream.requests += 1
+        t0 = time.perf_counter()
+        stream = await upstream.client.chat.completions.create(model=upstream.model, messages=messages, stream=True)
+        try:
+            chunks = stream.__aiter__()
+            async for chunk in chunks:
+                if not chunk.choices:
+                    continue
+                delta = getattr(chunk.choices[0].delta, "content", None)
+                if delta:
+                    upstream.succeeded(time.perf_counter() - t0)
+                    return Started(upstream, stream, chunks, delta)
+            return Started(upstream, stream, chunks, None)
+        except BaseException:
+            await stream.close()
+            raise
+
+    async def start_completion(self, messages: list[dict]) -> Started:
+        tried: list[Upstream] = []
+        pending: dict[asyncio.Task, Upstream] = {}
+        last_error: BaseException | None = None
+        winner: Started | None = None
+        hedged: Upstream | None = None
+        try:
+            while winner is None:
+                if not pending:
+                    upstream = self.select(exclude=tried)
+                    if upstream is None:
+                        raise last_error or RuntimeError("no upstream available")
+                    tried.append(upstream)
+                    pending[asyncio.create_task(self._open(upstream, messages))] = upstream
+
+                timeout = None
+                spare = self.select(exclude=tried) if len(pending) == 1 else None
+                if spare is not None:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # first token is late: race a second upstream
+                    self.hedges += 1
+                    metrics.upstream_hedges.inc()
+                    hedged = spare
+                    tried.append(spare)
+                    pending[asyncio.create_task(self._open(spare, messages))] = spare
+                    continue
+
+                # look at every finished task before picking a winner, so a fatal error next to a
+                # stream that opened doesn't leave that stream open
+                opened: list[tuple[Upstream, Started]] = []
+                fatal: Exception | None = None
+                for task in done:
+                    upstream = pending.pop(task)
+                    try:
+                        opened.append((upstream, task.result()))
+                    except Exception as e:
+                        if not is_retryable(e):
+                            fatal = fatal or e
+                            continue
+                        self.failed_over(upstream)
+                        last_error = e
+                if fatal is not None:
+                    for _, started in opened:
+                        await started.close()
+                    raise fatal
+                for upstream, started in opened:
+                    if winner is None:
+                        winner = started
+                        if upstream is hedged:
+                            self.hedges_won += 1
+                    else:
+                        await started.close()
+            return winner
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_close_unused)
+
+    async def complete(self, messages: list[dict], **kwargs) -> str:
+        """Text of a non-streamed completion; retryable errors fail over to the next upstream."""
+        tried: list[Upstream] = []
+        while True:
+            upstream = self.select(exclude=tried)
+            tried.append(upstream)
+            upstream.requests += 1
+            try:
+                response = await upstream.client.chat.completions.create(
+                    model=upstream.model, messages=messages, **kwargs
+                )
+            except Exception as e:
+                if not is_retryable(e) or self.select(exclude=tried) is None:
+                    raise
+                self.failed_over(upstream)
+                continue
+            upstream.succeeded()
+            return response.choices[0].message.content or ""
+
+    def stats(self) -> dict:
+        return {
+            "hedge": self.hedge,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "upstreams": [u.stats() for u in self.upstreams],
+        }
+
+
+upstream_pool = UpstreamPool.from_env()
@@ -1,11 +1,160 @@
-import json
+import asyncio
+import unicodedata
+from typing import AsyncIterable, AsyncIterator
 
+from utils.sse import HEARTBEAT, encode
 
-def sse(event: str, data: dict | str) -> str:
-    """Format a Server-Sent Event line block."""
-    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
-    return f"event: {event}\n" f"data: {payload}\n\n"
 
-def heartbeat() -> str:
+def sse(event: str, data: dict | str, id: str | None = None, retry: int | None = None) -> bytes:
+    """Format a Server-Sent Event, optionally with an event id and reconnect delay (ms)."""
+    return encode(event, data, id=id, retry=retry)
+
+def heartbeat() -> bytes:
     """Comment line to keep connection alive."""
-    return ": ping\n\n"
\ No newline at end of file
+    return HEARTBEAT
+
+def normalize_question(question: str) -> str:
+    """Canonical form used to match identical questions: NFC, case-folded, single spaces."""
+    return " ".join(unicodedata.normalize("NFC", question).casefold().split())
+
+
+def client_key(request) -> str:
+    """Identity used for per-client fairness: the API key if one was sent, else the client address."""
+    key = request.headers.get("x-api-key")
+    if not key:
+        auth = request.headers.get("authorization", "")
+        key = auth[7:] if auth.lower().startswith("bearer ") else ""
+    if key:
+        return f"key:{key}"
+    return f"addr:{request.client.host}" if request.client else "anonymous"
+
+
+_END = object()
+
+
+def _pump(source: AsyncIterable, maxsize: int) -> tuple[asyncio.Queue, asyncio.Task]:
+    """
+    Drain `source` into a queue from its own task, so consumers can wait on the queue with a
+    timeout without cancelling the source. Ends with `_END`, or the exception the source raised.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def run():
+        try:
+            async for item in source:
+                await queue.put(item)
+            await queue.put(_END)
+        except Exception as e:
+            await queue.put(e)
+
+    return queue, asyncio.create_task(run())
+
+
+async def _wait_for_disconnect(request, poll_interval: float):
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_interval)
+
+
+async def with_heartbeat(
+    frames: AsyncIterable[bytes], interval: float, request=None, disconnect_poll: float = 1.0
+) -> AsyncIterator[bytes]:
+    """
+    Re-yield `frames`, inserting a heartbeat whenever nothing was produced for `interval` seconds.
+
+    The source is consumed by its own task so the timer keeps running while the source is blocked
+    (e.g. waiting for the first token); exceptions from the source are re-raised here.
+    If `request` is given, the stream stops as soon as the client disconnects and the source is
+    cancelled instead of running to completion for nobody.
+    """
+    queue, task = _pump(frames, maxsize=64)
+    disconnected = None
+    if request is not None:
+        disconnected = asyncio.create_task(_wait_for_disconnect(request, disconnect_poll))
+    getter = None
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(queue.get())
+            waiters = {getter} if disconnected is None else {getter, disconnected}
+            done, _ = await asyncio.wait(waiters, timeout=interval, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected is not None and disconnected in done:
+                break
+            if getter not in done:
+                yield heartbeat()
+                continue
+            item = getter.result()
+            getter = None
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        if getter is not None:
+            getter.cancel()
+        if disconnected is not None:
+            disconnected.cancel()
+        task.cancel()
+
+
+async def coalesce_deltas(events: AsyncIterable[tuple], window: float, max_bytes: int) -> AsyncIterator[tuple]:
+    """
+    Merge consecutive (event_id, "delta", {"content": ...}) events into one, flushing when `window`
+    seconds passed since the first buffered delta or `max_bytes` of content accumulated. Any other
+    event flushes the buffer first and is passed through immediately. A merged delta carries the id
+    of the last delta it contains, so resuming from it skips exactly the merged ones.
+    """
+    queue, task = _pump(events, maxsize=256)
+    loop = asyncio.get_running_loop()
+    buffer: list[str] = []
+    buffered_bytes = 0
+    template: dict | None = None
+    last_id = None
+    deadline = 0.0
+
+    def flush():
+        nonlocal buffer, buffered_bytes, template
+        merged = (last_id, "delta", {**template, "content": "".join(buffer)})
+        buffer, buffered_bytes, template = [], 0, None
+        return merged
+
+    try:
+        while True:
+            if buffer:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    yield flush()
+                    continue
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    yield flush()
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            event_id, event, data = item
+            if event == "delta":
+                if template is None:
+                    template = data
+                    deadline = loop.time() + window
+                last_id = event_id
+                buffer.append(data["content"])
+                buffered_bytes += len(data["content"].encode("utf-8"))
+                if buffered_bytes >= max_bytes:
+                    yield flush()
+                continue
+
+            if buffer:
+                yield flush()
+            yield item
+
+        if buffer:
+            yield flush()
+    finally:
+        task.cancel()
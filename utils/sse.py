@@ -0,0 +1,105 @@
+import dataclasses
+import json
+import re
+from typing import Callable
+
+from services import SSE_JSON_BACKEND
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+HEARTBEAT = b": ping\n\n"
+
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+_FIELD_BREAK = re.compile(r"[\r\n\0]")
+
+
+def to_jsonable(o):
+    """
+    `default` hook for objects the JSON backends cannot serialize: pydantic models (LangChain
+    messages, MCP results and content), dataclasses, sets, bytes, objects with `isoformat`,
+    then mappings/iterables, and finally `str(o)` so a frame is never dropped.
+    """
+    model_dump = getattr(o, "model_dump", None)
+    if callable(model_dump):
+        return model_dump(mode="json")
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if isinstance(o, (set, frozenset, tuple)):
+        return list(o)
+    if isinstance(o, (bytes, bytearray)):
+        return o.decode("utf-8", errors="replace")
+    isoformat = getattr(o, "isoformat", None)
+    if callable(isoformat):
+        return isoformat()
+    if hasattr(o, "keys") and hasattr(o, "__getitem__"):
+        return {str(k): o[k] for k in o.keys()}
+    if hasattr(o, "__iter__") and not isinstance(o, str):
+        return list(o)
+    return str(o)
+
+
+def _stdlib_dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, default=to_jsonable).encode("utf-8")
+
+
+def _orjson_dumps(data) -> bytes:
+    try:
+        return orjson.dumps(data, default=to_jsonable, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # integers beyond 64 bits, nesting deeper than orjson allows, ...
+        return _stdlib_dumps(data)
+
+
+def _select_backend(name: str) -> Callable[[object], bytes]:
+    if name == "json" or (name == "auto" and orjson is None):
+        return _stdlib_dumps
+    if name in ("auto", "orjson"):
+        if orjson is None:
+            raise RuntimeError("SSE_JSON_BACKEND=orjson but orjson is not installed")
+        return _orjson_dumps
+    raise ValueError(f"unknown SSE_JSON_BACKEND {name!r} (expected auto, orjson or json)")
+
+
+dumps = _select_backend(SSE_JSON_BACKEND)
+
+
+def set_json_backend(name: str):
+    """Switch the JSON encoder used for frames: "auto" (orjson if installed), "orjson" or "json"."""
+    global dumps
+    dumps = _select_backend(name)
+
+
+def _field(value) -> bytes:
+    # a line break in `event` or `id` would end the field and start an unrelated one
+    value = str(value)
+    if "\n" in value or "\r" in value or "\0" in value:
+        value = _FIELD_BREAK.sub("", value)
+    return value.encode("utf-8")
+
+
+def encode(event: str | None, data=None, id: str | None = None, retry: int | None = None) -> bytes:
+    """
+    One Server-Sent Event frame as UTF-8 bytes.
+
+    `data` strings are sent as-is, one `data:` line per line of text (CRLF, CR and LF all count as
+    line breaks, per the SSE spec), so clients reassemble them exactly; anything else is JSON.
+    """
+    head = b""
+    if id is not None:
+        head += b"id: " + _field(id) + b"\n"
+    if retry is not None:
+        head += b"retry: %d\n" % retry
+    if event:
+        head += b"event: " + _field(event) + b"\n"
+    if data is None:
+        return head + b"\n"
+    if isinstance(data, str):
+        payload = data.encode("utf-8")
+        if b"\n" in payload or b"\r" in payload:
+            payload = "\ndata: ".join(_LINE_BREAK.split(data)).encode("utf-8")
+    else:
+        payload = dumps(data)
+    return head + b"data: " + payload + b"\n\n"